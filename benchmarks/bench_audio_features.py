@@ -0,0 +1,51 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from audio_features import analyze_wav, analyze_waveform
+from transcription_service import _pcm_to_float
+
+
+def decode_wav(path):
+    # The straightforward route for reference: read and convert the whole file first.
+    with wave.open(path, "rb") as wav:
+        rate = wav.getframerate()
+        samples = _pcm_to_float(wav.readframes(wav.getnframes()), wav.getsampwidth(), wav.getnchannels())
+    return analyze_waveform(samples, rate)
+
+
+def best_ms(func, path, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(path)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    default_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_data", "audio")
+    parser = argparse.ArgumentParser(description="Waveform hesitation features: memory-mapped analysis vs full decode")
+    parser.add_argument("inputs", nargs="*", help="WAV files (default: test_data/audio/*.wav)")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    paths = args.inputs or sorted(glob.glob(os.path.join(default_dir, "*.wav")))
+
+    print(f"{'file':>20} {'audio s':>8} {'memmap ms':>10} {'decode ms':>10} {'rtf':>8} {'same':>5} "
+          f"{'pause':>6} {'pauses':>7} {'fillers':>8} {'syl/s':>6} {'hesitation':>11}")
+    for path in paths:
+        memmap_ms, features = best_ms(analyze_wav, path, args.repeat)
+        decode_ms, decoded = best_ms(decode_wav, path, args.repeat)
+        rtf = memmap_ms / 1000 / features["duration_seconds"] if features["duration_seconds"] else 0.0
+        print(f"{os.path.basename(path):>20} {features['duration_seconds']:>8.2f} {memmap_ms:>10.2f} {decode_ms:>10.2f} "
+              f"{rtf:>8.4f} {str(features == decoded):>5} {features['pause_ratio']:>6.3f} {features['pause_count']:>7} "
+              f"{features['filler_count']:>8} {features['syllables_per_second']:>6.2f} {features['speech_hesitation']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from book_index import BookIndex, tokenize
+from simple_react_agent import LINEAR_ALGEBRA_BOOK_CONTENT
+
+
+def synthetic_corpus(n_chunks, words_per_chunk, seed=0):
+    """The real book passages plus Zipf-distributed filler chunks drawn from a 50k-word vocabulary."""
+    rng = np.random.default_rng(seed)
+    book_words = sorted({w for text in LINEAR_ALGEBRA_BOOK_CONTENT.values() for w in tokenize(text)})
+    vocab = np.array(book_words + [f"term{i}" for i in range(50000)])
+    passages = dict(LINEAR_ALGEBRA_BOOK_CONTENT)
+    ids = np.minimum(rng.zipf(1.3, size=(max(n_chunks - len(passages), 0), words_per_chunk)), len(vocab)) - 1
+    for i, row in enumerate(ids):
+        passages[f"chunk_{i}"] = " ".join(vocab[row])
+    return passages
+
+
+def linear_scan(passages, query):
+    # The original rag_book strategy, for reference.
+    for key, content in passages.items():
+        if query.lower() in key.lower() or query.lower() in content.lower():
+            return content
+    return None
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 book index query latency as the corpus grows")
+    parser.add_argument("--sizes", default="6,1000,10000,100000")
+    parser.add_argument("--words", type=int, default=80, help="words per synthetic chunk")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    queries = ["matrix inversion definition", "eigenvalues eigenvectors", "rank nullity theorem",
+               "affine geometry parallel lines", "vector addition scalar multiplication", "term17 term4"]
+    print(f"{'chunks':>8} {'build s':>8} {'save s':>7} {'load ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'scan p50 ms':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        passages = synthetic_corpus(size, args.words)
+
+        start = time.perf_counter()
+        index = BookIndex()
+        for key, text in passages.items():
+            index.add_passage(key, text)
+        build_s = time.perf_counter() - start
+
+        directory = tempfile.mkdtemp(prefix="book_index_")
+        try:
+            start = time.perf_counter()
+            index.save(directory)
+            save_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = BookIndex.load(directory, mmap=True)
+            load_ms = (time.perf_counter() - start) * 1000
+
+            latencies = []
+            for i in range(args.queries):
+                start = time.perf_counter()
+                index.search(queries[i % len(queries)], k=5)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            scan = []
+            for i in range(min(args.queries, 20)):
+                start = time.perf_counter()
+                linear_scan(passages, queries[i % len(queries)])
+                scan.append((time.perf_counter() - start) * 1000)
+        finally:
+            del index
+            shutil.rmtree(directory, ignore_errors=True)
+
+        print(f"{size:>8} {build_s:>8.2f} {save_s:>7.2f} {load_ms:>8.1f} "
+              f"{percentile(latencies, 50):>7.3f} {percentile(latencies, 95):>7.3f} {statistics.median(scan):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
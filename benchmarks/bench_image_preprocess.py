@@ -0,0 +1,66 @@
+import argparse
+import base64
+import io
+import os
+import statistics
+import sys
+import time
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from image_utils import preprocess_image
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_data", "images", "test_img.jpeg")
+
+
+def to_data_url(image, fmt, **save_kwargs):
+    buf = io.BytesIO()
+    image.save(buf, format=fmt, **save_kwargs)
+    return f"data:image/{fmt.lower()};base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def bench(name, img_url, max_edge, quality, repeats, uplink_mbps):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _, _, stats = preprocess_image(img_url, max_edge=max_edge, quality=quality)
+        timings.append((time.perf_counter() - start) * 1000)
+    # Time to upload the request body to Watsonx at the given uplink speed.
+    upload_before = stats["original_bytes"] * 8 / (uplink_mbps * 1e6) * 1000
+    upload_after = stats["processed_bytes"] * 8 / (uplink_mbps * 1e6) * 1000
+    prep_ms = statistics.median(timings)
+    print(f"{name:<28} {max_edge:>5} {quality:>4} "
+          f"{stats['original_bytes']:>10} {stats['processed_bytes']:>10} "
+          f"{100 * stats['bytes_saved'] / stats['original_bytes']:>6.1f}% "
+          f"{prep_ms:>8.2f} {upload_before:>9.1f} {upload_after + prep_ms:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payload and latency deltas of image preprocessing")
+    parser.add_argument("--image", default=DEFAULT_IMAGE)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="uplink to Watsonx used to estimate upload time")
+    args = parser.parse_args()
+
+    source = Image.open(args.image)
+    source.load()
+    # The browser sends canvas.toDataURL() frames, which default to PNG, and
+    # webcams are often 1080p or larger, so benchmark those shapes as well.
+    inputs = {
+        "jpeg original": to_data_url(source, "JPEG", quality=95),
+        "png original": to_data_url(source, "PNG"),
+        "jpeg 1920 (upscaled)": to_data_url(source.resize((1920, 1280)), "JPEG", quality=95),
+        "png 1920 (upscaled)": to_data_url(source.resize((1920, 1280)), "PNG"),
+    }
+
+    print(f"{'input':<28} {'edge':>5} {'q':>4} {'bytes in':>10} {'bytes out':>10} {'saved':>7} "
+          f"{'prep ms':>8} {'send ms':>9} {'new ms':>9}")
+    for name, img_url in inputs.items():
+        for max_edge, quality in ((768, 80), (512, 75), (384, 70)):
+            bench(name, img_url, max_edge, quality, args.repeats, args.uplink_mbps)
+    print(f"\nsend ms: upload of the original body at {args.uplink_mbps} Mbit/s; "
+          "new ms: preprocessing plus upload of the re-encoded body")
+
+
+if __name__ == "__main__":
+    main()
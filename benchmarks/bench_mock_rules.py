@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from mock_rules import RuleEngine, observations_from_prompt
+
+
+def legacy_mock_lmm_resp(prompt):
+    """The substring cascade mock_lmm_resp used before the rule engine, kept as the baseline."""
+    if "'frustrated'" in prompt and "knowledge score on 'Linear Algebra' is" in prompt and "incorrect matrix syntax" in prompt:
+        try:
+            knowledge_score = int(prompt.split("knowledge score on 'Linear Algebra' is ")[1].split("/")[0])
+            if knowledge_score < 50:
+                return "Action: modify_existing_content"
+        except (ValueError, IndexError):
+            pass
+    if "Concentration level is 10%" in prompt and "knowledge score on 'Linear Algebra' is 20/100" in prompt:
+        return "Action: generate_new_content"
+    elif "Memory retention rate is 50%" in prompt and "failed to solve equation" in prompt:
+        return "Action: modify_long_term_plan"
+    elif "Concentration level is 30%" in prompt:
+        return "Action: encourage_user"
+    elif "stuck on definition" in prompt:
+        return "Action: retrieve_knowledge_from_book"
+    return "Final Answer: observing"
+
+
+def random_observations(rng):
+    return {
+        "video": {"modality": "video", "mood": rng.choice(["confused", "focused", "frustrated", "bored", "engaged"]),
+                  "concentration_level": rng.randint(10, 100)},
+        "audio": {"modality": "audio", "speech_hesitation": round(rng.random(), 2),
+                  "knowledge_score_linear_algebra": rng.randint(0, 100)},
+        "screen": {"modality": "screen", "memory_retention_rate": rng.randint(50, 100),
+                   "current_task_status": rng.choice(["incorrect matrix syntax", "failed to solve equation", "correct", "incomplete", "stuck on definition"])}
+    }
+
+
+def build_prompt(steps, observations):
+    history = "".join(
+        f"Thought: step {i}\nAction: update_short_term\nAction Input: 'pace'\nObservation: Short-term plan adjusted: 'pace'.\n"
+        for i in range(steps)
+    )
+    return (f"The student is learning matrix inversion.\n{history}"
+            f"Current Time Remaining: 5.0 minutes.\n"
+            f"Video Observation: {json.dumps(observations['video'])}\n"
+            f"Audio Observation: {json.dumps(observations['audio'])}\n"
+            f"Screen Observation: {json.dumps(observations['screen'])}\n"
+            f"Historical Performance (Summary): {{}}")
+
+
+def rate(func, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    return repeat * len(items) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock planner: substring cascade vs compiled rule engine")
+    parser.add_argument("--steps", type=int, nargs="+", default=[0, 10, 100, 1000])
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    engine = RuleEngine()
+    observations = [random_observations(rng) for _ in range(args.prompts)]
+    fired = {}
+    for obs in observations:
+        name = engine.match(obs)[0]
+        fired[name] = fired.get(name, 0) + 1
+    print(f"{engine.rules.rule_count} rules; matches on {args.prompts} random observations: {fired}\n")
+
+    print(f"{'history steps':>13} {'prompt KB':>9} {'legacy/s':>10} {'from prompt/s':>14} {'structured/s':>13}")
+    structured = rate(engine.respond, observations, args.repeat)
+    for steps in args.steps:
+        prompts = [build_prompt(steps, obs) for obs in observations]
+        kb = sum(len(p) for p in prompts) / len(prompts) / 1024
+        legacy = rate(legacy_mock_lmm_resp, prompts, args.repeat)
+        from_prompt = rate(lambda p: engine.respond(observations_from_prompt(p)), prompts, args.repeat)
+        print(f"{steps:>13} {kb:>9.1f} {legacy:>10.0f} {from_prompt:>14.0f} {structured:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
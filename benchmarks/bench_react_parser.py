@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from react_parser import ReActStreamParser, parse_react_output
+
+
+def legacy_parse_llm_output(output):
+    # The original line-splitting parser, for reference.
+    parsed_output = {}
+    lines = output.strip().split('\n')
+    for line in lines:
+        if line.startswith("Thought"):
+            parsed_output["thought"] = line.replace("Thought:", "").strip()
+        elif line.startswith("Action:"):
+            parsed_output["action"] = line.replace("Action:", "").strip()
+        elif line.startswith("Action Input:"):
+            action_input = line.replace("Action Input:", "").strip()
+            parsed_output["action_input"] = action_input if action_input != "None" else None
+        elif line.startswith("Final Answer:"):
+            parsed_output["final_answer"] = line.replace("Final Answer:", "").strip()
+    return parsed_output
+
+
+SHORT = """
+Thought: Student's concentration is dropping. A timely encouragement might help re-focus them.
+Action: encourage_user
+Action Input: None
+"""
+
+FINAL = """
+Thought: The current state is stable or no clear critical pattern detected.
+Final Answer: The tutor is observing and ready for the next interaction or to provide a general response.
+"""
+
+MULTILINE = """
+Thought: The student keeps inverting singular matrices.
+They need to see why the determinant matters before trying again.
+Action: gen_content
+Action Input: a worked example that
+1. computes det([[2,4],[1,2]]) = 0,
+2. shows the inverse formula dividing by zero,
+3. contrasts it with det([[2,1],[1,1]]) = 1.
+"""
+
+# A model that keeps going after its action and invents the tool result.
+RUNAWAY = MULTILINE + "Observation: The student understood the example.\n" + "".join(
+    f"Thought: step {i} of an imagined continuation.\nAction: encourage_user\nAction Input: None\n"
+    "Observation: The tutor said something encouraging.\n" for i in range(40)
+)
+
+
+def time_per_call(func, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def stream_profile(text, chunk_size):
+    """Characters read when the action is known, when the step is complete, and in total."""
+    parser = ReActStreamParser()
+    read = 0
+    action_at = None
+    for i in range(0, len(text), chunk_size):
+        chunk = text[i:i + chunk_size]
+        read += len(chunk)
+        for event in parser.feed(chunk):
+            if event["field"] == "action" and action_at is None:
+                action_at = read
+        if parser.done:
+            break
+    parser.close()
+    return action_at, read, len(text), parser.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ReAct output parsing: legacy line parser vs streaming parser")
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--chunk", type=int, default=4, help="characters per streamed chunk (about one token)")
+    args = parser.parse_args()
+
+    print(f"{'case':>10} {'chars':>6} {'legacy us':>10} {'new us':>10} {'action at':>10} {'read':>6} {'stream=full':>12} {'legacy=new':>11}")
+    for name, text in (("short", SHORT), ("final", FINAL), ("multiline", MULTILINE), ("runaway", RUNAWAY)):
+        legacy_us = time_per_call(legacy_parse_llm_output, text, args.repeat)
+        new_us = time_per_call(parse_react_output, text, args.repeat)
+        action_at, read, total, streamed = stream_profile(text, args.chunk)
+        full = parse_react_output(text)
+        # Legacy results differ where it drops continuation lines or reads past the step.
+        print(f"{name:>10} {total:>6} {legacy_us:>10.2f} {new_us:>10.2f} {str(action_at or '-'):>10} {read:>6} "
+              f"{str(streamed == full):>12} {str(legacy_parse_llm_output(text) == full):>11}")
+
+
+if __name__ == "__main__":
+    main()
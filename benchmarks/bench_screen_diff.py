@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from screen_analysis import TILE_SIZE, ScreenAnalyzer, TesseractOCR, tile_hashes
+
+
+class SimulatedOCR:
+    """Stands in for OCR with a cost proportional to the pixels it is given."""
+
+    def __init__(self, ms_per_megapixel):
+        self.ms_per_megapixel = ms_per_megapixel
+        self.calls = 0
+        self.pixels = 0
+
+    def __call__(self, image):
+        pixels = image.width * image.height
+        self.calls += 1
+        self.pixels += pixels
+        time.sleep(pixels / 1e6 * self.ms_per_megapixel / 1000)
+        return [(0, 0, image.width, image.height, "text")]
+
+
+def make_captures(count, width, height, changed_fraction, seed=0):
+    """A text-like base screen, then captures that each edit small 96x24 patches covering `changed_fraction` of it."""
+    rng = np.random.default_rng(seed)
+    base = np.full((height, width, 3), 255, dtype=np.uint8)
+    base[rng.random((height, width)) < 0.08] = 0
+    captures = [base]
+    patch_h, patch_w = 24, 96
+    patches = max(1, int(round(changed_fraction * width * height / (patch_h * patch_w))))
+    current = base
+    for _ in range(count):
+        current = current.copy()
+        for _ in range(patches):
+            y = rng.integers(0, height - patch_h)
+            x = rng.integers(0, width - patch_w)
+            current[y:y + patch_h, x:x + patch_w] = rng.integers(0, 2, (patch_h, patch_w, 1), dtype=np.uint8) * 255
+        captures.append(current)
+    return captures
+
+
+def run(captures, ocr, full_frame):
+    # full_frame=True re-reads every capture whole, like the naive pipeline.
+    analyzer = ScreenAnalyzer(ocr=ocr, full_frame_ratio=-1.0 if full_frame else 0.5)
+    analyzer.update("bench", captures[0])
+    if hasattr(ocr, "pixels"):
+        ocr.pixels = 0  # the first capture is always read whole
+    start = time.perf_counter()
+    dirty = []
+    for capture in captures[1:]:
+        dirty.append(analyzer.update("bench", capture)["changed_tile_ratio"])
+    elapsed = time.perf_counter() - start
+    return (len(captures) - 1) / elapsed, float(np.mean(dirty))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen observation: tile diff + partial OCR vs full-frame OCR")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--captures", type=int, default=30)
+    parser.add_argument("--fractions", type=float, nargs="+", default=[0.001, 0.01, 0.05, 0.2])
+    parser.add_argument("--ocr-ms-per-mp", type=float, default=400.0,
+                        help="simulated OCR cost in ms per megapixel (tesseract is in the hundreds)")
+    parser.add_argument("--tesseract", action="store_true", help="use pytesseract instead of the simulated OCR")
+    args = parser.parse_args()
+
+    frame = make_captures(1, args.width, args.height, 0.0)[0]
+    start = time.perf_counter()
+    for _ in range(50):
+        tile_hashes(frame)
+    hash_ms = (time.perf_counter() - start) / 50 * 1000
+    print(f"{args.width}x{args.height} RGB, {TILE_SIZE}px tiles: hashing takes {hash_ms:.2f} ms per capture\n")
+
+    print(f"{'changed':>8} {'dirty tiles':>12} {'diff fps':>9} {'full fps':>9} {'speedup':>8} {'diff OCR px':>12} {'full OCR px':>12}")
+    for fraction in args.fractions:
+        captures = make_captures(args.captures, args.width, args.height, fraction)
+        results = []
+        for full_frame in (False, True):
+            ocr = TesseractOCR() if args.tesseract else SimulatedOCR(args.ocr_ms_per_mp)
+            fps, dirty = run(captures, ocr, full_frame)
+            pixels = getattr(ocr, "pixels", 0) / max(args.captures, 1)
+            results.append((fps, dirty, pixels))
+        (diff_fps, dirty, diff_px), (full_fps, _, full_px) = results
+        print(f"{fraction:>8.1%} {dirty:>12.1%} {diff_fps:>9.1f} {full_fps:>9.1f} {diff_fps / full_fps:>7.1f}x "
+              f"{diff_px:>12.0f} {full_px:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
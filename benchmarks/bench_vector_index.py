@@ -0,0 +1,78 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from vector_index import HashingEncoder, VectorIndex, normalize, recall_at_k
+
+
+def round_trip(index, directory, queries, k):
+    """
+    save -> load(mmap) -> save into the same directory -> load, checking that
+    the second copy still matches the first: saving over the files an index
+    is memory-mapped from must not corrupt them.
+    """
+    index.save(directory)
+    mapped = VectorIndex.load(directory, mmap=True)
+    expected = mapped.search(queries, k), mapped.search(queries, k, exact=True)
+    mapped.save(directory)
+    reloaded = VectorIndex.load(directory, mmap=False)
+    got = reloaded.search(queries, k), reloaded.search(queries, k, exact=True)
+    for (want_ids, want_scores), (ids, scores) in zip(expected, got):
+        if not (np.array_equal(want_ids, ids) and np.allclose(want_scores, scores)):
+            raise SystemExit(f"round trip through {directory} changed the search results")
+    if not (np.array_equal(np.asarray(mapped.vectors), reloaded.vectors) and mapped.keys == reloaded.keys):
+        raise SystemExit(f"round trip through {directory} changed the stored vectors")
+    return mapped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dense vector index: save/load round trip and search latency")
+    parser.add_argument("--sizes", default="1000,20000,100000")
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'vectors':>8} {'save s':>7} {'load ms':>8} {'exact ms':>9} {'ann ms':>7} {'recall':>7} {'round trip':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = normalize(rng.standard_normal((size, args.dim)))
+        queries = normalize(vectors[rng.integers(0, size, args.queries)] + 0.1 * rng.standard_normal((args.queries, args.dim)))
+        index = VectorIndex(HashingEncoder(args.dim))
+        index.add([f"v{i}" for i in range(size)], [""] * size, vectors)
+        index.build_ann()
+
+        directory = tempfile.mkdtemp(prefix="vector_index_")
+        try:
+            start = time.perf_counter()
+            index.save(directory)
+            save_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            loaded = VectorIndex.load(directory, mmap=True)
+            load_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            exact_ids, _ = loaded.search(queries, args.k, exact=True)
+            exact_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+            start = time.perf_counter()
+            ann_ids, _ = loaded.search(queries, args.k)
+            ann_ms = (time.perf_counter() - start) * 1000 / args.queries
+            del loaded
+
+            round_trip(index, directory, queries, args.k)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        print(f"{size:>8} {save_s:>7.2f} {load_ms:>8.1f} {exact_ms:>9.3f} {ann_ms:>7.3f} "
+              f"{recall_at_k(ann_ids, exact_ids):>7.3f} {'ok':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,55 @@
+import argparse
 import os
-import whisper
+import sys
 
-def stt_whisper(audio_file):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from transcription_service import (
+    CHUNK_SECONDS, OVERLAP_SECONDS, TRANSCRIBE_WORKERS, WHISPER_MODEL, TranscriptionService
+)
+
+def stt_whisper(audio_file, service=None):
+    # Pass a running service to reuse its loaded model across calls.
+    own_service = service is None
     try:
-        print('Loading whisper model')
-        model = whisper.load_model("base")
-        
+        if own_service:
+            print('Loading whisper model')
+            service = TranscriptionService(workers=0)
+
         print('transcription generation: ....')
-        result = model.transcribe(audio_file)
-        
+        result = service.transcribe_file(audio_file)
+
         print("\n -------- transcription -------------")
         print(result['text'])
         print("--------------------------------------\n")
+        return result
     except Exception as e:
         print(f"error occured : {e}")
-        
+    finally:
+        if own_service and service is not None:
+            service.close()
+
+def print_partial(path, text):
+    print(f"[{os.path.basename(path)}] ... {text}", flush=True)
+
 if __name__ == "__main__":
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    audio_file =  "C:/Users/sgarg10/harvard.wav"
-    print(audio_file)
-    stt_whisper(audio_file)
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Transcribe audio files or directories with a resident whisper model")
+    parser.add_argument("inputs", nargs="*", default=[os.path.join(script_dir, "test_data", "audio")],
+                        help="audio files or directories (default: test_data/audio)")
+    parser.add_argument("--model", default=WHISPER_MODEL)
+    parser.add_argument("--workers", type=int, default=TRANSCRIBE_WORKERS, help="worker processes; 0 runs in-process")
+    parser.add_argument("--chunk", type=float, default=CHUNK_SECONDS, help="chunk length in seconds")
+    parser.add_argument("--overlap", type=float, default=OVERLAP_SECONDS, help="overlap between chunks in seconds")
+    args = parser.parse_args()
+
+    service = TranscriptionService(args.model, args.workers, args.chunk, args.overlap)
+    try:
+        for result in service.transcribe_many(args.inputs, on_partial=print_partial):
+            print(f"\n -------- {result['path']} -------------")
+            print(result['text'])
+            print(f"audio {result['duration_seconds']}s, {result['chunks']} chunks, "
+                  f"took {result['elapsed_seconds']}s, real-time factor {result['real_time_factor']}")
+            print("--------------------------------------\n")
+    finally:
+        service.close()
@@ -1,30 +1,145 @@
 import json
 import os;
-from flask import Flask , request , jsonify
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import Flask , request , jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import requests
-from generate_token import orch_gen_token
-from simple_react_agent import react_loop
+from generate_token import TokenProvider
+from simple_react_agent import set_planner, mock_lmm_resp, tool_cache, TOOLS
+from session_scheduler import SchedulerFull, SessionScheduler
+from planner import PLANNER_BACKEND, create_planner
+from session_store import get_session_store
+from persistence import get_journal
+from watsonx_client import (
+    WATSON_MODEL_ID, WATSONX_MODEL_ID_TEXT, WATSONX_MODEL_ID_VISION, WATSONX_MODEL_ID_PARSING,
+    get_client, get_message_content
+)
+from frame_pipeline import FramePipeline, SessionBusy
+from frame_cache import FrameCache, dhash
+from image_utils import preprocess_image
+from transcription_service import TRANSCRIBE_PRELOAD, get_transcription_service, whisper_available
+from screen_analysis import SCREEN_OCR_BACKEND, ScreenAnalyzer, create_ocr, set_screen_analyzer
+from metrics import PROMETHEUS_CONTENT_TYPE, gauge, histogram, render_prometheus
+from structured_log import get_logger
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Session-Id"])
 
-keys = orch_gen_token()
-WATSON_API_KEY = keys['bearer_token']
-WATSON_PROJECT_ID = keys['project_id']
-WATSON_API_URL = "https://us-south.ml.cloud.ibm.com/ml/v1/text/chat?version=2023-05-29"
-WATSON_MODEL_ID = "meta-llama/llama-3-2-11b-vision-instruct"
-WATSONX_MODEL_ID_TEXT = "meta-llama/llama-3-3-70b-instruct"
-WATSONX_MODEL_ID_VISION = "meta-llama/llama-3-2-11b-vision-instruct"
-WATSONX_MODEL_ID_PARSING = "meta-llama/llama-3-8b-instruct"
+FRAME_RESULT_TIMEOUT = 120
+# How long /run-tutor-react waits for a run; a slower run keeps going and
+# can be polled at /tutor-runs/<run_id>.
+RUN_RESULT_TIMEOUT = float(os.environ.get("RUN_RESULT_TIMEOUT", "120"))
 
-print(WATSON_API_KEY)
+log = get_logger("app")
+HTTP_SECONDS = histogram("http_request_duration_seconds", "Flask request latency until the response is returned (first byte for streams).", ("route", "method", "status"))
+FRAMES_IN_FLIGHT = gauge("frame_pipeline_in_flight", "Video frames submitted and not yet finished.")
+PARSE_QUEUED = gauge("parse_batch_queued", "Descriptions waiting for the parsing micro-batcher.")
+FRAME_CACHE = gauge("frame_cache", "Frame cache counters.", ("stat",))
 
-current_multimodal_observations = {
-    "video": {},
-    "audio": {},
-    "screen": {}
-}
+# keys.json is read and the IAM token minted on the first Watsonx call, and the
+# token is refreshed in the background before it expires.
+token_provider = TokenProvider()
+watsonx = get_client(token=token_provider)
+frame_pipeline = FramePipeline(watsonx, lambda: token_provider.project_id)
+frame_cache = FrameCache()
+# The ReAct planner shares the pooled client and token instead of minting its own.
+set_planner(create_planner(PLANNER_BACKEND, respond=mock_lmm_resp, client=watsonx,
+                           project_id=lambda: token_provider.project_id, tool_names=list(TOOLS)))
+
+# Screen captures are diffed per session and only changed regions are OCR'd;
+# the vision OCR backend reuses the pooled client.
+screen_analyzer = ScreenAnalyzer(create_ocr(SCREEN_OCR_BACKEND, client=watsonx, project_id=lambda: token_provider.project_id))
+set_screen_analyzer(screen_analyzer)
+# Whisper workers take seconds to start and load the model; start them in the
+# background now rather than inside the first analyse_audio tool call.
+if TRANSCRIBE_PRELOAD and whisper_available():
+    get_transcription_service().warm_up()
+
+# ReAct runs from every request share one event loop, so a student waiting on
+# a tool holds no Flask or tool thread.
+scheduler = SessionScheduler()
+
+# Observations are kept per session (see session_store.py) so concurrent
+# students, threads and worker processes never see each other's state.
+session_store = get_session_store()
+# Observations and ReAct transcripts are also journaled write-behind
+# (PERSIST_BACKEND), so a restarted process can replay a session's state.
+journal = get_journal()
+
+def _session_id(data):
+    """
+    The caller's session: "session_id" in the body or the X-Session-Id
+    header. A request with neither gets a fresh id instead of sharing one
+    session with every other anonymous caller; the id in use is returned
+    in the X-Session-Id response header so the client can send it back.
+    """
+    session_id = data.get('session_id') or request.headers.get('X-Session-Id')
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        log.info("Minted a session id for a request without one", session_id=session_id, route=request.path)
+    g.session_id = session_id
+    return session_id
+
+def get_observations(session_id):
+    observations = {"video": {}, "audio": {}, "screen": {}}
+    observations.update(session_store.get(session_id, "observations") or {})
+    return observations
+
+def set_observation(session_id, modality, observation):
+    session_store.update(session_id, "observations", lambda current: dict(current or {}, **{modality: observation}))
+    journal.record(session_id, "observation", {"modality": modality, "observation": observation})
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method, status=response.status_code)
+    if g.get("session_id"):
+        response.headers["X-Session-Id"] = g.session_id
+    return response
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_response(events):
+    # X-Accel-Buffering stops nginx-style proxies from holding the stream back.
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _image_payload(prompt, img_url):
+    return {
+        "model_id": WATSON_MODEL_ID,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": img_url
+                        }
+                    }
+                ]
+            }
+        ],
+        "project_id": token_provider.project_id,
+        "frequency_penalty": 0,
+        "max_tokens": 2000,
+        "presence_penalty": 0,
+        "temperature": 0,
+        "top_p": 1
+    }
 
 @app.route('/analyze-image' , methods =['POST'])
 def analyze_image():
@@ -36,218 +151,273 @@ def analyze_image():
         if not prompt or not img_url:
             return jsonify({"error": "Prompt and image data are required"}), 400
         
-        payload = {
-            "model_id": WATSON_MODEL_ID,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": img_url
-                            }
-                        }
-                    ]
-                }
-            ],
-            "project_id": WATSON_PROJECT_ID,
-            "frequency_penalty": 0,
-            "max_tokens": 2000,
-            "presence_penalty": 0,
-            "temperature": 0,
-            "top_p": 1
-        }
+        preprocess_stats = None
+        try:
+            img_url, _, preprocess_stats = preprocess_image(img_url)
+        except (ValueError, OSError) as e:
+            log.warning("Could not preprocess image, sending it unchanged", error=str(e))
         
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {WATSON_API_KEY}"
-        }
+        payload = _image_payload(prompt, img_url)
+
         try:
-            response = requests.post(WATSON_API_URL, headers=headers, json=payload)
-            response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-            result = response.json()
+            result = watsonx.chat(payload)  # Raises for bad status codes (4xx or 5xx)
         except requests.exceptions.RequestException as req_err:
-            print(f"Watsonx API request failed: {req_err}")
+            log.error("Watsonx API request failed", route="/analyze-image", error=str(req_err))
             # This ensures that a proper JSON response is always returned on API failure.
             return jsonify({"error": f"Failed to connect to Watsonx API: {req_err}"}), 502
         
-        result_text = "Could not get a valid response from the API."
-        if result.get('choices') and result['choices'][0].get('message'):
-            cont_pts = result['choices'][0]['message']['content']
-            if isinstance(cont_pts, list):
-                result_text = "\n\n".join(part.get('text', '') for part in cont_pts)
-            else:
-                result_text = cont_pts
-                
-        return jsonify({"result": result_text})
+        result_text = get_message_content(result)
+        if result_text is None:
+            result_text = "Could not get a valid response from the API."
+
+        return jsonify({"result": result_text, "preprocess": preprocess_stats})
     except requests.exceptions.RequestException as e:
-        print(f"request failed: {e}")
+        log.error("Request failed", route="/analyze-image", error=str(e))
         return jsonify({"error": "Failed to connect to watsonx endpoint"}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in the analyze-image function: {e}")
+        log.exception("An unexpected error occurred in the analyze-image function", error=str(e))
         return jsonify({"error": f"An internal server error occurred: {e}"}), 500
 
-@app('/process-video-frame', methods=['POST'])
+@app.route('/analyze-image-stream', methods=['POST'])
+def analyze_image_stream():
+    """
+    Same as /analyze-image, but the answer is streamed back as Server-Sent
+    Events: one "delta" event per chunk of generated text, then "done" with
+    the full text (or "error").
+    """
+    data = request.get_json(silent=True) or {}
+    prompt = data.get('prompt')
+    img_url = data.get('imageUrl')
+
+    if not prompt or not img_url:
+        return jsonify({"error": "Prompt and image data are required"}), 400
+
+    try:
+        preprocess_stats = None
+        try:
+            img_url, _, preprocess_stats = preprocess_image(img_url)
+        except (ValueError, OSError) as e:
+            log.warning("Could not preprocess image, sending it unchanged", error=str(e))
+        payload = _image_payload(prompt, img_url)
+    except Exception as e:
+        log.exception("An unexpected error occurred in the analyze-image-stream function", error=str(e))
+        return jsonify({"error": f"An internal server error occurred: {e}"}), 500
+
+    def events():
+        yield _sse("preprocess", preprocess_stats)
+        parts = []
+        try:
+            for delta in watsonx.chat_stream(payload):
+                parts.append(delta)
+                yield _sse("delta", {"text": delta})
+        except requests.exceptions.RequestException as req_err:
+            log.error("Watsonx API stream failed", route="/analyze-image-stream", error=str(req_err))
+            yield _sse("error", {"error": f"Failed to connect to Watsonx API: {req_err}"})
+            return
+        except Exception as e:
+            log.exception("Watsonx API stream failed unexpectedly", route="/analyze-image-stream", error=str(e))
+            yield _sse("error", {"error": f"An internal server error occurred: {e}"})
+            return
+        yield _sse("done", {"result": "".join(parts) or "Could not get a valid response from the API."})
+
+    return _sse_response(events())
+
+@app.route('/process-video-frame', methods=['POST'])
 def process_video_frame():
     try:
-        data = request.json()
+        data = request.json
         img_url = data.get('imageUrl')
+        session_id = _session_id(data)
         
         if not img_url:
             return jsonify({"Error": "No image data"}) , 400
         
-        vision_prompt_desc =  "Describe the person's facial expression and body language, focusing on signs of mood, engagement, and concentration."
-        
-        vision_payload = {
-            "model_id": WATSON_MODEL_ID,
-            "messages": [
-                {
-                    "role" : "user",
-                    "content" : [
-                        {
-                            "type": "text",
-                            "text": vision_prompt_desc
-                        },
-                        {
-                            "type" : "image_url",
-                            "image_url" : {
-                            "url" : img_url
-                            }
-                        }
-                    ]                    
-                }
-            ],
-            "project_id" : WATSON_PROJECT_ID,
-            "frequency_penalty": 0,
-            "max_tokens": 2000,
-            "presence_penalty": 0,
-            "temperature": 0,
-            "top_p": 1
-        }
-        
-        headers = {
-            "Content-Type" : "application/json",
-            "Authorization" : f"Bearer {WATSON_API_KEY}"
-        }
-        
-        vision_desc_text = ""
+        # The frame is decoded once: downscaled and re-encoded for the vision
+        # model, and hashed so near-identical consecutive frames reuse the last
+        # observation instead of paying for another vision + parsing round trip.
+        frame_hash = None
+        preprocess_stats = None
         try:
-            response_vision = requests.post(WATSON_API_URL, headers=headers, json=vision_payload)
-            response_vision.raise_for_status()
-            watsonx_vision_result = response_vision.json()
-            
-            if watsonx_vision_result.get('choices') and watsonx_vision_result['choices'][0].get('message'):
-                vision_desc_text = watsonx_vision_result['choices'][0]['message']['content']
-            else:
-                vision_desc_text = "Vision model did not return valid content."
-                print("Warning: Vision model response structure unexpected.")
-                print(json.dumps(watsonx_vision_result, indent=2))
-
-        except requests.exceptions.RequestException as req_err:
-            print(f"Watsonx Vision API (description) request failed: {req_err}")
-            return jsonify({"error": f"Failed to get vision description: {req_err}"}), 502
+            img_url, frame, preprocess_stats = preprocess_image(img_url)
+            frame_hash = dhash(frame)
+        except (ValueError, OSError) as e:
+            log.warning("Could not decode frame, sending it unchanged and skipping cache", session_id=session_id, error=str(e))
+        if frame_hash is not None:
+            cached = frame_cache.get(session_id, frame_hash)
+            if cached is not None:
+                set_observation(session_id, "video", cached)
+                return jsonify({"status": "success", "observations": cached, "cache": dict(frame_cache.stats(), hit=True), "preprocess": preprocess_stats})
         
-        parsing_prompt = f"""
-        Analyze the following description of a person's mood, engagement, and concentration.
-        Extract the primary mood (e.g., focused, confused, frustrated, bored, engaged, neutral) and estimate their concentration level as an integer from 0 to 100.
-        Return the output as a JSON object with two keys: "mood" (string) and "concentration_level" (integer).
-        If a value cannot be confidently extracted, use "unknown" for mood and 0 for concentration_level.
-
-        Description: "{vision_desc_text}"
-        """
-        
-        parsing_payload = {
-            "model_id": WATSONX_MODEL_ID_PARSING, # Using the smaller LLM for parsing
-            "messages": [
-                {
-                    "role": "user",
-                    "content": parsing_prompt
-                }
-            ],
-            "project_id": WATSON_PROJECT_ID,
-            "decoding_method": "greedy",
-            "max_new_tokens": 100, 
-            "temperature": 0.1
-        }
+        # Vision and parsing run on the frame pipeline's event loop. With
+        # "wait": false the worker returns immediately and the observation is
+        # recorded once the frame finishes, so one worker keeps many frames in flight.
+        try:
+            future = frame_pipeline.submit(session_id, img_url)
+        except SessionBusy as e:
+            log.warning("Video frame refused", session_id=session_id, error=str(e))
+            return jsonify({"error": f"Too many frames in flight for this session, retry shortly: {e}",
+                            "observations": get_observations(session_id)["video"]}), 429, {"Retry-After": "1"}
+        future.add_done_callback(lambda f: _record_video_observation(f, session_id))
+        if frame_hash is not None:
+            future.add_done_callback(lambda f: _cache_video_observation(f, session_id, frame_hash))
+        cache_stats = dict(frame_cache.stats(), hit=False)
         
-        parsed_mood = "unknown"
-        parsed_concentration = 0
+        if not data.get('wait', True):
+            return jsonify({"status": "pending", "in_flight": frame_pipeline.in_flight(), "observations": get_observations(session_id)["video"], "cache": cache_stats, "preprocess": preprocess_stats}), 202
         
         try:
-            response_parsing = requests.post(WATSON_API_URL, headers=headers, json=parsing_payload)
-            response_parsing.raise_for_status()
-            watsonx_parsing_result = response_parsing.json()
-
-            if watsonx_parsing_result.get('choices') and watsonx_parsing_result['choices'][0].get('message'):
-                parsed_content_str = watsonx_parsing_result['choices'][0]['message']['content']
-                # Attempt to parse the string content as JSON
-                try:
-                    parsed_data = json.loads(parsed_content_str)
-                    parsed_mood = parsed_data.get("mood", "unknown")
-                    parsed_concentration = parsed_data.get("concentration_level", 0)
-                except json.JSONDecodeError:
-                    print(f"Warning: Failed to JSON parse LLM response: {parsed_content_str}")
-                    if "Mood:" in parsed_content_str and "Concentration:" in parsed_content_str:
-                        try:
-                            mood_part = parsed_content_str.split("Mood:")[1].split(",")[0].strip()
-                            concentration_part = parsed_content_str.split("Concentration:")[1].split(".")[0].strip()
-                            parsed_mood = mood_part.lower()
-                            parsed_concentration = int(concentration_part)
-                        except (ValueError, IndexError):
-                            print(f"Warning: Simple parsing also failed for: {parsed_content_str}")
-            else:
-                print("Warning: Parsing LLM did not return valid content.")
-                print(json.dumps(watsonx_parsing_result, indent=2))
-
+            observations = future.result(timeout=FRAME_RESULT_TIMEOUT)
         except requests.exceptions.RequestException as req_err:
-            print(f"Watsonx LLM (parsing) API request failed: {req_err}")
-        except Exception as e:
-            print(f"An unexpected error occurred during parsing LLM call: {e}")
-        
-        current_multimodal_observations["video"] = {
-            "modality": "video",
-            "mood": parsed_mood,
-            "concentration_level": parsed_concentration
-        }
-        print(f"Updated video observations: {current_multimodal_observations['video']}")
+            log.error("Watsonx Vision API (description) request failed", session_id=session_id, error=str(req_err))
+            return jsonify({"error": f"Failed to get vision description: {req_err}"}), 502
 
-        return jsonify({"status": "success", "observations": current_multimodal_observations["video"]})
+        return jsonify({"status": "success", "observations": observations, "cache": cache_stats, "preprocess": preprocess_stats})
 
     except Exception as e:
-        print(f"An unexpected error occurred in /process-video-frame: {e}")
+        log.exception("An unexpected error occurred in /process-video-frame", error=str(e))
         return jsonify({"error": f"An internal server error occurred: {e}"}), 500
 
+def _record_video_observation(future, session_id):
+    if future.cancelled() or future.exception() is not None:
+        return
+    set_observation(session_id, "video", future.result())
+    log.info("Updated video observations", session_id=session_id, observation=future.result())
+
+def _cache_video_observation(future, session_id, frame_hash):
+    # Fallback observations (see video_analysis.unknown_mood) stand in for a
+    # failed call; caching one would serve that failure to every similar frame.
+    if future.cancelled() or future.exception() is not None or "error" in future.result():
+        return
+    frame_cache.put(session_id, frame_hash, future.result())
+
+
+@app.route('/process-screen-capture', methods=['POST'])
+def process_screen_capture():
+    """
+    Updates the session's screen observation from a capture (a base64 data
+    URL). Only tiles that changed since the previous capture are read.
+    """
+    data = request.json or {}
+    img_url = data.get('imageUrl')
+    session_id = _session_id(data)
+    if not img_url:
+        return jsonify({"Error": "No image data"}), 400
+    try:
+        observation = screen_analyzer.update(session_id, img_url)
+    except (ValueError, OSError) as e:
+        log.warning("Could not decode screen capture", session_id=session_id, error=str(e))
+        return jsonify({"error": f"Could not decode screen capture: {e}"}), 400
+    except requests.exceptions.RequestException as req_err:
+        log.error("Screen OCR request failed", session_id=session_id, error=str(req_err))
+        return jsonify({"error": f"Failed to read screen capture: {req_err}"}), 502
+    set_observation(session_id, "screen", observation)
+    return jsonify({"status": "success", "observations": observation})
+
+@app.route('/pipeline-stats', methods=['GET'])
+def pipeline_stats():
+    return jsonify({"frame_pipeline": frame_pipeline.stats(), "frame_cache": frame_cache.stats(), "screen": screen_analyzer.stats(),
+                    "scheduler": scheduler.stats(), "tool_cache": tool_cache.stats(), "journal": journal.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Latency, size and token histograms plus pipeline gauges in Prometheus text format."""
+    FRAMES_IN_FLIGHT.set(frame_pipeline.in_flight())
+    if frame_pipeline.parse_batcher is not None:
+        PARSE_QUEUED.set(frame_pipeline.parse_batcher.stats()["queued"])
+    for stat, value in frame_cache.stats().items():
+        if isinstance(value, (int, float)):
+            FRAME_CACHE.set(value, stat=stat)
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def _scheduler_full(e):
+    log.warning("Tutor run refused", error=str(e))
+    return jsonify({"error": f"Tutor is at capacity, retry shortly: {e}"}), 503, {"Retry-After": "1"}
 
 @app.route('/run-tutor-react', methods=['POST'])
 def run_tutor_react():
+    session_id = None
     try:
-        data = request.json
+        data = request.get_json(silent=True) or {}
+        session_id = _session_id(data)
         initial_state = data.get('initial_state', "The student is starting a new session on Linear Algebra.")
         max_iterations = data.get('max_iterations', 5)
         time_constraint_minutes = data.get('time_constraint_minutes', 10)
+        # After a restart the session's observations and history come back from the journal.
+        journal.restore(session_store, session_id)
 
-        final_response = react_loop(
-            initial_state=initial_state,
-            max_iterations=max_iterations,
-            time_constraint_minutes=time_constraint_minutes,
-            
-            video_obs=current_multimodal_observations["video"],
-            audio_obs=current_multimodal_observations["audio"],
-            screen_obs=current_multimodal_observations["screen"]
-        )
-        
-        return jsonify({"tutor_response": final_response, "latest_observations": current_multimodal_observations})
+        try:
+            run = scheduler.submit(
+                init_state=initial_state,
+                max_it=max_iterations,
+                time_constr=time_constraint_minutes,
+                session_id=session_id
+            )
+        except SchedulerFull as e:
+            return _scheduler_full(e)
+
+        # With "wait": false the run id is returned at once; poll /tutor-runs/<run_id>.
+        if not data.get('wait', True):
+            return jsonify(dict(run.status(), status="pending")), 202
+
+        try:
+            final_response = run.future.result(timeout=RUN_RESULT_TIMEOUT)
+        except FutureTimeout:
+            log.warning("Tutor run still running after the request timeout", session_id=session_id, run_id=run.run_id, timeout=RUN_RESULT_TIMEOUT)
+            return jsonify(dict(run.status(), error=f"Tutor run did not finish within {RUN_RESULT_TIMEOUT:g}s; poll /tutor-runs/{run.run_id}")), 504
+
+        return jsonify({"tutor_response": final_response, "run": run.status(), "latest_observations": get_observations(session_id)})
 
     except Exception as e:
-        print(f"Error running ReAct agent: {e}")
+        log.exception("Error running ReAct agent", session_id=session_id, error=str(e))
         return jsonify({"error": f"Failed to run tutor agent: {e}"}), 500
 
+@app.route('/run-tutor-react-stream', methods=['POST'])
+def run_tutor_react_stream():
+    """
+    Runs the ReAct tutor like /run-tutor-react but streams every step
+    (thought, action, observation, ...) as a Server-Sent Event while the loop
+    runs; the final "done" event carries the tutor response.
+    """
+    data = request.get_json(silent=True) or {}
+    session_id = _session_id(data)
+    initial_state = data.get('initial_state', "The student is starting a new session on Linear Algebra.")
+    max_iterations = data.get('max_iterations', 5)
+    time_constraint_minutes = data.get('time_constraint_minutes', 10)
+
+    journal.restore(session_store, session_id)
+    try:
+        steps = scheduler.stream(initial_state, max_iterations, time_constraint_minutes, session_id)
+    except SchedulerFull as e:
+        return _scheduler_full(e)
+
+    def events():
+        try:
+            for step in steps:
+                if step["type"] == "done":
+                    yield _sse("done", {"tutor_response": step["result"], "latest_observations": get_observations(session_id)})
+                else:
+                    yield _sse(step["type"], step)
+        except Exception as e:
+            log.exception("Error running ReAct agent", session_id=session_id, error=str(e))
+            yield _sse("error", {"error": f"Failed to run tutor agent: {e}"})
+
+    return _sse_response(events())
+
+@app.route('/tutor-runs/<run_id>', methods=['GET'])
+def tutor_run_status(run_id):
+    run = scheduler.get(run_id)
+    if run is None:
+        return jsonify({"error": "Unknown run id"}), 404
+    return jsonify(dict(run.status(), latest_observations=get_observations(run.session_id)))
+
+@app.route('/sessions/<session_id>/transcript', methods=['GET'])
+def session_transcript(session_id):
+    """The session's journaled state: latest observations, performance summary and recent ReAct steps."""
+    state = journal.replay(session_id)
+    performance = state["performance"]
+    return jsonify(dict(state, performance=performance.summary() if performance is not None else None))
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', debug=True)
 
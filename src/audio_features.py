@@ -0,0 +1,220 @@
+import os
+import struct
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+FRAME_MS = 25
+HOP_MS = 10
+# Frames this far above the noise floor count as speech; unvoiced sounds
+# (high zero-crossing rate) get a lower bar so "s"/"f" are not pauses.
+VAD_THRESHOLD_DB = float(os.environ.get("AUDIO_VAD_THRESHOLD_DB", "12"))
+VAD_UNVOICED_MARGIN_DB = 6.0
+UNVOICED_ZCR = 0.25
+# Silences shorter than this are gaps between words, not pauses.
+MIN_PAUSE_SECONDS = float(os.environ.get("AUDIO_MIN_PAUSE_SECONDS", "0.25"))
+LONG_PAUSE_SECONDS = 1.0
+# Voiced, flat stretches of this length next to a pause look like "um"/"uh".
+FILLER_SECONDS = (0.25, 1.0)
+FILLER_MAX_ZCR = 0.1
+FILLER_MAX_STD_DB = 3.0
+# Energy peaks at least this far apart and this prominent are syllable nuclei.
+SYLLABLE_MIN_GAP_SECONDS = 0.1
+SYLLABLE_PROMINENCE_DB = 2.0
+BLOCK_SECONDS = 10.0
+# Sample rate assumed for live microphone chunks passed without one.
+LIVE_SAMPLE_RATE = int(os.environ.get("AUDIO_LIVE_SAMPLE_RATE", "16000"))
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def open_wav_memmap(path):
+    """
+    Memory-maps the sample data of a WAV file without reading it. Returns
+    (samples, rate, scale): `samples` is a (frames, channels) array backed
+    by the file, and samples * scale are floats in [-1, 1].
+    """
+    with open(path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = f.read(size)
+            elif chunk_id == b"data":
+                offset = f.tell()
+                break
+            else:
+                f.seek(size, os.SEEK_CUR)
+            if size % 2:
+                f.seek(1, os.SEEK_CUR)  # chunks are word aligned
+    if fmt is None:
+        raise ValueError(f"{path} has no fmt chunk")
+    format_tag, channels, rate = struct.unpack("<HHI", fmt[:8])
+    bits = struct.unpack("<H", fmt[14:16])[0]
+    if format_tag == _WAVE_FORMAT_EXTENSIBLE:
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+    if format_tag == _WAVE_FORMAT_PCM and bits in (8, 16, 32):
+        dtype, scale = {8: (np.uint8, 1 / 128.0), 16: (np.dtype("<i2"), 1 / 32768.0), 32: (np.dtype("<i4"), 1 / 2147483648.0)}[bits]
+    elif format_tag == _WAVE_FORMAT_FLOAT and bits in (32, 64):
+        dtype, scale = np.dtype(f"<f{bits // 8}"), 1.0
+    else:
+        raise ValueError(f"unsupported WAV encoding (format {format_tag}, {bits} bits)")
+    frames = min(size, os.path.getsize(path) - offset) // (np.dtype(dtype).itemsize * channels)
+    samples = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+    return samples, rate, scale
+
+
+def _mono(block, scale, unsigned):
+    x = block.astype(np.float32)
+    if unsigned:
+        x -= 128.0
+    x = x.mean(axis=1) if x.ndim == 2 and x.shape[1] > 1 else x.reshape(-1)
+    return x * np.float32(scale)
+
+
+def frame_features(samples, rate, scale=1.0):
+    """
+    Per-frame energy (dBFS) and zero-crossing rate for 25 ms frames every
+    10 ms. `samples` is a (frames, channels) or 1-D array, e.g. a memmap;
+    it is read in BLOCK_SECONDS blocks so memory stays bounded for long
+    recordings. Frames are strided views of each block, not copies.
+    """
+    frame = int(rate * FRAME_MS / 1000)
+    hop = int(rate * HOP_MS / 1000)
+    total = len(samples)
+    if total < frame:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    n_frames = 1 + (total - frame) // hop
+    unsigned = samples.dtype == np.uint8
+    frames_per_block = max(1, int(BLOCK_SECONDS * 1000 / HOP_MS))
+    energy_db = np.empty(n_frames, dtype=np.float32)
+    zcr = np.empty(n_frames, dtype=np.float32)
+    for first in range(0, n_frames, frames_per_block):
+        count = min(frames_per_block, n_frames - first)
+        start = first * hop
+        x = _mono(samples[start:start + (count - 1) * hop + frame], scale, unsigned)
+        frames = sliding_window_view(x, frame)[::hop]
+        power = np.einsum("ij,ij->i", frames, frames) / frame
+        energy_db[first:first + count] = 10.0 * np.log10(power + 1e-10)
+        signs = np.signbit(x)
+        crossings = sliding_window_view(signs[1:] != signs[:-1], frame - 1)[::hop]
+        zcr[first:first + count] = crossings.sum(axis=1) / (frame - 1)
+    return energy_db, zcr
+
+
+def _runs(mask):
+    """(start, length) of each run of True in a boolean array."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = edges[::2], edges[1::2]
+    return starts, ends - starts
+
+
+def voice_activity(energy_db, zcr):
+    """Energy VAD relative to the recording's own noise floor, with a ZCR assist for unvoiced sounds."""
+    if len(energy_db) == 0:
+        return np.zeros(0, dtype=bool)
+    floor = np.percentile(energy_db, 10)
+    threshold = floor + VAD_THRESHOLD_DB
+    speech = (energy_db > threshold) | ((energy_db > threshold - VAD_UNVOICED_MARGIN_DB) & (zcr > UNVOICED_ZCR))
+    # Bridge gaps too short to be pauses so words are not split into pieces.
+    min_gap = int(round(MIN_PAUSE_SECONDS * 1000 / HOP_MS))
+    starts, lengths = _runs(~speech)
+    for start, length in zip(starts, lengths):
+        if length < min_gap and start > 0 and start + length < len(speech):
+            speech[start:start + length] = True
+    return speech
+
+
+def analyze_waveform(samples, rate, scale=1.0):
+    """
+    Hesitation features of a recording or live chunk: pause ratio and pause
+    statistics, filler-like voiced stretches, speaking rate from syllable
+    nuclei, and a 0-1 `speech_hesitation` score combining them.
+    """
+    duration = len(samples) / rate
+    energy_db, zcr = frame_features(samples, rate, scale)
+    speech = voice_activity(energy_db, zcr)
+    hop = HOP_MS / 1000.0
+    features = {"duration_seconds": round(duration, 2)}
+    voiced = np.flatnonzero(speech)
+    if len(voiced) == 0:
+        features.update({
+            "speech_seconds": 0.0, "pause_ratio": 1.0, "pause_count": 0, "long_pause_count": 0,
+            "mean_pause_seconds": 0.0, "max_pause_seconds": 0.0, "filler_count": 0,
+            "fillers_per_minute": 0.0, "syllables_per_second": 0.0, "speaking_rate": 0.0,
+            "speech_hesitation": 1.0 if duration > 0 else 0.0
+        })
+        return features
+
+    # Leading and trailing silence is not hesitation; measure within the span of speech.
+    span = speech[voiced[0]:voiced[-1] + 1]
+    span_energy = energy_db[voiced[0]:voiced[-1] + 1]
+    span_zcr = zcr[voiced[0]:voiced[-1] + 1]
+    span_seconds = len(span) * hop
+    speech_seconds = float(span.sum()) * hop
+
+    pause_starts, pause_lengths = _runs(~span)
+    pause_seconds = pause_lengths * hop
+    long_pauses = int((pause_seconds >= LONG_PAUSE_SECONDS).sum())
+
+    # Filler candidates: speech runs of filler length that are voiced (low
+    # ZCR), flat in energy and border a pause.
+    speech_starts, speech_lengths = _runs(span)
+    fillers = 0
+    min_len, max_len = (int(round(s / hop)) for s in FILLER_SECONDS)
+    for start, length in zip(speech_starts, speech_lengths):
+        if min_len <= length <= max_len:
+            end = start + length
+            borders_pause = (start > 0 and not span[start - 1]) or (end < len(span) and not span[end])
+            if (borders_pause and span_zcr[start:end].mean() < FILLER_MAX_ZCR
+                    and span_energy[start:end].std() < FILLER_MAX_STD_DB):
+                fillers += 1
+
+    # Syllable nuclei: local maxima of the smoothed energy inside speech.
+    smooth = np.convolve(span_energy, np.ones(5, dtype=np.float32) / 5, mode="same")
+    is_peak = np.zeros(len(smooth), dtype=bool)
+    if len(smooth) > 2:
+        is_peak[1:-1] = (smooth[1:-1] > smooth[:-2]) & (smooth[1:-1] >= smooth[2:])
+    window = max(1, int(round(SYLLABLE_MIN_GAP_SECONDS / hop)))
+    local_min = sliding_window_view(np.pad(smooth, window, mode="edge"), 2 * window + 1).min(axis=1)
+    is_peak &= smooth - local_min >= SYLLABLE_PROMINENCE_DB
+    peaks = np.flatnonzero(is_peak & span)
+    syllables = int(len(peaks) - (np.diff(peaks) < window).sum()) if len(peaks) else 0
+
+    pause_ratio = 1.0 - speech_seconds / span_seconds
+    minutes = span_seconds / 60.0
+    fillers_per_minute = fillers / minutes if minutes else 0.0
+    long_pauses_per_minute = long_pauses / minutes if minutes else 0.0
+    hesitation = (
+        0.5 * min(pause_ratio / 0.5, 1.0)
+        + 0.25 * min(long_pauses_per_minute / 6.0, 1.0)
+        + 0.25 * min(fillers_per_minute / 10.0, 1.0)
+    )
+    features.update({
+        "speech_seconds": round(speech_seconds, 2),
+        "pause_ratio": round(pause_ratio, 3),
+        "pause_count": int(len(pause_lengths)),
+        "long_pause_count": long_pauses,
+        "mean_pause_seconds": round(float(pause_seconds.mean()), 2) if len(pause_seconds) else 0.0,
+        "max_pause_seconds": round(float(pause_seconds.max()), 2) if len(pause_seconds) else 0.0,
+        "filler_count": fillers,
+        "fillers_per_minute": round(fillers_per_minute, 2),
+        "syllables_per_second": round(syllables / speech_seconds, 2) if speech_seconds else 0.0,
+        "speaking_rate": round(syllables / span_seconds, 2),
+        "speech_hesitation": round(hesitation, 2)
+    })
+    return features
+
+
+def analyze_wav(path):
+    """analyze_waveform() on a memory-mapped WAV file."""
+    samples, rate, scale = open_wav_memmap(path)
+    return analyze_waveform(samples, rate, scale)
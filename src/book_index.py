@@ -0,0 +1,306 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was were which with".split()
+)
+
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 40
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+INDEX_FORMAT_VERSION = 1
+_ARRAYS = ("term_offsets", "post_docs", "post_tfs", "doc_len", "doc_term_offsets", "doc_terms", "doc_tfs", "text_offsets")
+
+
+def write_atomic(path, write, mode="wb", **open_kwargs):
+    """
+    Writes `path` through a temporary file in the same directory that is then
+    renamed over it, so saving over an index that is memory-mapped from
+    `path` never truncates the mapped file underneath its readers.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, mode, **open_kwargs) as out:
+            write(out)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_text(text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Splits text into passages of `chunk_words` words overlapping by `overlap`."""
+    words = text.split()
+    if len(words) <= chunk_words:
+        return [text.strip()] if words else []
+    step = max(chunk_words - overlap, 1)
+    return [" ".join(words[start:start + chunk_words]) for start in range(0, len(words) - overlap, step)]
+
+
+class BookIndex:
+    """
+    BM25 inverted index over book passages.
+
+    Passages live in two segments. The base segment is a set of flat NumPy
+    arrays (CSR postings per term, a forward index per passage and a UTF-8
+    text blob) which save() writes to a directory and load() memory-maps, so
+    startup cost does not grow with the corpus. Passages added afterwards go
+    to a small in-memory delta segment, and removals are tombstones; save()
+    compacts everything back into a fresh base segment.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.vocab = {}          # term -> term id
+        self.keys = []           # doc id -> passage key
+        self._key_to_id = {}
+        self._base = None        # dict of arrays, see _ARRAYS
+        self._base_texts = None  # bytes-like blob of passage texts
+        self._base_terms = 0
+        # Delta segment: doc id -> (text, {term id: tf}, length) and term id -> {doc id: tf}.
+        self._delta_docs = {}
+        self._delta_postings = {}
+        self._deleted = set()
+        self._removed_df = Counter()  # df lost by tombstoned base passages
+        self.num_docs = 0
+        self.total_len = 0
+
+    # -- mutation ---------------------------------------------------------
+
+    def add_passage(self, key, text):
+        with self._lock:
+            if key in self._key_to_id:
+                self.remove(key)
+            tfs = Counter()
+            for token in tokenize(text):
+                term_id = self.vocab.get(token)
+                if term_id is None:
+                    term_id = self.vocab[token] = len(self.vocab)
+                tfs[term_id] += 1
+            doc_id = len(self.keys)
+            self.keys.append(key)
+            self._key_to_id[key] = doc_id
+            length = sum(tfs.values())
+            self._delta_docs[doc_id] = (text, tfs, length)
+            for term_id, tf in tfs.items():
+                self._delta_postings.setdefault(term_id, {})[doc_id] = tf
+            self.num_docs += 1
+            self.total_len += length
+            return doc_id
+
+    def add_document(self, name, text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+        """Chunks a whole document and indexes each chunk as `name#<n>`."""
+        return [self.add_passage(f"{name}#{i}", chunk)
+                for i, chunk in enumerate(chunk_text(text, chunk_words, overlap))]
+
+    def remove(self, key):
+        with self._lock:
+            doc_id = self._key_to_id.pop(key, None)
+            if doc_id is None:
+                return False
+            if doc_id in self._delta_docs:
+                _, tfs, length = self._delta_docs.pop(doc_id)
+                for term_id in tfs:
+                    postings = self._delta_postings[term_id]
+                    del postings[doc_id]
+                    if not postings:
+                        del self._delta_postings[term_id]
+            else:
+                base = self._base
+                start, end = base["doc_term_offsets"][doc_id], base["doc_term_offsets"][doc_id + 1]
+                self._removed_df.update(base["doc_terms"][start:end].tolist())
+                length = int(base["doc_len"][doc_id])
+                self._deleted.add(doc_id)
+            self.num_docs -= 1
+            self.total_len -= length
+            return True
+
+    # -- query ------------------------------------------------------------
+
+    def _df(self, term_id):
+        df = len(self._delta_postings.get(term_id, ()))
+        if term_id < self._base_terms:
+            offsets = self._base["term_offsets"]
+            df += int(offsets[term_id + 1] - offsets[term_id]) - self._removed_df.get(term_id, 0)
+        return df
+
+    def search(self, query, k=5):
+        """Returns up to k (key, score, text) tuples, best first."""
+        with self._lock:
+            if not self.num_docs:
+                return []
+            term_ids = {self.vocab[token] for token in tokenize(query) if token in self.vocab}
+            if not term_ids:
+                return []
+            n_docs = len(self.keys)
+            avg_len = self.total_len / self.num_docs
+            k1, b = self.k1, self.b
+            scores = np.zeros(n_docs, dtype=np.float32)
+            for term_id in term_ids:
+                df = self._df(term_id)
+                if df <= 0:
+                    continue
+                idf = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+                if term_id < self._base_terms:
+                    start, end = self._base["term_offsets"][term_id], self._base["term_offsets"][term_id + 1]
+                    docs = self._base["post_docs"][start:end]
+                    tfs = self._base["post_tfs"][start:end]
+                    norm = k1 * (1 - b + b * self._base["doc_len"][docs] / avg_len)
+                    scores[docs] += idf * tfs * (k1 + 1) / (tfs + norm)
+                for doc_id, tf in self._delta_postings.get(term_id, {}).items():
+                    norm = k1 * (1 - b + b * self._delta_docs[doc_id][2] / avg_len)
+                    scores[doc_id] += idf * tf * (k1 + 1) / (tf + norm)
+            if self._deleted:
+                scores[np.fromiter(self._deleted, dtype=np.int64)] = 0
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self.keys[i], float(scores[i]), self.get_text(int(i))) for i in ranked]
+
+    def get_text(self, doc_id):
+        if doc_id in self._delta_docs:
+            return self._delta_docs[doc_id][0]
+        offsets = self._base["text_offsets"]
+        return bytes(self._base_texts[offsets[doc_id]:offsets[doc_id + 1]]).decode("utf-8")
+
+    def __len__(self):
+        return self.num_docs
+
+    # -- persistence ------------------------------------------------------
+
+    def _live_docs(self):
+        # Yields (key, text, term ids, tfs) for every live passage in doc id order.
+        base = self._base
+        for doc_id, key in enumerate(self.keys):
+            if self._key_to_id.get(key) != doc_id:
+                continue
+            if doc_id in self._delta_docs:
+                text, tfs, _ = self._delta_docs[doc_id]
+                yield key, text, np.fromiter(tfs.keys(), np.int32, len(tfs)), np.fromiter(tfs.values(), np.int32, len(tfs))
+            else:
+                start, end = base["doc_term_offsets"][doc_id], base["doc_term_offsets"][doc_id + 1]
+                yield key, self.get_text(doc_id), base["doc_terms"][start:end], base["doc_tfs"][start:end]
+
+    def compact(self):
+        """Merges the delta segment and drops tombstones into a new in-memory base segment."""
+        with self._lock:
+            keys, texts, doc_terms, doc_tfs = [], [], [], []
+            for key, text, terms, tfs in self._live_docs():
+                keys.append(key)
+                texts.append(text.encode("utf-8"))
+                doc_terms.append(np.asarray(terms, dtype=np.int32))
+                doc_tfs.append(np.asarray(tfs, dtype=np.int32))
+            n_terms = len(self.vocab)
+            lengths = np.array([len(t) for t in doc_terms], dtype=np.int64)
+            doc_term_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=doc_term_offsets[1:])
+            flat_terms = np.concatenate(doc_terms) if doc_terms else np.zeros(0, np.int32)
+            flat_tfs = np.concatenate(doc_tfs) if doc_tfs else np.zeros(0, np.int32)
+            flat_docs = np.repeat(np.arange(len(keys), dtype=np.int32), lengths)
+            # Invert the forward index: sort (term, doc) pairs by term.
+            order = np.argsort(flat_terms, kind="stable")
+            term_offsets = np.zeros(n_terms + 1, dtype=np.int64)
+            np.cumsum(np.bincount(flat_terms, minlength=n_terms), out=term_offsets[1:])
+            text_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+            np.cumsum([len(t) for t in texts], out=text_offsets[1:])
+            doc_len = np.bincount(flat_docs, weights=flat_tfs, minlength=len(keys))
+
+            self._base = {
+                "term_offsets": term_offsets,
+                "post_docs": flat_docs[order],
+                "post_tfs": flat_tfs[order].astype(np.float32),
+                "doc_len": doc_len.astype(np.int32),
+                "doc_term_offsets": doc_term_offsets,
+                "doc_terms": flat_terms,
+                "doc_tfs": flat_tfs,
+                "text_offsets": text_offsets
+            }
+            self._base_texts = b"".join(texts)
+            self.keys = keys
+            self._key_to_id = {key: i for i, key in enumerate(keys)}
+            self._base_terms = n_terms
+            self._delta_docs = {}
+            self._delta_postings = {}
+            self._deleted = set()
+            self._removed_df = Counter()
+            self.num_docs = len(keys)
+            self.total_len = int(doc_len.sum())
+
+    def save(self, directory):
+        with self._lock:
+            self.compact()
+            os.makedirs(directory, exist_ok=True)
+            for name in _ARRAYS:
+                write_atomic(os.path.join(directory, f"{name}.npy"), lambda out: np.save(out, self._base[name]))
+            write_atomic(os.path.join(directory, "texts.bin"), lambda out: out.write(self._base_texts))
+            vocab = sorted(self.vocab, key=self.vocab.get)
+            meta = {"version": INDEX_FORMAT_VERSION, "k1": self.k1, "b": self.b, "vocab": vocab, "keys": self.keys}
+            write_atomic(os.path.join(directory, "meta.json"), lambda out: json.dump(meta, out), "w", encoding="utf-8")
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Opens a saved index; with mmap=True the arrays and texts are memory-mapped, not read."""
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as src:
+            meta = json.load(src)
+        if meta.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported book index version {meta.get('version')} in {directory}")
+        index = cls(k1=meta["k1"], b=meta["b"])
+        mode = "r" if mmap else None
+        index._base = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in _ARRAYS}
+        texts_path = os.path.join(directory, "texts.bin")
+        if mmap and os.path.getsize(texts_path):
+            index._base_texts = np.memmap(texts_path, dtype=np.uint8, mode="r")
+        else:
+            with open(texts_path, "rb") as src:
+                index._base_texts = src.read()
+        index.vocab = {term: i for i, term in enumerate(meta["vocab"])}
+        index.keys = meta["keys"]
+        index._key_to_id = {key: i for i, key in enumerate(index.keys)}
+        index._base_terms = len(index.vocab)
+        index.num_docs = len(index.keys)
+        index.total_len = int(np.asarray(index._base["doc_len"]).sum())
+        return index
+
+
+def build_index(passages):
+    """Builds a compacted index from a {key: text} mapping."""
+    index = BookIndex()
+    for key, text in passages.items():
+        index.add_passage(key, text)
+    index.compact()
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Chunk text files into a BM25 book index")
+    parser.add_argument("files", nargs="+", help="plain-text book files; each is chunked into passages")
+    parser.add_argument("--out", default=os.path.join(os.getcwd(), "book_index"))
+    parser.add_argument("--chunk-words", type=int, default=CHUNK_WORDS)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP)
+    args = parser.parse_args()
+
+    index = BookIndex.load(args.out) if os.path.exists(os.path.join(args.out, "meta.json")) else BookIndex()
+    for path in args.files:
+        with open(path, encoding="utf-8") as src:
+            added = index.add_document(os.path.splitext(os.path.basename(path))[0], src.read(),
+                                       args.chunk_words, args.overlap)
+        print(f"Indexed {len(added)} passages from {path}")
+    index.save(args.out)
+    print(f"Saved {len(index)} passages to {args.out}")
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+HAMMING_THRESHOLD = int(os.environ.get("FRAME_CACHE_HAMMING_THRESHOLD", "6"))
+TTL_SECONDS = float(os.environ.get("FRAME_CACHE_TTL_SECONDS", "15"))
+MAX_ENTRIES = int(os.environ.get("FRAME_CACHE_MAX_ENTRIES", "512"))
+
+
+def dhash(image, hash_size=8):
+    """
+    64-bit difference hash: the frame is shrunk to (hash_size+1) x hash_size
+    greyscale and each bit records whether a pixel is brighter than its right
+    neighbour. Small lighting changes and webcam noise flip only a few bits,
+    so near-identical frames end up a small Hamming distance apart.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class FrameCache:
+    """
+    Per-session cache of video observations keyed on a perceptual hash.
+
+    A lookup hits when a cached frame of the same session is within
+    `hamming_threshold` bits of the new frame and younger than `ttl` seconds.
+    Entries are evicted least-recently-used once `max_entries` is reached.
+    Entries are grouped by session, so a lookup only compares against that
+    session's frames however many sessions are cached.
+    """
+
+    def __init__(self, hamming_threshold=HAMMING_THRESHOLD, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.hamming_threshold = hamming_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sessions = {}  # session_id -> {hash: (observation, stored_at)}
+        self._order = OrderedDict()  # (session_id, hash) in least-recently-used order
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remove(self, session_id, frame_hash):
+        entries = self._sessions[session_id]
+        del entries[frame_hash]
+        if not entries:
+            del self._sessions[session_id]
+        self._order.pop((session_id, frame_hash), None)
+
+    def get(self, session_id, frame_hash):
+        now = time.monotonic()
+        with self._lock:
+            found = None
+            for cached_hash, (_, stored_at) in list(self._sessions.get(session_id, {}).items()):
+                if now - stored_at > self.ttl:
+                    self._remove(session_id, cached_hash)
+                    continue
+                if found is None and (cached_hash ^ frame_hash).bit_count() <= self.hamming_threshold:
+                    found = cached_hash
+            if found is None:
+                self.misses += 1
+                return None
+            self._order.move_to_end((session_id, found))
+            self.hits += 1
+            return self._sessions[session_id][found][0]
+
+    def put(self, session_id, frame_hash, observation):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions.setdefault(session_id, {})[frame_hash] = (observation, now)
+            self._order[(session_id, frame_hash)] = None
+            self._order.move_to_end((session_id, frame_hash))
+            # Other sessions' expired frames are dropped from the cold end.
+            while self._order:
+                oldest = next(iter(self._order))
+                full = len(self._order) > self.max_entries
+                if not full and now - self._sessions[oldest[0]][oldest[1]][1] <= self.ttl:
+                    break
+                self._remove(*oldest)
+                if full:
+                    self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._order),
+                "sessions": len(self._sessions),
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+            }
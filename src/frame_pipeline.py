@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from video_analysis import describe_frame, extract_mood, extract_moods
+from micro_batcher import MicroBatcher, BATCH_MAX_SIZE
+from metrics import counter
+
+# Upper bound on Watsonx calls in flight across all sessions. Matches the
+# client's connection pool so frames queue here rather than on the socket pool.
+MAX_IN_FLIGHT = int(os.environ.get("FRAME_PIPELINE_MAX_IN_FLIGHT", os.environ.get("WATSONX_POOL_MAXSIZE", "16")))
+# Frames one session may have submitted and unfinished: by default one in
+# the vision stage plus one waiting. More are refused rather than queued, so
+# a fast sender cannot pile up frames (each holding its base64 image) or
+# push its observation further and further behind.
+MAX_PER_SESSION = int(os.environ.get("FRAME_PIPELINE_MAX_PER_SESSION", "2"))
+
+REJECTED = counter("frame_pipeline_rejected_frames", "Frames refused because their session already had the maximum in flight.")
+
+
+class SessionBusy(RuntimeError):
+    pass
+
+
+class _SessionLane:
+    def __init__(self):
+        # asyncio.Lock wakes waiters in FIFO order, so frames of one session
+        # pass through each stage in the order they were submitted.
+        self.vision_lock = asyncio.Lock()
+        self.parsing_lock = asyncio.Lock()
+        self.in_flight = 0
+
+
+class FramePipeline:
+    """
+    Two-stage (vision -> parsing) pipeline for video frames, driven by an
+    asyncio event loop on a background thread.
+
+    Frames from different sessions run fully concurrently. Within a session
+    each stage handles one frame at a time, so frame N's parsing call overlaps
+    frame N+1's vision call instead of the two frames running back to back.
+    The HTTP calls themselves use the shared pooled client on a bounded
+    executor, so one Flask worker can have many frames in flight: submit()
+    returns immediately with a concurrent.futures.Future.
+
+    Parsing calls from all sessions go through a MicroBatcher, so frames
+    finishing vision at about the same time share one parsing request
+    (`parse_batch_size` <= 1 sends one request per frame instead).
+
+    A session may have at most `max_per_session` frames submitted and not
+    yet finished; submit() raises SessionBusy beyond that.
+    """
+
+    def __init__(self, client, project_id, max_in_flight=MAX_IN_FLIGHT, parse_batch_size=BATCH_MAX_SIZE,
+                 max_per_session=MAX_PER_SESSION):
+        self.client = client
+        # `project_id` may be a string or a zero-argument callable.
+        self.project_id = project_id
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="frame-io")
+        self.parse_batcher = None
+        if parse_batch_size > 1:
+            self.parse_batcher = MicroBatcher(self._parse_batch, max_batch_size=parse_batch_size, name="parse-batch")
+        self._lanes = {}
+        self.max_per_session = max_per_session
+        self._admitted = {}  # session_id -> frames submitted and not finished
+        self._admit_lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="frame-pipeline", daemon=True)
+        self._thread.start()
+
+    def _project_id(self):
+        return self.project_id() if callable(self.project_id) else self.project_id
+
+    async def _call(self, func, *args):
+        return await self.loop.run_in_executor(self._executor, func, *args)
+
+    def _parse_batch(self, descriptions):
+        # Descriptions the batch answer misses are parsed concurrently on the
+        # frame executor, so the batch's waiters are not held for N serial calls.
+        return extract_moods(self.client, descriptions, self._project_id(),
+                             executor=self._executor, on_fallback=self.parse_batcher.record_fallbacks)
+
+    async def _parse(self, description):
+        if self.parse_batcher is None:
+            return await self._call(extract_mood, self.client, description, self._project_id())
+        return await asyncio.wrap_future(self.parse_batcher.submit(description), loop=self.loop)
+
+    async def _process(self, session_id, img_url):
+        lane = self._lanes.get(session_id)
+        if lane is None:
+            lane = self._lanes[session_id] = _SessionLane()
+        lane.in_flight += 1
+        try:
+            async with lane.vision_lock:
+                description = await self._call(describe_frame, self.client, img_url, self._project_id())
+            async with lane.parsing_lock:
+                return await self._parse(description)
+        finally:
+            lane.in_flight -= 1
+            if lane.in_flight == 0:
+                del self._lanes[session_id]
+
+    def submit(self, session_id, img_url):
+        """
+        Schedules a frame and returns a concurrent.futures.Future resolving to
+        the {modality, mood, concentration_level} observation. The future raises
+        requests.exceptions.RequestException if the vision call failed.
+        Raises SessionBusy if the session already has `max_per_session`
+        frames in flight.
+        """
+        with self._admit_lock:
+            admitted = self._admitted.get(session_id, 0)
+            if admitted >= self.max_per_session:
+                REJECTED.inc()
+                raise SessionBusy(f"session already has {admitted} frames in flight")
+            self._admitted[session_id] = admitted + 1
+        future = asyncio.run_coroutine_threadsafe(self._process(session_id, img_url), self.loop)
+        future.add_done_callback(lambda _: self._release(session_id))
+        return future
+
+    def _release(self, session_id):
+        with self._admit_lock:
+            admitted = self._admitted.pop(session_id) - 1
+            if admitted:
+                self._admitted[session_id] = admitted
+
+    def in_flight(self):
+        return sum(lane.in_flight for lane in list(self._lanes.values()))
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight(),
+            "max_per_session": self.max_per_session,
+            "parse_batching": self.parse_batcher.stats() if self.parse_batcher is not None else None
+        }
+
+    def close(self):
+        if self.parse_batcher is not None:
+            self.parse_batcher.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False)
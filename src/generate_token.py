@@ -1,34 +1,23 @@
-import datetime
 import requests
 import os
 import json
-from ibm_watsonx_ai.foundation_models import ModelInference
-from ibm_watsonx_ai import Credentials
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
-
-def get_api_key(key_file_path):
-    try:
-        with open(key_file_path, 'r') as dat:
-            key = json.load(dat)
-            ibm_cloud_api_key = key['api_key']
-            ibm_project_id = key['project_id']
-        # print(f"loaded API key from keys.json : {ibm_cloud_api_key}")
-        # print(f"loaded project_id from keys.json : {ibm_project_id}")
-        return key
-
-    except FileNotFoundError:
-        print(f"Error: {key_file_path} not found.")
-        print("create 'keys' dir in cwd and keep 'keys.json' inside it.")
-        exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: {key_file_path} not valid JSON.")
-        exit(1)
-    except KeyError:
-        print(f"Error: {key_file_path} must have 'api_key' key-value pair.")
-        exit(1)
-
-def gen_token(ibm_cloud_api_key , iam_token_url):
-    
+import threading
+import time
+from structured_log import get_logger
+
+log = get_logger("token")
+
+IAM_TOKEN_URL = os.environ.get("IAM_TOKEN_URL", "https://iam.cloud.ibm.com/identity/token")
+# Refresh this many seconds before the IAM token's `expires_in` runs out.
+REFRESH_MARGIN_SECONDS = 300
+REFRESH_RETRY_SECONDS = 30
+
+def request_token(ibm_cloud_api_key , iam_token_url):
+    """
+    Exchanges the API key for an IAM token and returns the full payload
+    (access_token, expires_in, ...). Raises instead of exiting so it can be
+    used from long-running processes.
+    """
     iam_body = {
         "grant_type" : "urn:ibm:params:oauth:grant-type:apikey",
         "apikey" : ibm_cloud_api_key
@@ -38,32 +27,102 @@ def gen_token(ibm_cloud_api_key , iam_token_url):
         "Accept" : "application/json"
     }
 
-    try:
-        iam_response = requests.post(iam_token_url , data=iam_body , headers=iam_headers , verify=False)
-        iam_response.raise_for_status()
-        
-        iam_data = iam_response.json()
-        access_token = iam_data.get("access_token")
-        
-        if not access_token:
-            raise ValueError("not found 'access_token' in payload ")
-        
-        # print(f"generated token: {access_token}")
-        return access_token
-        
-    except requests.exceptions.RequestException as re:
-        print(f"Token request error: {re}")
-        exit(1)
-    except ValueError as e:
-        print(f"Error parsing payload: {e}")
-        exit(1)
-        
-def orch_gen_token():
-    key_file_path = os.path.join(os.getcwd() , "keys" , "keys.json")
-    iam_token_url = "https://iam.cloud.ibm.com/identity/token"
-    keys = get_api_key(key_file_path)
-    keys['bearer_token'] = gen_token(keys['api_key'] , iam_token_url)
-    return keys
-
-# if __name__ == '__main__':
-#     print(orch_gen_token())
\ No newline at end of file
+    iam_response = requests.post(iam_token_url , data=iam_body , headers=iam_headers , verify=False)
+    iam_response.raise_for_status()
+
+    iam_data = iam_response.json()
+    if not iam_data.get("access_token"):
+        raise ValueError("not found 'access_token' in payload ")
+    return iam_data
+
+
+class TokenProvider:
+    """
+    Thread-safe, lazily initialised IAM bearer token cache.
+
+    keys.json is read and the first token minted on the first call, not at
+    import. A daemon timer refreshes the token REFRESH_MARGIN_SECONDS before it
+    expires, and concurrent callers that find the token stale share a single
+    in-flight refresh instead of each hitting the IAM endpoint.
+
+    The provider is callable, so it can be passed directly as the `token` of a
+    WatsonxClient.
+    """
+
+    def __init__(self, key_file_path=None, iam_token_url=IAM_TOKEN_URL,
+                 refresh_margin=REFRESH_MARGIN_SECONDS, background_refresh=True):
+        self.key_file_path = key_file_path or os.path.join(os.getcwd() , "keys" , "keys.json")
+        self.iam_token_url = iam_token_url
+        self.refresh_margin = refresh_margin
+        self.background_refresh = background_refresh
+        self._keys = None
+        self._token = None
+        self._expires_at = 0.0
+        self._keys_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._timer = None
+
+    def _load_keys(self):
+        if self._keys is None:
+            with self._keys_lock:
+                if self._keys is None:
+                    with open(self.key_file_path, 'r') as dat:
+                        keys = json.load(dat)
+                    if 'api_key' not in keys or 'project_id' not in keys:
+                        raise KeyError(f"{self.key_file_path} must have 'api_key' and 'project_id'")
+                    self._keys = keys
+        return self._keys
+
+    @property
+    def project_id(self):
+        return self._load_keys()['project_id']
+
+    def _is_fresh(self):
+        # A small skew keeps us from handing out a token that expires in flight.
+        return self._token is not None and time.time() < self._expires_at - 5
+
+    def get_token(self):
+        if self._is_fresh():
+            return self._token
+        with self._refresh_lock:
+            # Whoever held the lock before us may already have refreshed.
+            if not self._is_fresh():
+                self._refresh_locked()
+            return self._token
+
+    __call__ = get_token
+
+    def invalidate(self):
+        """Forces the next get_token() to mint a new token (e.g. after a 401)."""
+        with self._refresh_lock:
+            self._expires_at = 0.0
+
+    def _refresh_locked(self):
+        keys = self._load_keys()
+        iam_data = request_token(keys['api_key'], self.iam_token_url)
+        expires_in = float(iam_data.get("expires_in", 3600))
+        self._token = iam_data["access_token"]
+        self._expires_at = time.time() + expires_in
+        self._schedule(max(expires_in - self.refresh_margin, 1))
+
+    def _background_refresh(self):
+        with self._refresh_lock:
+            try:
+                self._refresh_locked()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                log.warning("Background token refresh failed", retry_in_seconds=REFRESH_RETRY_SECONDS, error=str(e))
+                self._schedule(REFRESH_RETRY_SECONDS)
+
+    def _schedule(self, delay):
+        if not self.background_refresh:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,71 @@
+import base64
+import binascii
+import io
+import os
+import time
+from PIL import Image
+
+MAX_EDGE = int(os.environ.get("IMAGE_MAX_EDGE", "768"))
+JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "80"))
+
+
+def decode_data_url(img_url):
+    """
+    Splits a `data:<mime>;base64,<payload>` URL and returns (mime_type, raw_bytes).
+    The payload is sliced out and encoded to ASCII bytes before decoding.
+    That copy cannot be avoided from a str (b64decode would make it
+    internally anyway), but the decoded bytes are not copied again.
+    """
+    if not img_url.startswith("data:"):
+        raise ValueError("image must be a base64 data URL")
+    comma = img_url.find(",")
+    if comma == -1:
+        raise ValueError("malformed data URL")
+    header = img_url[5:comma]
+    if not header.endswith(";base64"):
+        raise ValueError("only base64 data URLs are supported")
+    try:
+        raw = base64.b64decode(img_url[comma + 1:].encode("ascii"), validate=False)
+    except (binascii.Error, UnicodeEncodeError) as e:
+        raise ValueError(f"invalid base64 payload: {e}")
+    return header[:-len(";base64")] or "application/octet-stream", raw
+
+
+def preprocess_image(img_url, max_edge=MAX_EDGE, quality=JPEG_QUALITY):
+    """
+    Decodes a data URL, shrinks it so the longest edge is at most `max_edge`,
+    re-encodes it as JPEG at `quality` and returns (data_url, image, stats).
+
+    JPEG sources are decoded at reduced scale via draft mode, so large webcam
+    frames are never fully inflated. If re-encoding would not make the payload
+    smaller, the original URL is kept. `image` is the decoded (possibly
+    downscaled) frame so callers can reuse it without decoding again.
+    """
+    start = time.perf_counter()
+    mime_type, raw = decode_data_url(img_url)
+    image = Image.open(io.BytesIO(raw))
+    original_size = image.size
+    if image.format == "JPEG":
+        image.draft("RGB", (max_edge, max_edge))
+    image.load()
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.BILINEAR)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    encoded = buf.getbuffer()
+
+    stats = {
+        "original_bytes": len(img_url),
+        "original_size": list(original_size),
+        "processed_size": list(image.size),
+        "original_mime": mime_type
+    }
+    if len(encoded) < len(raw):
+        img_url = (b"data:image/jpeg;base64," + base64.b64encode(encoded)).decode("ascii")
+    stats["processed_bytes"] = len(img_url)
+    stats["bytes_saved"] = stats["original_bytes"] - stats["processed_bytes"]
+    stats["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return img_url, image, stats
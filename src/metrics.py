@@ -0,0 +1,241 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from structured_log import get_logger
+
+# Seconds, bytes and token counts: wide enough for a 2 ms tool call and a
+# 60 s vision request alike.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+TOKEN_BUCKETS = (8, 32, 128, 512, 1024, 2048, 4096, 8192)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+log = get_logger("trace")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        # Missing labels render as "" rather than failing a request over metrics.
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self, items):
+        return [f"{self.name}_total{_label_text(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """
+    Prometheus-style histogram. observe() is a bisect and three additions
+    under a lock; buckets are only made cumulative when rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels):
+        """(count, sum) for one label set; handy in stats endpoints."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+SPAN_SECONDS = histogram("tutor_span_duration_seconds", "Duration of traced spans without a dedicated histogram.", ("span", "outcome"))
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "attributes")
+
+    def __init__(self, name, parent):
+        self.name = name
+        # Ids only need to be unique enough to group log lines, not secret.
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.perf_counter()
+        self.attributes = {}
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def span(name, histogram=None, detached=False, **labels):
+    """
+    Times the block and records it in `histogram` (labels plus an "outcome"
+    of ok, error or cancelled), or in tutor_span_duration_seconds when no
+    histogram is given. Spans nest through a context variable, so a tool
+    span started from a ReAct iteration carries the iteration's trace id;
+    ToolExecutor copies the context into its worker threads. Finished spans
+    are logged at DEBUG level with their ids and attributes.
+
+    Use detached=True inside generators: the span still records its parent
+    but does not become the current span, which would otherwise leak into
+    the consumer's context between yields.
+    """
+    parent = _current_span.get()
+    current = Span(name, parent)
+    token = None if detached else _current_span.set(current)
+    outcome = "ok"
+    try:
+        yield current
+    except GeneratorExit:
+        # A stream closed early by its reader is not a failure.
+        outcome = "cancelled"
+        raise
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - current.start
+        if token is not None:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                pass  # ended from another context
+        if histogram is None:
+            SPAN_SECONDS.observe(duration, span=name, outcome=outcome)
+        else:
+            histogram.observe(duration, outcome=outcome, **labels)
+        if log.isEnabledFor(logging.DEBUG):
+            fields = dict(labels, **current.attributes)
+            fields.update(span=name, trace_id=current.trace_id, span_id=current.span_id, parent_id=current.parent_id,
+                          duration_ms=round(duration * 1000, 3), outcome=outcome)
+            log.debug("span", **fields)
+
+
+def render_prometheus():
+    return REGISTRY.render()
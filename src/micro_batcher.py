@@ -0,0 +1,144 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from metrics import COUNT_BUCKETS, counter, histogram, span
+
+BATCH_MAX_SIZE = int(os.environ.get("PARSING_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("PARSING_BATCH_MAX_WAIT_MS", "20"))
+BATCH_MAX_CONCURRENT = int(os.environ.get("PARSING_BATCH_MAX_CONCURRENT", "4"))
+
+QUEUE_WAIT_SECONDS = histogram("batch_queue_wait_seconds", "Time an item waits before its batch is handled.", ("queue",))
+BATCH_SIZE = histogram("batch_size", "Items per handled batch.", ("queue",), buckets=COUNT_BUCKETS)
+BATCH_SECONDS = histogram("batch_handler_duration_seconds", "Time the batch handler takes per batch.", ("queue", "outcome"))
+FALLBACK_ITEMS = counter("batch_fallback_items", "Items the batch handler had to handle one by one because the batched call did not cover them.", ("queue",))
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from many threads and hands them to
+    `handler(items) -> results` in batches. A batch is closed once it holds
+    `max_batch_size` items or `max_wait_ms` have passed since its first item
+    arrived, whichever comes first, so a lone request waits at most
+    `max_wait_ms`. Up to `max_concurrent` batches are handled at once while
+    the next one is being collected.
+
+    submit() returns a concurrent.futures.Future for that item's result. If
+    the handler raises, or returns the wrong number of results, every item
+    in the batch fails with that error. A handler that falls back to
+    per-item work reports it with record_fallbacks().
+    """
+
+    def __init__(self, handler, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                 max_concurrent=BATCH_MAX_CONCURRENT, name="micro-batcher"):
+        self.handler = handler
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix=name)
+        self._metrics_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=1024)  # seconds, most recent items
+        self._handler_seconds = 0.0
+        self._items = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._fallback_items = 0
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._collect, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def _collect(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+            batch = [entry]
+            deadline = entry[2] + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._executor.submit(self._run, batch)
+            if stopping:
+                return
+
+    def _run(self, batch):
+        started = time.monotonic()
+        items = [item for item, _, _ in batch]
+        for _, _, enqueued in batch:
+            QUEUE_WAIT_SECONDS.observe(started - enqueued, queue=self.name)
+        BATCH_SIZE.observe(len(batch), queue=self.name)
+        try:
+            with span("batch", BATCH_SECONDS, queue=self.name):
+                results = self.handler(items)
+                if len(results) != len(items):
+                    raise ValueError(f"batch handler returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            error = e
+            results = None
+        elapsed = time.monotonic() - started
+        with self._metrics_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._handler_seconds += elapsed
+            self._queue_waits.extend(started - enqueued for _, _, enqueued in batch)
+            if results is None:
+                self._failed_batches += 1
+        for i, (_, future, _) in enumerate(batch):
+            if results is None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+    def record_fallbacks(self, count):
+        """Counts items of a batch that the handler had to handle one by one."""
+        if count:
+            FALLBACK_ITEMS.inc(count, queue=self.name)
+            with self._metrics_lock:
+                self._fallback_items += count
+
+    def stats(self):
+        with self._metrics_lock:
+            waits = sorted(self._queue_waits)
+            elapsed = time.monotonic() - self._started
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "failed_batches": self._failed_batches,
+                "items": self._items,
+                "fallback_items": self._fallback_items,
+                "queued": self._queue.qsize(),
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "queue_wait_ms_p50": round(waits[len(waits) // 2] * 1000, 2) if waits else 0.0,
+                "queue_wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000, 2) if waits else 0.0,
+                "mean_handler_ms": round(self._handler_seconds / self._batches * 1000, 2) if self._batches else 0.0,
+                "items_per_second": round(self._items / elapsed, 2) if elapsed > 0 else 0.0
+            }
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,229 @@
+import json
+import operator
+import os
+import re
+import threading
+import time
+from structured_log import get_logger
+
+MOCK_RULES_PATH = os.environ.get("MOCK_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_rules.json"))
+# How often the rules file's mtime is checked for a hot reload.
+MOCK_RULES_RELOAD_SECONDS = float(os.environ.get("MOCK_RULES_RELOAD_SECONDS", "1"))
+
+OBSERVATION_LABELS = {
+    "video": "Video Observation: ",
+    "audio": "Audio Observation: ",
+    "screen": "Screen Observation: "
+}
+
+_NUMERIC_OPS = {"lt": operator.lt, "le": operator.le, "gt": operator.gt, "ge": operator.ge}
+_TEXT_OPS = ("contains", "matches")
+# Text values seen per field whose pattern bits are remembered; statuses and
+# moods repeat, so the regex rarely runs twice for the same string.
+TEXT_MEMO_SIZE = 4096
+
+log = get_logger("mock_rules")
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _lookup(observations, path):
+    value = observations
+    for part in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+class CompiledRules:
+    """
+    A rules spec ({"rules": [...], "default": {...}}) compiled for matching
+    against observation dicts. A rule's "when" maps a dotted field path
+    ("video.mood") to {op: value} with op one of eq, lt, le, gt, ge,
+    contains or matches. The first rule whose conditions all hold gives the
+    response (thought plus action and action_input, or final_answer);
+    otherwise "default" does.
+
+    Every condition is one bit. Per field, eq values are a dict lookup,
+    numeric comparisons a short list, and all contains/matches patterns one
+    case-insensitive regex that finds every pattern, overlapping or not, in
+    a single pass, memoized per distinct value. A rule fires when its mask
+    is a subset of the bits set, so the cost depends on the rules and field
+    sizes, never on the prompt.
+    """
+
+    def __init__(self, spec):
+        self._fields = {}
+        self._rules = []
+        bit = 0
+        for index, rule in enumerate(spec.get("rules", [])):
+            name = rule.get("name", f"rule {index}")
+            if not rule.get("when"):
+                raise RuleError(f"{name}: 'when' must list at least one condition")
+            mask = 0
+            for path, conditions in rule["when"].items():
+                field = self._fields.setdefault(path, {"path": tuple(path.split(".")), "eq": {}, "numeric": [], "text": []})
+                for op, expected in conditions.items():
+                    if op == "eq":
+                        field["eq"][expected] = field["eq"].get(expected, 0) | (1 << bit)
+                    elif op in _NUMERIC_OPS:
+                        field["numeric"].append((_NUMERIC_OPS[op], expected, 1 << bit))
+                    elif op in _TEXT_OPS:
+                        pattern = re.escape(expected) if op == "contains" else expected
+                        field["text"].append((pattern, 1 << bit))
+                    else:
+                        raise RuleError(f"{name}: unknown operator '{op}' for {path}")
+                    mask |= 1 << bit
+                    bit += 1
+            self._rules.append((mask, name, self._response(name, rule)))
+        for field in self._fields.values():
+            text = field.pop("text")
+            field["regex"] = None
+            field["memo"] = {}
+            if text:
+                try:
+                    field["regex"] = re.compile(
+                        "".join(f"(?:(?=(?P<c{i}>{pattern})))?" for i, (pattern, _) in enumerate(text)),
+                        re.IGNORECASE
+                    )
+                except re.error as e:
+                    raise RuleError(f"bad pattern for {'.'.join(field['path'])}: {e}")
+                field["bits"] = {f"c{i}": bit for i, (_, bit) in enumerate(text)}
+        self._field_list = [(field["path"], field["eq"], field["numeric"], field["regex"], field.get("bits"), field["memo"])
+                            for field in self._fields.values()]
+        self.default = self._response("default", spec.get("default") or {"final_answer": "No rule matched."})
+        self.rule_count = len(self._rules)
+
+    @staticmethod
+    def _response(name, rule):
+        if "final_answer" in rule:
+            return f"\nThought: {rule.get('thought', '')}\nFinal Answer: {rule['final_answer']}\n"
+        if "action" not in rule:
+            raise RuleError(f"{name}: needs an 'action' or a 'final_answer'")
+        return f"\nThought: {rule.get('thought', '')}\nAction: {rule['action']}\nAction Input: {rule.get('action_input', 'None')}\n"
+
+    @staticmethod
+    def _text_bits(regex, group_bits, value):
+        bits = 0
+        for match in regex.finditer(value):
+            if match.lastindex:
+                for group, text in match.groupdict().items():
+                    if text is not None:
+                        bits |= group_bits[group]
+        return bits
+
+    def _bits(self, observations):
+        bits = 0
+        for path, eq, numeric, regex, group_bits, memo in self._field_list:
+            value = _lookup(observations, path)
+            if value is None:
+                continue
+            if isinstance(value, str):
+                bits |= eq.get(value, 0)
+                if regex is not None:
+                    found = memo.get(value)
+                    if found is None:
+                        found = self._text_bits(regex, group_bits, value)
+                        if len(memo) >= TEXT_MEMO_SIZE:
+                            memo.clear()
+                        memo[value] = found
+                    bits |= found
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                bits |= eq.get(value, 0)
+                for compare, threshold, bit in numeric:
+                    if compare(value, threshold):
+                        bits |= bit
+        return bits
+
+    def match(self, observations):
+        """Returns (rule name or "default", ReAct response text)."""
+        bits = self._bits(observations)
+        for mask, name, response in self._rules:
+            if bits & mask == mask:
+                return name, response
+        return "default", self.default
+
+
+class RuleEngine:
+    """
+    CompiledRules loaded from a JSON file and reloaded when its mtime
+    changes (checked at most every `reload_seconds`). A file that fails to
+    load keeps the previous rules in place and is logged.
+    """
+
+    def __init__(self, path=MOCK_RULES_PATH, reload_seconds=MOCK_RULES_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self.reloads = 0
+        self.rules = self._load()
+
+    def _load(self):
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "r") as f:
+            rules = CompiledRules(json.load(f))
+        self._mtime = mtime
+        return rules
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.reload_seconds:
+            return
+        with self._lock:
+            if now - self._checked < self.reload_seconds:
+                return
+            self._checked = now
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime == self._mtime:
+                    return
+                self._mtime = mtime  # a broken edit is reported once, not on every check
+                self.rules = self._load()
+                self.reloads += 1
+                log.info("Reloaded mock planner rules", path=self.path, rules=self.rules.rule_count)
+            except (OSError, ValueError) as e:
+                log.error("Could not reload mock planner rules; keeping the previous ones", path=self.path, error=str(e))
+
+    def match(self, observations):
+        self._maybe_reload()
+        return self.rules.match(observations)
+
+    def respond(self, observations):
+        return self.match(observations)[1]
+
+
+def observations_from_prompt(prompt):
+    """
+    Recovers the latest observation dicts from a planner prompt, for callers
+    that only have the prompt. Searches back from the end, so only the
+    current iteration's lines are read, however long the history is.
+    """
+    observations = {}
+    for modality, label in OBSERVATION_LABELS.items():
+        start = prompt.rfind(label)
+        if start < 0:
+            continue
+        start += len(label)
+        end = prompt.find("\n", start)
+        try:
+            observations[modality] = json.loads(prompt[start:end if end >= 0 else len(prompt)])
+        except ValueError:
+            continue
+    return observations
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_rule_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RuleEngine()
+    return _engine
@@ -0,0 +1,205 @@
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Watsonx endpoints the app calls, for offline
+# development and tests:
+#   POST /ml/v1/text/chat          chat completion (same response schema)
+#   POST /ml/v1/text/chat_stream   the same answer as Server-Sent Events
+#   POST /identity/token           IAM token exchange
+# Point the app at it with
+#   WATSONX_API_URL=http://localhost:8090/ml/v1/text/chat IAM_TOKEN_URL=http://localhost:8090/identity/token
+
+DEFAULT_PORT = 8090
+
+PLANNER_REPLY = """Thought: The student's state looks stable. I will keep observing.
+Final Answer: The tutor is observing and ready for the next interaction or to provide a general response."""
+VISION_REPLY = "The person is looking at the screen with a slight frown, leaning forward, and appears focused on the task."
+PARSING_REPLY = '{"mood": "focused", "concentration_level": 75}'
+
+
+def default_reply(payload):
+    """Canned answer chosen by model: vision description, mood JSON or a ReAct step."""
+    model_id = payload.get("model_id", "")
+    if "vision" in model_id:
+        return VISION_REPLY
+    if "8b" in model_id:
+        return PARSING_REPLY
+    return PLANNER_REPLY
+
+
+def _message_text(message):
+    content = message.get("content")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content or ""
+
+
+def _count_tokens(text):
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+class MockWatsonxServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer with the Watsonx handler. `reply` maps a request
+    payload to the answer text; `latency` seconds are slept per chat call
+    (spread over the chunks when streaming). Request counts are kept in `stats`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", DEFAULT_PORT), reply=default_reply, latency=0.0, require_auth=True):
+        super().__init__(address, _Handler)
+        self.reply = reply
+        self.latency = latency
+        self.require_auth = require_auth
+        self.stats = {"chat": 0, "chat_stream": 0, "token": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, code, message):
+        self.server.count("errors")
+        self._send_json(status, {
+            "errors": [{"code": code, "message": message}],
+            "trace": uuid.uuid4().hex,
+            "status_code": status
+        })
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.server.stats)
+        else:
+            self._send_error(404, "not_found", f"No route for GET {self.path}")
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if path == "/identity/token":
+            self.server.count("token")
+            self._send_json(200, {
+                "access_token": f"mock-{uuid.uuid4().hex}",
+                "refresh_token": "not_supported",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+                "expiration": int(time.time()) + 3600
+            })
+            return
+        if path not in ("/ml/v1/text/chat", "/ml/v1/text/chat_stream"):
+            self._send_error(404, "not_found", f"No route for POST {path}")
+            return
+        if self.server.require_auth and not (self.headers.get("Authorization") or "").startswith("Bearer "):
+            self._send_error(401, "authentication_token_not_valid", "Failed to authenticate the request due to missing or invalid token")
+            return
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self._send_error(400, "json_validation_error", "Request body is not valid JSON")
+            return
+        if not payload.get("model_id") or not payload.get("messages"):
+            self._send_error(400, "json_validation_error", "Fields 'model_id' and 'messages' are required")
+            return
+
+        text = self.server.reply(payload)
+        if path.endswith("chat_stream"):
+            self.server.count("chat_stream")
+            self._stream(payload, text)
+        else:
+            self.server.count("chat")
+            time.sleep(self.server.latency)
+            self._send_json(200, self._completion(payload, text))
+
+    def _completion(self, payload, text):
+        prompt_tokens = sum(_count_tokens(_message_text(m)) for m in payload["messages"])
+        completion_tokens = _count_tokens(text)
+        return {
+            "id": f"chat-{uuid.uuid4().hex}",
+            "model_id": payload["model_id"],
+            "created": int(time.time()),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def _stream(self, payload, text):
+        chunks = re.findall(r"\S+\s*|\s+", text) or [""]
+        delay = self.server.latency / len(chunks)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chat_id = f"chat-{uuid.uuid4().hex}"
+        for i, chunk in enumerate(chunks):
+            time.sleep(delay)
+            event = {
+                "id": chat_id,
+                "model_id": payload["model_id"],
+                "choices": [{
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": chunk} if i == 0 else {"content": chunk},
+                    "finish_reason": "stop" if i == len(chunks) - 1 else None
+                }]
+            }
+            self.wfile.write(f"id: {i + 1}\nevent: message\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.close_connection = True
+
+
+def start_mock_server(port=0, latency=0.0, reply=default_reply, host="127.0.0.1"):
+    """Starts the server on a daemon thread (port 0 picks a free one) and returns it."""
+    server = MockWatsonxServer((host, port), reply=reply, latency=latency)
+    threading.Thread(target=server.serve_forever, name="mock-watsonx", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Watsonx chat and IAM endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to sleep per chat call")
+    args = parser.parse_args()
+
+    server = MockWatsonxServer((args.host, args.port), latency=args.latency)
+    print(f"Mock Watsonx server listening on {server.base_url}")
+    print(f"  WATSONX_API_URL={server.base_url}/ml/v1/text/chat")
+    print(f"  IAM_TOKEN_URL={server.base_url}/identity/token")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
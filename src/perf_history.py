@@ -0,0 +1,191 @@
+import threading
+from collections import deque
+import numpy as np
+from session_store import register_type
+
+HISTORY_CAPACITY = 256
+EWMA_ALPHA = 0.2
+TREND_WINDOWS = (10, 50)
+
+
+class _Window:
+    """
+    Aggregates over the last `size` samples of a series, updated in O(1)
+    amortised time per sample: running sums for mean and least-squares slope,
+    and monotonic deques for min/max.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.n = 0
+        self.sum_y = 0.0
+        self.sum_ty = 0.0
+        self._min = deque()  # (t, value), values increasing
+        self._max = deque()  # (t, value), values decreasing
+
+    def push(self, t, value, evicted):
+        # `evicted` is the sample that falls out of the window, if any.
+        if evicted is not None:
+            self.sum_y -= evicted
+            self.sum_ty -= (t - self.size) * evicted
+        else:
+            self.n += 1
+        self.sum_y += value
+        self.sum_ty += t * value
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((t, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((t, value))
+        oldest = t - self.size + 1
+        if self._min[0][0] < oldest:
+            self._min.popleft()
+        if self._max[0][0] < oldest:
+            self._max.popleft()
+
+    def rebuild(self, ts, values):
+        # Recomputes the running sums from scratch to shed floating-point drift.
+        self.n = len(values)
+        self.sum_y = float(values.sum())
+        self.sum_ty = float((ts * values).sum())
+
+    def slope(self, t_last):
+        n = self.n
+        if n < 2:
+            return 0.0
+        # Sample times are the consecutive integers t_last-n+1 .. t_last.
+        t_first = t_last - n + 1
+        sum_t = (t_first + t_last) * n / 2.0
+        mean_t = sum_t / n
+        var_t = (n * n - 1) / 12.0
+        cov = self.sum_ty / n - mean_t * (self.sum_y / n)
+        return cov / var_t
+
+    def stats(self, t_last):
+        if self.n == 0:
+            return None
+        return {
+            "mean": round(self.sum_y / self.n, 2),
+            "min": self._min[0][1],
+            "max": self._max[0][1],
+            "slope": round(self.slope(t_last), 3)
+        }
+
+
+class RollingSeries:
+    """
+    Fixed-capacity float ring buffer with an exponentially weighted moving
+    average and per-window mean/min/max/trend slope, all maintained as samples
+    are appended. Memory is bounded by `capacity` regardless of session length.
+    """
+
+    def __init__(self, capacity=HISTORY_CAPACITY, alpha=EWMA_ALPHA, windows=TREND_WINDOWS):
+        self.capacity = capacity
+        self.alpha = alpha
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self.count = 0  # total samples ever appended
+        self.ewma = None
+        self._windows = [_Window(min(size, capacity)) for size in windows]
+
+    def append(self, value):
+        self._push(float(value), offset=0)
+        self.ewma = float(value) if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+        if self.count % self.capacity == 0:
+            for window in self._windows:
+                n = min(window.size, self.count)
+                window.rebuild(np.arange(self.count - n, self.count, dtype=np.float64), self.values()[-n:])
+
+    def _push(self, value, offset):
+        # Samples before `offset` are treated as absent (used when restoring state).
+        t = self.count
+        for window in self._windows:
+            evicted = float(self._values[(t - window.size) % self.capacity]) if t - window.size >= offset else None
+            window.push(t, value, evicted)
+        self._values[t % self.capacity] = value
+        self.count += 1
+
+    def values(self):
+        """Retained samples, oldest first."""
+        if self.count <= self.capacity:
+            return self._values[:self.count].copy()
+        start = self.count % self.capacity
+        return np.concatenate((self._values[start:], self._values[:start]))
+
+    def last(self):
+        return float(self._values[(self.count - 1) % self.capacity]) if self.count else None
+
+    def summary(self):
+        if not self.count:
+            return {"n": 0}
+        t_last = self.count - 1
+        summary = {
+            "n": self.count,
+            "last": self.last(),
+            "ewma": round(self.ewma, 2)
+        }
+        for window in self._windows:
+            summary[f"last_{window.size}"] = window.stats(t_last)
+        return summary
+
+    def to_state(self):
+        return {
+            "capacity": self.capacity,
+            "alpha": self.alpha,
+            "windows": [window.size for window in self._windows],
+            "count": self.count,
+            "ewma": self.ewma,
+            "values": self.values().tolist()
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        series = cls(state["capacity"], state["alpha"], state["windows"])
+        values = state["values"]
+        # Replay the retained samples so the window aggregates are rebuilt,
+        # then restore the true sample count and EWMA.
+        offset = state["count"] - len(values)
+        series.count = offset
+        for value in values:
+            series._push(float(value), offset)
+        series.ewma = state["ewma"]
+        return series
+
+
+@register_type
+class PerformanceHistory:
+    """
+    Bounded long-term performance record for one session: knowledge score,
+    concentration and memory retention, each a RollingSeries. summary() is a
+    constant-size digest suitable for the planner prompt.
+    """
+
+    SERIES = {
+        "knowledge_score_linear_algebra": "knowledge_scores_history",
+        "concentration_level": "concentration_history",
+        "memory_retention_rate": "memory_retention_history"
+    }
+
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        self.series = {name: RollingSeries(capacity) for name in self.SERIES.values()}
+        self._lock = threading.Lock()
+
+    def record(self, observations):
+        with self._lock:
+            for field, name in self.SERIES.items():
+                if observations.get(field) is not None:
+                    self.series[name].append(observations[field])
+
+    def summary(self):
+        with self._lock:
+            return {name: series.summary() for name, series in self.series.items()}
+
+    def to_state(self):
+        with self._lock:
+            return {name: series.to_state() for name, series in self.series.items()}
+
+    @classmethod
+    def from_state(cls, state):
+        history = cls()
+        history.series = {name: RollingSeries.from_state(series_state) for name, series_state in state.items()}
+        return history
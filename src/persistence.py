@@ -0,0 +1,456 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from session_store import dumps, loads
+from metrics import COUNT_BUCKETS, counter, histogram
+from structured_log import get_logger
+
+# "none" keeps everything in memory only; "sqlite" or "jsonl" journal it.
+PERSIST_BACKEND = os.environ.get("PERSIST_BACKEND", "none")
+# A SQLite file, or a directory of JSONL segments.
+PERSIST_PATH = os.environ.get("PERSIST_PATH", "")
+PERSIST_BATCH_SIZE = int(os.environ.get("PERSIST_BATCH_SIZE", "256"))
+# Longest a record waits in the queue before its batch is written.
+PERSIST_FLUSH_INTERVAL_MS = float(os.environ.get("PERSIST_FLUSH_INTERVAL_MS", "200"))
+# Records queued beyond this are dropped (and counted) rather than blocking a request.
+PERSIST_MAX_QUEUE = int(os.environ.get("PERSIST_MAX_QUEUE", "100000"))
+# "normal" survives a process crash; "full" also an OS crash, at an fsync per batch.
+PERSIST_DURABILITY = os.environ.get("PERSIST_DURABILITY", "normal")
+PERSIST_SEGMENT_BYTES = int(os.environ.get("PERSIST_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+PERSIST_MAX_SEGMENTS = int(os.environ.get("PERSIST_MAX_SEGMENTS", "16"))
+# Transcript events kept per session when state is replayed.
+REPLAY_TRANSCRIPT_EVENTS = 200
+# Sessions remembered as already restored; one evicted from this LRU is
+# replayed again when next seen, which only re-reads the journal.
+PERSIST_RESTORED_SESSIONS = int(os.environ.get("PERSIST_RESTORED_SESSIONS", "10000"))
+# restore() runs on the request path, so it waits only this long for queued
+# records to be written before reading; anything later is still in memory.
+PERSIST_RESTORE_FLUSH_SECONDS = float(os.environ.get("PERSIST_RESTORE_FLUSH_SECONDS", "0.5"))
+
+BATCH_RECORDS = histogram("journal_batch_records", "Records written per journal batch.", buckets=COUNT_BUCKETS + (128, 256, 512))
+WRITE_SECONDS = histogram("journal_write_seconds", "Time to write one journal batch.", ("backend", "outcome"))
+DROPPED = counter("journal_dropped_records", "Records not journaled, by reason (queue_full, write_error).", ("reason",))
+
+log = get_logger("persistence")
+
+
+class SQLiteSink:
+    """Journal rows in a SQLite file in WAL mode; one transaction per batch."""
+
+    name = "sqlite"
+
+    def __init__(self, path, durability=PERSIST_DURABILITY):
+        self.path = path
+        self.synchronous = "FULL" if durability == "full" else "NORMAL"
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " ts REAL NOT NULL,"
+            " session_id TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS journal_session ON journal (session_id, id)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn = conn
+        return conn
+
+    def write(self, records):
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("INSERT INTO journal (ts, session_id, kind, payload) VALUES (?, ?, ?, ?)", records)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def read(self, session_id):
+        return self._conn().execute(
+            "SELECT ts, kind, payload FROM journal WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_SESSION_RE = re.compile(r'"session_id": ("(?:[^"\\]|\\.)*")')
+
+
+class JSONLSink:
+    """
+    Append-only JSONL segments (journal-000001.jsonl, ...) in `directory`.
+    A segment is closed once it reaches `segment_bytes`, and the oldest are
+    deleted beyond `max_segments`.
+
+    An in-memory index maps each session to the segments holding its
+    records, so reading a session only opens those. write() keeps it up to
+    date; segments left by an earlier process are indexed by a background
+    thread at startup, which read() waits for.
+    """
+
+    name = "jsonl"
+
+    def __init__(self, directory, durability=PERSIST_DURABILITY, segment_bytes=PERSIST_SEGMENT_BYTES,
+                 max_segments=PERSIST_MAX_SEGMENTS):
+        self.directory = directory
+        self.fsync = durability == "full"
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        os.makedirs(directory, exist_ok=True)
+        segments = self._segments()
+        self._index = self._number(segments[-1]) if segments else 1
+        self._file = None
+        self._session_segments = {}  # session_id -> segment numbers
+        self._segment_sessions = {}  # segment number -> session ids
+        self._index_lock = threading.Lock()
+        self._indexed = threading.Event()
+        threading.Thread(target=self._index_segments, args=(segments,), name="journal-index", daemon=True).start()
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "journal-*.jsonl")))
+
+    @staticmethod
+    def _number(path):
+        return int(os.path.basename(path)[len("journal-"):-len(".jsonl")])
+
+    def _path(self, number):
+        return os.path.join(self.directory, f"journal-{number:06d}.jsonl")
+
+    def _add_to_index(self, number, session_ids):
+        with self._index_lock:
+            known = self._segment_sessions.setdefault(number, set())
+            for session_id in session_ids - known:
+                self._session_segments.setdefault(session_id, set()).add(number)
+            known |= session_ids
+
+    def _index_segments(self, segments):
+        try:
+            for path in segments:
+                session_ids = set()
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            match = _SESSION_RE.search(line)
+                            if match:
+                                session_ids.add(json.loads(match.group(1)))
+                except OSError:
+                    continue  # deleted by a rotation in the meantime
+                self._add_to_index(self._number(path), session_ids)
+        finally:
+            self._indexed.set()
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self._path(self._index), "a", encoding="utf-8")
+        return self._file
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        self._index += 1
+        # The next segment only appears on the next write, so keep one fewer.
+        segments = self._segments()
+        for stale in segments[:max(0, len(segments) - (self.max_segments - 1))]:
+            os.remove(stale)
+            with self._index_lock:
+                number = self._number(stale)
+                for session_id in self._segment_sessions.pop(number, ()):
+                    numbers = self._session_segments[session_id]
+                    numbers.discard(number)
+                    if not numbers:
+                        del self._session_segments[session_id]
+
+    def write(self, records):
+        # Payloads are already JSON, so they are spliced in rather than re-encoded.
+        lines = "".join(
+            f'{{"ts": {ts!r}, "session_id": {json.dumps(session_id)}, "kind": {json.dumps(kind)}, "payload": {payload}}}\n'
+            for ts, session_id, kind, payload in records
+        )
+        f = self._open()
+        f.write(lines)
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self._add_to_index(self._index, {session_id for _, session_id, _, _ in records})
+        if f.tell() >= self.segment_bytes:
+            self._rotate()
+
+    def read(self, session_id):
+        self._indexed.wait()
+        with self._index_lock:
+            numbers = sorted(self._session_segments.get(session_id, ()))
+        needle = f'"session_id": {json.dumps(session_id)},'
+        rows = []
+        for number in numbers:
+            try:
+                f = open(self._path(number), "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue  # rotated away since the index was read
+            with f:
+                for line in f:
+                    if needle not in line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line torn by a crash mid-write
+                    rows.append((record["ts"], record["kind"], json.dumps(record["payload"])))
+        return rows
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _Flush:
+    def __init__(self, stop=False):
+        self.done = threading.Event()
+        self.stop = stop
+
+
+class Journal:
+    """
+    Write-behind journal of session records (observations, ReAct steps,
+    performance snapshots). record() encodes the value and queues it
+    without touching the disk, so it costs the request path microseconds.
+    A background thread writes queued records in batches of up to
+    `batch_size`, at most `flush_interval_ms` after the first one arrived.
+
+    flush() waits until everything recorded so far is written. close()
+    flushes and stops the writer; it is registered with atexit. If the
+    queue is full, or a batch fails to write, the records are dropped and
+    counted rather than blocking or crashing the caller.
+
+    replay() rebuilds a session from its records, and restore() loads that
+    into a session store once per session after a restart, including the
+    steps of a run the restart interrupted so the next run can resume it.
+    """
+
+    def __init__(self, sink, batch_size=PERSIST_BATCH_SIZE, flush_interval_ms=PERSIST_FLUSH_INTERVAL_MS,
+                 max_queue=PERSIST_MAX_QUEUE, max_restored=PERSIST_RESTORED_SESSIONS):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.max_restored = max_restored
+        self._restored = OrderedDict()
+        self._restored_lock = threading.Lock()
+        self._closed = False
+        self.written = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, session_id, kind, value):
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait((time.time(), session_id, kind, dumps(value)))
+        except queue.Full:
+            DROPPED.inc(reason="queue_full")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, markers = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, _Flush):
+                    markers.append(item)
+                    if item.stop:
+                        break
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - time.monotonic()
+                if markers or timeout <= 0:
+                    # A flush request ends the batch early; take whatever else is already queued.
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    continue
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.done.set()
+            if any(marker.stop for marker in markers):
+                self.sink.close()
+                return
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            self.sink.write(batch)
+        except Exception as e:
+            WRITE_SECONDS.observe(time.perf_counter() - started, backend=self.sink.name, outcome="error")
+            DROPPED.inc(len(batch), reason="write_error")
+            log.error("Journal batch write failed; records dropped", backend=self.sink.name, records=len(batch), error=str(e))
+            return
+        WRITE_SECONDS.observe(time.perf_counter() - started, backend=self.sink.name, outcome="ok")
+        BATCH_RECORDS.observe(len(batch))
+        self.written += len(batch)
+        self.batches += 1
+
+    def flush(self, timeout=10):
+        if self._closed:
+            return True
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout=10):
+        if self._closed:
+            return
+        self._closed = True
+        marker = _Flush(stop=True)
+        self._queue.put(marker)
+        if not marker.done.wait(timeout):
+            log.warning("Journal did not finish flushing before shutdown", queued=self._queue.qsize())
+
+    def replay(self, session_id, flush_timeout=10):
+        """
+        The session as of its last journaled records: latest observation per
+        modality, latest performance history and the most recent ReAct step
+        events as "transcript".
+        """
+        self.flush(flush_timeout)
+        observations, performance, transcript = {}, None, []
+        for _, kind, payload in self.sink.read(session_id):
+            value = loads(payload)
+            if kind == "observation":
+                observations[value["modality"]] = value["observation"]
+            elif kind == "performance":
+                performance = value
+            elif kind == "step":
+                transcript.append(value)
+        return {
+            "observations": observations,
+            "performance": performance,
+            "transcript": transcript[-REPLAY_TRANSCRIPT_EVENTS:]
+        }
+
+    def restore(self, store, session_id):
+        """
+        Loads the journaled state of `session_id` into `store` the first
+        time the session is seen by this process. Values already in the
+        store are newer than the journal, so they are kept. The step events
+        after the last "done" one, left by a run the restart cut short, go
+        under "interrupted_steps" for the session's next run to resume.
+        A replay that raises is retried on the session's next request.
+        Returns True if anything was restored.
+        """
+        with self._restored_lock:
+            if session_id in self._restored:
+                self._restored.move_to_end(session_id)
+                return False
+        state = self.replay(session_id, flush_timeout=PERSIST_RESTORE_FLUSH_SECONDS)
+        restored = False
+        if state["observations"]:
+            store.update(session_id, "observations", lambda current: dict(state["observations"], **(current or {})))
+            restored = True
+        if state["performance"] is not None:
+            store.update(session_id, "performance", lambda current: current if current is not None else state["performance"])
+            restored = True
+        interrupted = interrupted_steps(state["transcript"])
+        if interrupted:
+            store.update(session_id, "interrupted_steps", lambda current: current if current is not None else interrupted)
+            restored = True
+        with self._restored_lock:
+            self._restored[session_id] = True
+            while len(self._restored) > self.max_restored:
+                self._restored.popitem(last=False)
+        if restored:
+            log.info("Restored session from journal", session_id=session_id,
+                     modalities=sorted(state["observations"]), interrupted_events=len(interrupted))
+        return restored
+
+    def stats(self):
+        return {
+            "backend": self.sink.name,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "mean_batch": round(self.written / self.batches, 1) if self.batches else 0.0
+        }
+
+
+def interrupted_steps(events):
+    """The step events after the last "done" one: a run that never finished, if any."""
+    for position in range(len(events) - 1, -1, -1):
+        if events[position].get("type") == "done":
+            return events[position + 1:]
+    return events
+
+
+class NullJournal:
+    """Journal used when persistence is off: nothing is written or replayed."""
+
+    def record(self, session_id, kind, value):
+        pass
+
+    def flush(self, timeout=None):
+        return True
+
+    def close(self, timeout=None):
+        pass
+
+    def replay(self, session_id, flush_timeout=None):
+        return {"observations": {}, "performance": None, "transcript": []}
+
+    def restore(self, store, session_id):
+        return False
+
+    def stats(self):
+        return {"backend": "none"}
+
+
+def create_journal(backend=PERSIST_BACKEND, path=PERSIST_PATH, **kwargs):
+    if backend == "none":
+        return NullJournal()
+    if backend == "sqlite":
+        sink = SQLiteSink(path or os.path.join(os.getcwd(), "journal.db"))
+    elif backend == "jsonl":
+        sink = JSONLSink(path or os.path.join(os.getcwd(), "journal"))
+    else:
+        raise ValueError(f"Unknown persistence backend '{backend}' (expected 'none', 'sqlite' or 'jsonl')")
+    journal = Journal(sink, **kwargs)
+    atexit.register(journal.close)
+    return journal
+
+
+_shared_journal = None
+_shared_journal_lock = threading.Lock()
+
+def get_journal():
+    """Returns the process-wide journal selected by PERSIST_BACKEND."""
+    global _shared_journal
+    if _shared_journal is None:
+        with _shared_journal_lock:
+            if _shared_journal is None:
+                _shared_journal = create_journal()
+    return _shared_journal
@@ -0,0 +1,233 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from react_parser import ReActStreamParser
+from watsonx_client import WATSONX_MODEL_ID_TEXT, get_message_content
+
+PLANNER_BACKEND = os.environ.get("PLANNER_BACKEND", "mock")
+PLANNER_CACHE_SIZE = int(os.environ.get("PLANNER_CACHE_SIZE", "1024"))
+# Empty disables the on-disk tier.
+PLANNER_CACHE_PATH = os.environ.get("PLANNER_CACHE_PATH", "")
+PLANNER_MAX_TOKENS = int(os.environ.get("PLANNER_MAX_TOKENS", "400"))
+
+PLANNER_SYSTEM_PROMPT = """You are an adaptive Linear Algebra tutor. You observe the student through video, audio and screen observations and decide the next tutoring step.
+Reply in exactly this format and nothing else:
+Thought: <your reasoning>
+Action: <one of: {tools}>
+Action Input: <the input for the action, or None>
+If no action is needed, reply instead with:
+Thought: <your reasoning>
+Final Answer: <what the tutor says or does>"""
+
+# Lines that change on every iteration without changing what the planner
+# should do; they are left out of the cache key.
+VOLATILE_LINE_PATTERNS = (
+    re.compile(r"^Current Time Remaining:.*$", re.MULTILINE),
+)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_prompt(prompt):
+    for pattern in VOLATILE_LINE_PATTERNS:
+        prompt = pattern.sub("", prompt)
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+def prompt_key(prompt, model_id=""):
+    return hashlib.sha256(f"{model_id}\x00{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of planner responses, keyed by a hash of the
+    normalized prompt. An in-memory LRU of `max_entries` sits in front of an
+    optional SQLite file at `path`, which survives restarts and can be shared
+    by several worker processes; disk hits are promoted into memory.
+    """
+
+    def __init__(self, max_entries=PLANNER_CACHE_SIZE, path=PLANNER_CACHE_PATH or None):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS planner_cache ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, response):
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return response
+        if self.path:
+            row = self._conn().execute("SELECT response FROM planner_cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                with self._lock:
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                return row[0]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, response):
+        with self._lock:
+            self._remember(key, response)
+        if self.path:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO planner_cache (key, response, created_at) VALUES (?, ?, ?)",
+                (key, response, time.time())
+            )
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_ratio": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+            }
+
+
+class MockPlanner:
+    """Rule-based stand-in for the model; `respond` maps a prompt to ReAct text."""
+
+    model_id = "mock"
+
+    def __init__(self, respond):
+        self.respond = respond
+
+    def complete(self, prompt):
+        return self.respond(prompt)
+
+    def stream(self, prompt):
+        yield self.respond(prompt)
+
+
+class WatsonxPlanner:
+    """Asks a Watsonx chat model for the next Thought/Action given the ReAct prompt."""
+
+    def __init__(self, client, project_id, tool_names=(), model_id=WATSONX_MODEL_ID_TEXT, max_tokens=PLANNER_MAX_TOKENS):
+        self.client = client
+        # `project_id` may be a string or a zero-argument callable.
+        self.project_id = project_id
+        self.model_id = model_id
+        self.max_tokens = max_tokens
+        self.system_prompt = PLANNER_SYSTEM_PROMPT.format(tools=", ".join(tool_names))
+
+    def build_payload(self, prompt):
+        return {
+            "model_id": self.model_id,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "project_id": self.project_id() if callable(self.project_id) else self.project_id,
+            "max_tokens": self.max_tokens,
+            "temperature": 0,
+            "top_p": 1
+        }
+
+    def complete(self, prompt):
+        # Errors propagate: the caller decides whether a failed plan ends the run.
+        return get_message_content(self.client.chat(self.build_payload(prompt))) or ""
+
+    def stream(self, prompt):
+        """Yields the answer in chunks as the model generates it."""
+        yield from self.client.chat_stream(self.build_payload(prompt))
+
+
+class CachedPlanner:
+    """Wraps a planner so identical (normalized) prompts are answered from the cache."""
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+
+    def complete(self, prompt):
+        key = prompt_key(prompt, self.backend.model_id)
+        response = self.cache.get(key)
+        if response is None:
+            response = self.backend.complete(prompt)
+            if response:
+                self.cache.put(key, response)
+        return response
+
+    def stream(self, prompt):
+        key = prompt_key(prompt, self.backend.model_id)
+        response = self.cache.get(key)
+        if response is not None:
+            yield response
+            return
+        # A reader that closes the stream early (read_react_stream once it has
+        # the whole step) still leaves a cacheable response, but a client that
+        # disconnects mid-step does not, so the chunks are parsed here too.
+        parser = ReActStreamParser()
+        parts = []
+        complete = False
+        try:
+            for chunk in self.backend.stream(prompt):
+                parts.append(chunk)
+                parser.feed(chunk)
+                yield chunk
+            complete = True
+        except GeneratorExit:
+            complete = parser.done
+            raise
+        finally:
+            if complete and parts:
+                self.cache.put(key, "".join(parts))
+
+
+def create_planner(backend=PLANNER_BACKEND, respond=None, client=None, project_id=None, tool_names=(), cache=None):
+    """
+    Builds the planner selected by `backend` ("mock" or "watsonx"). The
+    Watsonx backend uses the given client and project id, or mints its own
+    from keys.json, and is wrapped in a ResponseCache unless
+    PLANNER_CACHE_SIZE is 0. The mock backend is only cached when a `cache`
+    is passed: its rules hot-reload, and it is cheaper than a cache lookup.
+    """
+    if backend == "mock":
+        planner = MockPlanner(respond)
+    elif backend == "watsonx":
+        if client is None:
+            from generate_token import TokenProvider
+            from watsonx_client import get_client
+            token_provider = TokenProvider()
+            client = get_client(token=token_provider)
+            project_id = lambda: token_provider.project_id
+        planner = WatsonxPlanner(client, project_id, tool_names)
+    else:
+        raise ValueError(f"Unknown planner backend '{backend}' (expected 'mock' or 'watsonx')")
+    if cache is None and backend != "mock" and PLANNER_CACHE_SIZE > 0:
+        cache = ResponseCache()
+    return CachedPlanner(planner, cache) if cache is not None else planner
@@ -0,0 +1,93 @@
+import os
+import re
+from collections import Counter, deque
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_MAX_RECENT_STEPS = int(os.environ.get("PROMPT_MAX_RECENT_STEPS", "8"))
+
+# Words are split into pieces of at most four characters and punctuation counts
+# one each, which tracks BPE token counts closely enough for budgeting without
+# shipping a tokenizer.
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+def count_tokens(text):
+    return len(_TOKEN_RE.findall(text))
+
+
+class PromptBuilder:
+    """
+    Builds the ReAct prompt from a fixed prefix (the initial state), a
+    summary of evicted steps, the most recent steps verbatim and a
+    per-iteration tail (observations, time remaining).
+
+    Each step is formatted and counted once, when it is added. When the
+    prompt would exceed `budget` tokens, or more than `max_recent` steps are
+    held, the oldest steps are folded into the summary, which only keeps
+    per-action counts and the last evicted thought. Building a prompt
+    therefore costs O(budget) no matter how many iterations have run, and
+    the prefix stays byte-identical between iterations so a server-side
+    prompt cache can reuse it.
+    """
+
+    def __init__(self, prefix, budget=PROMPT_TOKEN_BUDGET, max_recent=PROMPT_MAX_RECENT_STEPS):
+        self.prefix = prefix
+        self.prefix_tokens = count_tokens(prefix)
+        self.budget = budget
+        self.max_recent = max_recent
+        self._recent = deque()  # (text, tokens, thought, action)
+        self._recent_tokens = 0
+        self._evicted = 0
+        self._evicted_actions = Counter()
+        self._last_evicted_thought = None
+        self._summary = ""
+        self._summary_tokens = 0
+        self._history = None  # cached join of prefix, summary and recent steps
+        self.last_prompt_tokens = 0
+
+    def add_step(self, thought, action, action_input, observation):
+        text = f"Thought: {thought}\nAction: {action}\nAction Input: {action_input}\nObservation: {observation}"
+        tokens = count_tokens(text)
+        self._recent.append((text, tokens, thought, action))
+        self._recent_tokens += tokens
+        self._history = None
+        while len(self._recent) > self.max_recent:
+            self._evict()
+
+    def _evict(self):
+        _, tokens, thought, action = self._recent.popleft()
+        self._recent_tokens -= tokens
+        self._evicted += 1
+        self._evicted_actions[action] += 1
+        self._last_evicted_thought = thought
+        actions = ", ".join(f"{name} x{count}" for name, count in self._evicted_actions.most_common())
+        self._summary = (
+            f"Summary of {self._evicted} earlier steps: actions taken: {actions}. "
+            f"Last summarized thought: {self._last_evicted_thought}"
+        )
+        self._summary_tokens = count_tokens(self._summary)
+        self._history = None
+
+    def history_tokens(self):
+        return self.prefix_tokens + self._summary_tokens + self._recent_tokens
+
+    def build(self, tail):
+        """Returns the full prompt for this iteration, evicting old steps to fit the budget."""
+        tail_tokens = count_tokens(tail)
+        while self._recent and self.history_tokens() + tail_tokens > self.budget:
+            self._evict()
+        if self._history is None:
+            parts = [self.prefix]
+            if self._summary:
+                parts.append(self._summary)
+            parts.extend(text for text, _, _, _ in self._recent)
+            self._history = "\n".join(parts)
+        self.last_prompt_tokens = self.history_tokens() + tail_tokens
+        return f"{self._history}\n{tail}"
+
+    def stats(self):
+        return {
+            "recent_steps": len(self._recent),
+            "summarized_steps": self._evicted,
+            "history_tokens": self.history_tokens(),
+            "budget": self.budget
+        }
@@ -0,0 +1,164 @@
+import re
+
+# Field labels recognised at the start of a line. "Action Input" must come
+# before "Action" in the alternation.
+_LABEL_RE = re.compile(r"^[ \t]*(Thought|Action Input|Action|Final Answer|Observation)[ \t]*:[ \t]*", re.MULTILINE)
+_LABEL_PREFIXES = ("Thought", "Action", "Final Answer", "Observation")
+_FIELDS = {
+    "Thought": "thought",
+    "Action Input": "action_input",
+    "Action": "action",
+    "Final Answer": "final_answer",
+    "Observation": "observation"
+}
+
+
+class ReActStreamParser:
+    """
+    Incremental parser for Thought / Action / Action Input / Final Answer
+    output. feed() takes chunks as they stream in and returns the fields
+    completed by that chunk as {"field": name, "value": text} events:
+
+    - Action is a single line and completes at its newline, so the tool is
+      known before the model has finished writing its input.
+    - Thought, Action Input and Final Answer may span several lines and
+      complete when the next label starts, or at close().
+
+    Once the model starts an "Observation:" of its own, or repeats a field
+    (a second step), the current step is over: `done` becomes True and the
+    caller can stop reading the stream. Only complete lines are scanned,
+    and each is scanned once. Labels are matched case-sensitively, like the
+    original line parser.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.done = False
+        self._pending = ""  # trailing text not yet ended by a newline
+        self._field = None
+        self._parts = []
+        self._events = []
+
+    def feed(self, chunk):
+        if self.done:
+            return []
+        text = self._pending + chunk
+        cut = text.rfind("\n") + 1
+        self._pending = text[cut:]
+        if cut:
+            self._consume(text[:cut])
+        return self._take_events()
+
+    def close(self):
+        """Ends the stream, completing whichever field was still open."""
+        if not self.done:
+            self._consume(self._pending)
+            self._finish()
+            self.done = True
+        self._pending = ""
+        return self._take_events()
+
+    def result(self):
+        """The fields parsed so far, shaped like parse_llm_output()'s result."""
+        return {name: value for name, value in self.fields.items() if name != "observation"}
+
+    def _take_events(self):
+        events, self._events = self._events, []
+        return events
+
+    def _consume(self, text):
+        pos = 0
+        for match in _LABEL_RE.finditer(text):
+            self._append(text[pos:match.start()])
+            self._finish()
+            field = _FIELDS[match.group(1)]
+            if field == "observation" or field in self.fields:
+                self.done = True
+                return
+            self._field = field
+            pos = match.end()
+        self._append(text[pos:])
+
+    def _append(self, text):
+        if self._field is None or not text:
+            return
+        if self._field == "action":
+            newline = text.find("\n")
+            if newline != -1:
+                self._parts.append(text[:newline])
+                self._finish()
+                return
+        self._parts.append(text)
+
+    def _finish(self):
+        if self._field is None:
+            return
+        value = _field_value(self._field, "".join(self._parts))
+        self.fields[self._field] = value
+        self._events.append({"field": self._field, "value": value})
+        self._field = None
+        self._parts = []
+
+
+def parse_react_output(output):
+    """
+    Parses a complete ReAct completion with the same rules as
+    ReActStreamParser, in a single pass over its lines that stops at the
+    end of the first step.
+    """
+    fields = {}
+    field = None
+    parts = None
+    for line in output.split("\n"):
+        if line.startswith(_LABEL_PREFIXES) or (line and line[0] in " \t" and line.lstrip(" \t").startswith(_LABEL_PREFIXES)):
+            label, colon, rest = line.partition(":")
+            name = _FIELDS.get(label.strip(" \t")) if colon else None
+            if name is not None:
+                if field is not None:
+                    fields[field] = _field_value(field, "\n".join(parts))
+                    field = None
+                if name == "observation" or name in fields:
+                    return fields
+                if name == "action":
+                    fields[name] = rest.strip()
+                else:
+                    field = name
+                    parts = [rest]
+                continue
+        if field is not None:
+            parts.append(line)
+    if field is not None:
+        fields[field] = _field_value(field, "\n".join(parts))
+    return fields
+
+
+def _field_value(field, text):
+    value = text.strip()
+    if field == "action_input" and value == "None":
+        return None
+    return value
+
+
+def read_react_stream(chunks, on_event=None):
+    """
+    Parses a stream of completion chunks, calling `on_event(event)` as each
+    field completes, and stops reading (closing the stream) as soon as the
+    step is complete. Returns (fields, text_read).
+    """
+    parser = ReActStreamParser()
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            for event in parser.feed(chunk):
+                if on_event is not None:
+                    on_event(event)
+            if parser.done:
+                break
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    for event in parser.close():
+        if on_event is not None:
+            on_event(event)
+    return parser.result(), "".join(parts)
@@ -0,0 +1,405 @@
+import base64
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from image_utils import decode_data_url
+from metrics import counter, histogram, span
+from structured_log import get_logger
+from watsonx_client import WATSONX_MODEL_ID_VISION, get_message_content
+
+# Tiles are TILE_SIZE x TILE_SIZE pixels; a multiple of 8 so each tile row
+# is a whole number of 64-bit words for any channel count.
+TILE_SIZE = int(os.environ.get("SCREEN_TILE_SIZE", "32"))
+# Low bits dropped from every byte before hashing, so compression noise and
+# cursor anti-aliasing do not dirty a tile.
+QUANT_SHIFT = int(os.environ.get("SCREEN_QUANT_SHIFT", "2"))
+# Above this fraction of dirty tiles (a page switch, a scroll) the whole
+# capture is sent to OCR once instead of as many small regions.
+FULL_FRAME_RATIO = float(os.environ.get("SCREEN_FULL_FRAME_RATIO", "0.5"))
+# Pixels of context around a dirty region so words cut by its edge are read whole.
+OCR_MARGIN = 8
+LINE_HEIGHT = 12
+SCREEN_OCR_BACKEND = os.environ.get("SCREEN_OCR_BACKEND", "tesseract")
+SCREEN_MAX_SESSIONS = int(os.environ.get("SCREEN_MAX_SESSIONS", "256"))
+
+SCREEN_OCR_PROMPT = "Transcribe all text visible in this screenshot region exactly, line by line. Reply with the text only."
+
+# Checked in order against the text on screen; the first match wins.
+TASK_STATUS_RULES = [
+    ("incorrect matrix syntax", re.compile(
+        r"syntax ?error|invalid syntax|unexpected (?:token|character)|unmatched|dimension mismatch|"
+        r"shapes? .{0,40}not aligned|must have the same number of", re.IGNORECASE)),
+    ("failed to solve equation", re.compile(r"\bincorrect\b|wrong answer|try again|not quite|\bfailed\b", re.IGNORECASE)),
+    ("correct", re.compile(r"\bcorrect!|well done|all tests passed|\bsolved\b|✓", re.IGNORECASE)),
+    ("stuck on definition", re.compile(r"\bdefinition\b|\bdefine\b|what is an? |glossary", re.IGNORECASE))
+]
+DEFAULT_TASK_STATUS = "incomplete"
+
+log = get_logger("screen")
+UPDATE_SECONDS = histogram("screen_update_duration_seconds", "Time to diff a screen capture and OCR its dirty regions.", ("outcome",))
+HASH_SECONDS = histogram("screen_hash_duration_seconds", "Time to hash the tiles of one capture.")
+DIRTY_RATIO = histogram("screen_dirty_tile_ratio", "Fraction of tiles changed since the previous capture.",
+                        buckets=(0.0, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0))
+OCR_PIXELS = counter("screen_ocr_pixels", "Pixels sent to OCR, by whether they were part of a partial update.", ("kind",))
+
+_weights = {}
+
+
+def _tile_weights(tile, words):
+    """Fixed odd 64-bit multipliers, one per word position in a tile."""
+    key = (tile, words)
+    weights = _weights.get(key)
+    if weights is None:
+        rng = np.random.default_rng(0x5C4EE7)
+        weights = rng.integers(0, 2**63, size=(tile, 1, words), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        _weights[key] = weights
+    return weights
+
+
+def to_pixels(capture):
+    """
+    Accepts a PIL image, a (H, W) / (H, W, C) uint8 array or a base64 data
+    URL and returns a C-contiguous uint8 array. Pixels are hashed as raw
+    bytes, so colour captures need no greyscale conversion.
+    """
+    if isinstance(capture, str):
+        _, raw = decode_data_url(capture)
+        capture = Image.open(io.BytesIO(raw))
+    if isinstance(capture, Image.Image):
+        if capture.mode not in ("L", "RGB"):
+            capture = capture.convert("RGB")
+        capture = np.asarray(capture)
+    pixels = np.ascontiguousarray(capture, dtype=np.uint8)
+    if pixels.ndim not in (2, 3):
+        raise ValueError(f"expected a 2-D or 3-D pixel array, got shape {pixels.shape}")
+    return pixels
+
+
+def _block_hashes(pixels, tile, mask):
+    # `pixels` spans whole tiles; only its last axis needs to be contiguous.
+    channels = pixels.shape[2] if pixels.ndim == 3 else 1
+    rows, cols = pixels.shape[0] // tile, pixels.shape[1] // tile
+    words_per_row = tile * channels // 8
+    words = pixels.reshape(rows * tile, cols * tile * channels).view(np.uint64).reshape(rows, tile, cols, words_per_row)
+    if mask is not None:
+        words = words & mask
+    return (words * _tile_weights(tile, words_per_row)).sum(axis=(1, 3), dtype=np.uint64)
+
+
+def _pad_to(pixels, height, width):
+    pad = [(0, height - pixels.shape[0]), (0, width - pixels.shape[1])] + [(0, 0)] * (pixels.ndim - 2)
+    return np.pad(pixels, pad)
+
+
+def tile_hashes(pixels, tile=TILE_SIZE, shift=QUANT_SHIFT):
+    """
+    64-bit hash of every tile as a (rows, cols) uint64 array. Each tile row
+    is viewed as 64-bit words, masked to drop the `shift` low bits of every
+    byte, multiplied by per-position odd weights and summed (mod 2**64) per
+    tile: a few vectorised passes over the capture, with no per-tile Python.
+    The whole tiles are hashed through a strided view of the capture; only
+    the partial tiles along the right and bottom edges are zero-padded.
+    """
+    if tile % 8:
+        raise ValueError("tile size must be a multiple of 8")
+    mask = None
+    if shift:
+        mask = np.uint64(int.from_bytes(bytes([(0xFF << shift) & 0xFF]) * 8, "little"))
+    h, w = pixels.shape[:2]
+    full_rows, full_cols = h // tile, w // tile
+    rows, cols = -(-h // tile), -(-w // tile)
+    hashes = np.empty((rows, cols), dtype=np.uint64)
+    if full_rows and full_cols:
+        hashes[:full_rows, :full_cols] = _block_hashes(pixels[:full_rows * tile, :full_cols * tile], tile, mask)
+    if cols > full_cols:
+        strip = _pad_to(pixels[:, full_cols * tile:], rows * tile, tile)
+        hashes[:, full_cols] = _block_hashes(strip, tile, mask)[:, 0]
+    if rows > full_rows and full_cols:
+        strip = _pad_to(pixels[full_rows * tile:, :full_cols * tile], tile, full_cols * tile)
+        hashes[full_rows, :full_cols] = _block_hashes(strip, tile, mask)[0]
+    return hashes
+
+
+def dirty_regions(dirty):
+    """
+    Groups dirty tiles into rectangles (in tile units: row0, col0, row1, col1,
+    end-exclusive): the bounding boxes of 8-connected components, with
+    overlapping boxes merged so no pixel is read twice.
+    """
+    seen = np.zeros_like(dirty)
+    rows, cols = dirty.shape
+    boxes = []
+    for r, c in np.argwhere(dirty):
+        if seen[r, c]:
+            continue
+        seen[r, c] = True
+        stack = [(r, c)]
+        r0, c0, r1, c1 = r, c, r + 1, c + 1
+        while stack:
+            y, x = stack.pop()
+            r0, c0, r1, c1 = min(r0, y), min(c0, x), max(r1, y + 1), max(c1, x + 1)
+            for ny in range(max(y - 1, 0), min(y + 2, rows)):
+                for nx in range(max(x - 1, 0), min(x + 2, cols)):
+                    if dirty[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        stack.append((ny, nx))
+        boxes.append((int(r0), int(c0), int(r1), int(c1)))
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def task_status(text):
+    for status, pattern in TASK_STATUS_RULES:
+        if pattern.search(text):
+            return status
+    return DEFAULT_TASK_STATUS
+
+
+class NullOCR:
+    """Reads nothing; the pipeline still reports change activity."""
+
+    def __call__(self, image):
+        return []
+
+
+class TesseractOCR:
+    """Word-level OCR with pytesseract: returns (x, y, w, h, text) per word."""
+
+    def __init__(self, lang="eng"):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.lang = lang
+
+    def __call__(self, image):
+        data = self._pytesseract.image_to_data(image, lang=self.lang, output_type=self._pytesseract.Output.DICT)
+        return [
+            (data["left"][i], data["top"][i], data["width"][i], data["height"][i], text)
+            for i, text in enumerate(data["text"])
+            if text.strip() and float(data["conf"][i]) >= 0
+        ]
+
+
+class VisionOCR:
+    """
+    Reads a region with the Watsonx vision model. The model returns plain
+    text without positions, so the whole answer is placed at the region's
+    top-left corner; text state is then tracked per region, not per word.
+    """
+
+    def __init__(self, client, project_id):
+        self.client = client
+        # `project_id` may be a string or a zero-argument callable.
+        self.project_id = project_id
+
+    def __call__(self, image):
+        buf = io.BytesIO()
+        image.convert("RGB").save(buf, format="JPEG", quality=85)
+        img_url = "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+        project_id = self.project_id() if callable(self.project_id) else self.project_id
+        result = self.client.chat({
+            "model_id": WATSONX_MODEL_ID_VISION,
+            "messages": [{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": SCREEN_OCR_PROMPT},
+                    {"type": "image_url", "image_url": {"url": img_url}}
+                ]
+            }],
+            "project_id": project_id,
+            "max_tokens": 800,
+            "temperature": 0
+        })
+        text = (get_message_content(result) or "").strip()
+        return [(0, 0, image.width, image.height, text)] if text else []
+
+
+def create_ocr(backend=SCREEN_OCR_BACKEND, client=None, project_id=None):
+    """Builds the OCR backend named by SCREEN_OCR_BACKEND: tesseract, vision or none."""
+    if backend == "vision":
+        if client is None:
+            raise ValueError("the vision OCR backend needs a WatsonxClient")
+        return VisionOCR(client, project_id)
+    if backend == "tesseract":
+        try:
+            return TesseractOCR()
+        except ImportError:
+            log.warning("pytesseract is not installed; screen text will not be read", backend=backend)
+            return NullOCR()
+    if backend == "none":
+        return NullOCR()
+    raise ValueError(f"Unknown screen OCR backend '{backend}'")
+
+
+class _ScreenState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.shape = None
+        self.hashes = None
+        self.words = {}  # (row, col) -> [(y, x, text)] for words centred in that tile
+        self.text = ""
+        self.status = DEFAULT_TASK_STATUS
+        self.changed_at = time.time()
+        self.captures = 0
+
+
+class ScreenAnalyzer:
+    """
+    Incremental screen observation. For each session the tile hashes and the
+    OCR'd words of the previous capture are kept; a new capture is hashed
+    (see tile_hashes()), compared tile by tile, and only the rectangles
+    around changed tiles are cropped and sent to `ocr`. Words are stored
+    against the tile holding their centre, so re-reading a region replaces
+    exactly the words inside it, and the screen text and
+    `current_task_status` are only rebuilt when some tile actually changed.
+
+    The first capture of a session, a resolution change, or more than
+    `full_frame_ratio` dirty tiles read the whole capture instead.
+    """
+
+    def __init__(self, ocr=None, tile=TILE_SIZE, shift=QUANT_SHIFT, full_frame_ratio=FULL_FRAME_RATIO,
+                 max_sessions=SCREEN_MAX_SESSIONS):
+        self.ocr = ocr if ocr is not None else create_ocr()
+        self.tile = tile
+        self.shift = shift
+        self.full_frame_ratio = full_frame_ratio
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, session_id):
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._sessions[session_id] = _ScreenState()
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return state
+
+    def reset(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def update(self, session_id, capture):
+        """Diffs `capture` against the session's previous one and returns the screen observation."""
+        with span("screen.update", UPDATE_SECONDS):
+            pixels = to_pixels(capture)
+            state = self._state(session_id)
+            with state.lock:
+                return self._update(state, pixels)
+
+    def _update(self, state, pixels):
+        started = time.perf_counter()
+        hash_started = time.perf_counter()
+        hashes = tile_hashes(pixels, self.tile, self.shift)
+        HASH_SECONDS.observe(time.perf_counter() - hash_started)
+        rows, cols = hashes.shape
+        if state.hashes is None or state.shape != pixels.shape:
+            dirty = np.ones((rows, cols), dtype=bool)
+            state.words = {}
+        else:
+            dirty = hashes != state.hashes
+        dirty_count = int(dirty.sum())
+        ratio = dirty_count / dirty.size
+        DIRTY_RATIO.observe(ratio)
+
+        regions = []
+        if dirty_count:
+            regions = [(0, 0, rows, cols)] if ratio > self.full_frame_ratio else dirty_regions(dirty)
+            kind = "full" if len(regions) == 1 and regions[0] == (0, 0, rows, cols) else "partial"
+            for region in regions:
+                OCR_PIXELS.inc(self._read_region(state, pixels, region), kind=kind)
+            state.text = self._assemble(state.words)
+            state.status = task_status(state.text)
+            state.changed_at = time.time()
+        state.hashes = hashes
+        state.shape = pixels.shape
+        state.captures += 1
+        return {
+            "modality": "screen",
+            "current_task_status": state.status,
+            "changed_tile_ratio": round(ratio, 4),
+            "ocr_regions": len(regions),
+            "seconds_since_change": round(time.time() - state.changed_at, 1),
+            "screen_text_chars": len(state.text),
+            "update_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    def _read_region(self, state, pixels, region):
+        r0, c0, r1, c1 = region
+        tile = self.tile
+        h, w = pixels.shape[:2]
+        top, left = r0 * tile, c0 * tile
+        bottom, right = min(r1 * tile, h), min(c1 * tile, w)
+        crop_top, crop_left = max(top - OCR_MARGIN, 0), max(left - OCR_MARGIN, 0)
+        crop_bottom, crop_right = min(bottom + OCR_MARGIN, h), min(right + OCR_MARGIN, w)
+        crop = pixels[crop_top:crop_bottom, crop_left:crop_right]
+        for r in range(r0, r1):
+            for c in range(c0, c1):
+                state.words.pop((r, c), None)
+        for x, y, width, height, text in self.ocr(Image.fromarray(crop)):
+            # Keep words centred inside the region; the margin only gives context.
+            cx, cy = crop_left + x + width / 2, crop_top + y + height / 2
+            if top <= cy < bottom and left <= cx < right:
+                state.words.setdefault((int(cy // tile), int(cx // tile)), []).append((crop_top + y, crop_left + x, text))
+        return crop.shape[0] * crop.shape[1]
+
+    @staticmethod
+    def _assemble(words):
+        # Reading order: words grouped into lines by their top edge, then left to right.
+        ordered = sorted((y // LINE_HEIGHT, x, text) for tile_words in words.values() for y, x, text in tile_words)
+        lines = []
+        current_line = None
+        for line, _, text in ordered:
+            if line != current_line:
+                lines.append([])
+                current_line = line
+            lines[-1].append(text)
+        return "\n".join(" ".join(line) for line in lines)
+
+    def text(self, session_id):
+        """The current screen text of a session, as assembled from its OCR'd regions."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+        return state.text if state is not None else ""
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "tile": self.tile, "ocr": type(self.ocr).__name__}
+
+
+_shared_analyzer = None
+_shared_analyzer_lock = threading.Lock()
+
+def get_screen_analyzer():
+    """Returns the process-wide analyzer (OCR backend from SCREEN_OCR_BACKEND), creating it on first use."""
+    global _shared_analyzer
+    if _shared_analyzer is None:
+        with _shared_analyzer_lock:
+            if _shared_analyzer is None:
+                _shared_analyzer = ScreenAnalyzer()
+    return _shared_analyzer
+
+
+def set_screen_analyzer(analyzer):
+    """Replaces the shared analyzer, e.g. with one using the app's vision OCR client."""
+    global _shared_analyzer
+    _shared_analyzer = analyzer
@@ -0,0 +1,294 @@
+import asyncio
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from simple_react_agent import react_steps_async
+from metrics import histogram, counter, gauge
+from structured_log import get_logger
+
+# Iterations (observe -> plan -> act) running at once across all sessions.
+SCHEDULER_MAX_ACTIVE = int(os.environ.get("SCHEDULER_MAX_ACTIVE", "64"))
+# Runs admitted (active or queued) before submit() refuses new ones.
+SCHEDULER_MAX_RUNS = int(os.environ.get("SCHEDULER_MAX_RUNS", "512"))
+SCHEDULER_MAX_ITERATIONS = int(os.environ.get("SCHEDULER_MAX_ITERATIONS", "50"))
+# Planner calls still block, so they get a thread each.
+SCHEDULER_PLANNER_THREADS = int(os.environ.get("SCHEDULER_PLANNER_THREADS", "16"))
+# Finished runs kept for status lookups by run id.
+SCHEDULER_RUN_HISTORY = 1024
+
+RUNS = gauge("scheduler_runs", "Admitted ReAct runs by state: active (holding an iteration slot), waiting_slot, waiting_session.", ("state",))
+SLOT_WAIT_SECONDS = histogram("scheduler_slot_wait_seconds", "Time an iteration waits for a free slot.")
+RUN_SECONDS = histogram("scheduler_run_duration_seconds", "ReAct run time from submission, by outcome (done, deadline, cancelled, error).", ("outcome",))
+REJECTED = counter("scheduler_rejected_runs", "Runs refused because the scheduler was full.")
+
+log = get_logger("scheduler")
+
+
+class SchedulerFull(RuntimeError):
+    pass
+
+
+class _FairGate:
+    """
+    `slots` iteration slots shared by every session. A freed slot goes to the
+    waiter whose session has run the fewest iterations, ties in arrival
+    order: a long session yields to ones that have only just started, and
+    sessions at the same depth take turns.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+
+    def waiting(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, served):
+        if self.active < self.slots and not self.waiting():
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (served, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as this waiter was cancelled.
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # the slot passes straight to the waiter
+                return
+        self.active -= 1
+
+
+class _Lane:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.runs = 0
+
+
+class SchedulerRun:
+    def __init__(self, session_id, max_it, time_constr):
+        self.run_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.max_it = max_it
+        self.time_constr = time_constr
+        self.submitted = time.monotonic()
+        self.state = "waiting_session"
+        self.iterations = 0
+        self.outcome = None
+        self.future = None
+
+    def status(self):
+        status = {
+            "run_id": self.run_id,
+            "session_id": self.session_id,
+            "state": self.outcome or self.state,
+            "iterations": self.iterations,
+            "max_iterations": self.max_it,
+            "elapsed_seconds": round(time.monotonic() - self.submitted, 2)
+        }
+        if self.future.done() and not self.future.cancelled() and self.future.exception() is None:
+            status["tutor_response"] = self.future.result()
+        return status
+
+
+class SessionScheduler:
+    """
+    Runs many ReAct sessions cooperatively on one asyncio event loop on a
+    background thread, instead of one request thread per session.
+
+    Tools are awaited (see ToolExecutor.run_async), so a session waiting on
+    a slow tool costs no thread; planner calls share a bounded pool. Each run
+    is cancelled once its `time_constr` minutes (counted from submission)
+    are up and is held to at most `max_iterations` iterations. Runs of one
+    session execute one after another.
+
+    Iterations take a slot from a fair gate (`max_active` at once), so
+    hundreds of admitted sessions make progress in turns. Once `max_runs`
+    runs are admitted, submit() raises SchedulerFull rather than queueing
+    without bound.
+    """
+
+    def __init__(self, max_active=SCHEDULER_MAX_ACTIVE, max_runs=SCHEDULER_MAX_RUNS,
+                 max_iterations=SCHEDULER_MAX_ITERATIONS, planner_threads=SCHEDULER_PLANNER_THREADS):
+        self.max_runs = max_runs
+        self.max_iterations = max_iterations
+        self._gate = _FairGate(max_active)
+        self._lanes = {}
+        self._admitted = 0
+        self._admit_lock = threading.Lock()
+        self._runs = OrderedDict()
+        self._outcomes = Counter()
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=planner_threads, thread_name_prefix="planner"))
+        self._thread = threading.Thread(target=self.loop.run_forever, name="session-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, init_state, max_it=50, time_constr=10, session_id="default", on_event=None):
+        """
+        Admits a run and returns its SchedulerRun; run.future is a
+        concurrent.futures.Future for the final tutor response. `on_event`
+        is called on the scheduler thread with every step event and must
+        not block. Raises SchedulerFull when the scheduler is at capacity.
+        """
+        with self._admit_lock:
+            if self._admitted >= self.max_runs:
+                REJECTED.inc()
+                raise SchedulerFull(f"{self._admitted} tutor runs already admitted")
+            self._admitted += 1
+            run = SchedulerRun(session_id, min(max_it, self.max_iterations), time_constr)
+            run.future = asyncio.run_coroutine_threadsafe(self._run(run, init_state, on_event), self.loop)
+            self._runs[run.run_id] = run
+            while len(self._runs) > self.max_runs + SCHEDULER_RUN_HISTORY:
+                oldest = next(iter(self._runs))
+                if not self._runs[oldest].future.done():
+                    break
+                self._runs.pop(oldest)
+        return run
+
+    def stream(self, init_state, max_it=50, time_constr=10, session_id="default"):
+        """
+        Admits a run (raising SchedulerFull right away if it cannot) and
+        returns a generator of its step events for the calling thread.
+        Closing the generator cancels the run.
+        """
+        events = queue.Queue()
+        run = self.submit(init_state, max_it, time_constr, session_id, on_event=events.put)
+        return self._iter_events(run, events)
+
+    def _iter_events(self, run, events):
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=0.5)
+                except queue.Empty:
+                    if run.future.done() and events.empty():
+                        run.future.result()  # raises what the run raised
+                        return
+                    continue
+                yield event
+                if event["type"] == "done":
+                    return
+        finally:
+            run.future.cancel()
+
+    def get(self, run_id):
+        with self._admit_lock:
+            return self._runs.get(run_id)
+
+    async def _run(self, run, init_state, on_event):
+        outcome = "error"
+        lane = self._lanes.get(run.session_id)
+        if lane is None:
+            lane = self._lanes[run.session_id] = _Lane()
+        lane.runs += 1
+        self._update_gauges()
+        deadline = asyncio.timeout(run.time_constr * 60 if run.time_constr else None)
+        try:
+            try:
+                async with deadline:
+                    async with lane.lock:
+                        result = await self._drive(run, init_state, on_event)
+                outcome = "done"
+            except TimeoutError:
+                if not deadline.expired():
+                    raise
+                outcome = "deadline"
+                result = f"Time limit of {run.time_constr} minutes reached before the tutor finished."
+                log.warning("ReAct run hit its deadline", session_id=run.session_id, run_id=run.run_id, iterations=run.iterations)
+                if on_event is not None:
+                    on_event({"type": "error", "message": "time limit reached"})
+                    on_event({"type": "done", "result": result})
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            log.exception("ReAct run failed", session_id=run.session_id, run_id=run.run_id, error=str(e))
+            raise
+        finally:
+            run.outcome = outcome
+            self._outcomes[outcome] += 1
+            RUN_SECONDS.observe(time.monotonic() - run.submitted, outcome=outcome)
+            lane.runs -= 1
+            if lane.runs == 0:
+                del self._lanes[run.session_id]
+            with self._admit_lock:
+                self._admitted -= 1
+            self._update_gauges()
+
+    async def _drive(self, run, init_state, on_event):
+        result = None
+        holding = False
+        steps = react_steps_async(init_state, run.max_it, run.time_constr, run.session_id)
+        try:
+            async for event in steps:
+                if event["type"] == "iteration":
+                    # One slot per iteration: give it back between iterations
+                    # so the next one queues behind sessions with less progress.
+                    if holding:
+                        self._gate.release()
+                        holding = False
+                    run.state = "waiting_slot"
+                    self._update_gauges()
+                    waited = time.perf_counter()
+                    await self._gate.acquire(run.iterations)
+                    SLOT_WAIT_SECONDS.observe(time.perf_counter() - waited)
+                    holding = True
+                    run.state = "active"
+                    run.iterations += 1
+                    self._update_gauges()
+                elif event["type"] == "done":
+                    result = event["result"]
+                if on_event is not None:
+                    on_event(event)
+        finally:
+            await steps.aclose()
+            if holding:
+                self._gate.release()
+        return result
+
+    def _update_gauges(self):
+        states = self._states()
+        for state, value in states.items():
+            RUNS.set(value, state=state)
+
+    def _states(self):
+        active = self._gate.active
+        waiting_slot = self._gate.waiting()
+        return {
+            "active": active,
+            "waiting_slot": waiting_slot,
+            "waiting_session": max(0, self._admitted - active - waiting_slot)
+        }
+
+    def stats(self):
+        return dict(
+            self._states(),
+            admitted=self._admitted,
+            max_active=self._gate.slots,
+            max_runs=self.max_runs,
+            outcomes=dict(self._outcomes)
+        )
+
+    def close(self):
+        with self._admit_lock:
+            runs = list(self._runs.values())
+        for run in runs:
+            run.future.cancel()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
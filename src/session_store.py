@@ -0,0 +1,229 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_STORE_BACKEND = os.environ.get("SESSION_STORE_BACKEND", "memory")
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", os.path.join(os.getcwd(), "sessions.db"))
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", "7200"))
+MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", "1000"))
+
+# Classes with to_state()/from_state() that the SQLite backend can round-trip.
+_REGISTERED_TYPES = {}
+
+def register_type(cls):
+    _REGISTERED_TYPES[cls.__name__] = cls
+    return cls
+
+def _encode_object(obj):
+    if type(obj).__name__ in _REGISTERED_TYPES:
+        return {"__type__": type(obj).__name__, "state": obj.to_state()}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _decode_object(obj):
+    if "__type__" in obj and obj["__type__"] in _REGISTERED_TYPES:
+        return _REGISTERED_TYPES[obj["__type__"]].from_state(obj["state"])
+    return obj
+
+def dumps(value):
+    return json.dumps(value, default=_encode_object)
+
+def loads(text):
+    return json.loads(text, object_hook=_decode_object)
+
+
+class MemorySessionStore:
+    """
+    In-process session store. Each session is a small dict of key -> value.
+
+    Sessions are kept in least-recently-used order; a session idle for longer
+    than `ttl` seconds is dropped, and the least recently used one is evicted
+    once `max_sessions` is exceeded. All access goes through one lock, and
+    update() performs read-modify-write atomically. Values are shared, not
+    copied, so callers must only change them inside update().
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session_id -> (data, last_access)
+        self._lock = threading.RLock()
+
+    def _purge_expired(self, now):
+        # LRU order is also last-access order, so expired sessions sit at the front.
+        while self._sessions:
+            session_id, (_, last_access) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl:
+                break
+            del self._sessions[session_id]
+
+    def _touch(self, session_id, create):
+        now = time.monotonic()
+        self._purge_expired(now)
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            if not create:
+                return None
+            data = {}
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            data = entry[0]
+        self._sessions[session_id] = (data, now)
+        self._sessions.move_to_end(session_id)
+        return data
+
+    def get(self, session_id, key, default=None):
+        with self._lock:
+            data = self._touch(session_id, create=False)
+            if data is None:
+                return default
+            return data.get(key, default)
+
+    def set(self, session_id, key, value):
+        with self._lock:
+            self._touch(session_id, create=True)[key] = value
+
+    def update(self, session_id, key, func, default=None):
+        """Atomically replaces the value with func(current_value) and returns it."""
+        with self._lock:
+            data = self._touch(session_id, create=True)
+            value = func(data.get(key, default))
+            data[key] = value
+            return value
+
+    def get_session(self, session_id):
+        with self._lock:
+            data = self._touch(session_id, create=False)
+            return dict(data) if data is not None else {}
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return self._touch(session_id, create=False) is not None
+
+
+class SQLiteSessionStore:
+    """
+    Session store backed by a SQLite file so several worker processes can share
+    session state. Values are stored as JSON, plus any class registered with
+    register_type(). Each thread gets its own connection; update() runs inside
+    BEGIN IMMEDIATE so read-modify-write is atomic across processes. Sessions
+    idle for longer than `ttl` are purged periodically.
+    """
+
+    PURGE_EVERY_WRITES = 500
+
+    def __init__(self, path=SESSION_STORE_PATH, ttl=SESSION_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_data ("
+            " session_id TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (session_id, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS session_data_updated ON session_data (updated_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: autocommit, transactions are explicit.
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _after_write(self, conn):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY_WRITES == 0:
+            self.purge_expired(conn)
+
+    def purge_expired(self, conn=None):
+        conn = conn or self._conn()
+        cutoff = time.time() - self.ttl
+        conn.execute(
+            "DELETE FROM session_data WHERE session_id IN ("
+            " SELECT session_id FROM session_data GROUP BY session_id HAVING MAX(updated_at) < ?)",
+            (cutoff,)
+        )
+
+    def get(self, session_id, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM session_data WHERE session_id = ? AND key = ?", (session_id, key)
+        ).fetchone()
+        return loads(row[0]) if row else default
+
+    def set(self, session_id, key, value):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO session_data (session_id, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (session_id, key, dumps(value), time.time())
+        )
+        self._after_write(conn)
+
+    def update(self, session_id, key, func, default=None):
+        """Atomically replaces the value with func(current_value) and returns it."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM session_data WHERE session_id = ? AND key = ?", (session_id, key)
+            ).fetchone()
+            value = func(loads(row[0]) if row else default)
+            conn.execute(
+                "INSERT OR REPLACE INTO session_data (session_id, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, key, dumps(value), time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write(conn)
+        return value
+
+    def get_session(self, session_id):
+        rows = self._conn().execute(
+            "SELECT key, value FROM session_data WHERE session_id = ?", (session_id,)
+        ).fetchall()
+        return {key: loads(value) for key, value in rows}
+
+    def delete(self, session_id):
+        self._conn().execute("DELETE FROM session_data WHERE session_id = ?", (session_id,))
+
+    def __contains__(self, session_id):
+        return self._conn().execute(
+            "SELECT 1 FROM session_data WHERE session_id = ? LIMIT 1", (session_id,)
+        ).fetchone() is not None
+
+
+def create_session_store(backend=SESSION_STORE_BACKEND, **kwargs):
+    if backend == "memory":
+        return MemorySessionStore(**kwargs)
+    if backend == "sqlite":
+        return SQLiteSessionStore(**kwargs)
+    raise ValueError(f"Unknown session store backend '{backend}' (expected 'memory' or 'sqlite')")
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+def get_session_store():
+    """Returns the process-wide store selected by SESSION_STORE_BACKEND."""
+    global _shared_store
+    if _shared_store is None:
+        with _shared_store_lock:
+            if _shared_store is None:
+                _shared_store = create_session_store()
+    return _shared_store
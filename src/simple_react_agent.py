@@ -1,6 +1,50 @@
+import asyncio
 import json
+import os
 import time
 import random
+import threading
+import contextvars
+from concurrent.futures import TimeoutError as FutureTimeout
+from PIL import Image
+from session_store import get_session_store
+from perf_history import PerformanceHistory
+from book_index import BookIndex, build_index
+from vector_index import VectorIndex, build_vector_index
+from tool_executor import ToolExecutor, simulated_latency
+from tool_cache import CachePolicy, ToolCache, normalize_text_args
+from persistence import get_journal
+from transcription_service import get_transcription_service
+from audio_features import LIVE_SAMPLE_RATE, analyze_wav, analyze_waveform
+from screen_analysis import get_screen_analyzer
+from prompt_builder import PromptBuilder
+from planner import PLANNER_BACKEND, create_planner
+from structured_output import Field, extract_json
+from mock_rules import get_rule_engine, observations_from_prompt
+from react_parser import parse_react_output, read_react_stream
+from metrics import TOKEN_BUCKETS, counter, histogram, span
+from structured_log import get_logger
+
+RAG_BACKEND = os.environ.get("RAG_BACKEND", "bm25")
+BOOK_INDEX_DIR = os.environ.get("BOOK_INDEX_DIR", os.path.join(os.getcwd(), "book_index"))
+VECTOR_INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR", os.path.join(os.getcwd(), "vector_index"))
+RAG_TOP_K = 3
+# analyse_audio returns its waveform features after at most this long
+# without a transcript; the transcript is picked up by a later call.
+TRANSCRIBE_WAIT_SECONDS = float(os.environ.get("TRANSCRIBE_WAIT_SECONDS", "2"))
+AUDIO_TOOL_TIMEOUT_SECONDS = float(os.environ.get("AUDIO_TOOL_TIMEOUT_SECONDS", "8"))
+
+log = get_logger("agent")
+PHASE_SECONDS = histogram("react_phase_duration_seconds", "ReAct iteration time by phase (observe, plan, act) and in total.", ("phase", "outcome"))
+PROMPT_TOKENS = histogram("react_prompt_tokens", "Estimated planner prompt size per iteration.", buckets=TOKEN_BUCKETS)
+ITERATIONS = counter("react_iterations", "ReAct iterations started.")
+
+# Session whose state the tools read and write; set by react_loop for the
+# duration of a run so tools keep their single-argument signatures.
+current_session_id = contextvars.ContextVar("current_session_id", default="default")
+# Observations the planner is deciding on, for planners that read them
+# directly instead of parsing the prompt (mock_lmm_resp).
+current_observations = contextvars.ContextVar("current_observations", default=None)
 
 # In a real system, this would be a vector database or a searchable document store.
 LINEAR_ALGEBRA_BOOK_CONTENT = {
@@ -12,9 +56,9 @@ LINEAR_ALGEBRA_BOOK_CONTENT = {
     "affine_geometry": "Affine geometry is a branch of geometry that studies properties of geometric figures that are preserved under affine transformations (transformations that preserve collinearity and ratios of distances along parallel lines). It's a generalization of Euclidean geometry where concepts like distance and angles are not necessarily preserved, but parallelism is."
 }
 
+@simulated_latency(0.5)
 def analyze_video(video_dat):
-    print("Tool: Analyzing video feed for mood and concentration...")
-    time.sleep(0.5)
+    log.info("Analyzing video feed for mood and concentration", tool="analyze_video")
     moods = ["confused", "focused", "frustrated", "bored", "engaged"]
     concentration_level = random.randint(10, 100) # Percentage
     return {
@@ -24,23 +68,65 @@ def analyze_video(video_dat):
     }
     
     
+def _has_audio(audio_dat):
+    return (isinstance(audio_dat, str) and os.path.isfile(audio_dat)) or hasattr(audio_dat, "ndim") or (
+        isinstance(audio_dat, tuple) and len(audio_dat) == 2)
+
+@simulated_latency(0.5, when=lambda audio_dat: not _has_audio(audio_dat))
 def analyse_audio(audio_dat):
-    
-    print("Tool: Analyzing audio stream for speech and knowledge...")
-    time.sleep(0.5)
+    """
+    audio_dat may be a path to a recording, a live microphone chunk (a
+    float sample array at LIVE_SAMPLE_RATE, or a (samples, sample_rate)
+    pair), or anything else for mock data. Real audio
+    gets waveform hesitation features (see audio_features.py); recordings
+    are also transcribed, but only waited for TRANSCRIBE_WAIT_SECONDS: a
+    longer transcription is reported as pending and its text is returned
+    by the next call for the same recording.
+    """
+    log.info("Analyzing audio stream for speech and knowledge", tool="analyse_audio")
+    observation = {"modality": "audio"}
+    features = None
+    if isinstance(audio_dat, str) and os.path.isfile(audio_dat):
+        if audio_dat.lower().endswith(".wav"):
+            features = analyze_wav(audio_dat)
+        try:
+            # A recorded clip: transcribe it with the resident whisper workers.
+            transcription = get_transcription_service().submit_file(audio_dat).result(timeout=TRANSCRIBE_WAIT_SECONDS)
+            observation["transcript"] = transcription["text"]
+            observation["transcription_real_time_factor"] = transcription["real_time_factor"]
+        except FutureTimeout:
+            observation["transcript_status"] = "pending"
+        except Exception as e:
+            log.warning("Transcription failed", path=audio_dat, error=str(e))
+    elif isinstance(audio_dat, tuple) and len(audio_dat) == 2:
+        samples, sample_rate = audio_dat
+        features = analyze_waveform(samples, sample_rate)
+    elif hasattr(audio_dat, "ndim") and hasattr(audio_dat, "dtype"):
+        features = analyze_waveform(audio_dat, LIVE_SAMPLE_RATE)
     knowledge_score_linear_algebra = random.randint(0, 100)
-    hesitation_score = round(random.uniform(0, 1), 2) # 0 to 1
-    return {
-        "modality": "audio",
-        "speech_hesitation": hesitation_score,
-        "knowledge_score_linear_algebra": knowledge_score_linear_algebra
-    }
+    if features is not None:
+        observation["speech_hesitation"] = features["speech_hesitation"]
+        observation["speech_features"] = features
+    else:
+        observation["speech_hesitation"] = round(random.uniform(0, 1), 2) # 0 to 1
+    observation["knowledge_score_linear_algebra"] = knowledge_score_linear_algebra
+    return observation
     
     
+def _has_capture(sreen_dat):
+    return isinstance(sreen_dat, Image.Image) or hasattr(sreen_dat, "ndim") or (
+        isinstance(sreen_dat, str) and sreen_dat.startswith("data:"))
+
+@simulated_latency(0.5, when=lambda sreen_dat: not _has_capture(sreen_dat))
 def analyze_screen(sreen_dat):
-    
-    print("Tool: Analyzing screen data for performance and memory...")
-    time.sleep(0.5)
+    """
+    sreen_dat may be a screen capture (PIL image, pixel array or data URL),
+    which is diffed against the session's previous capture so only changed
+    regions are read (see screen_analysis.py); anything else gives mock data.
+    """
+    log.info("Analyzing screen data for performance and memory", tool="analyze_screen")
+    if _has_capture(sreen_dat):
+        return get_screen_analyzer().update(current_session_id.get(), sreen_dat)
     task_statuses = ["incorrect matrix syntax", "failed to solve equation", "correct", "incomplete", "stuck on definition"]
     memory_retention_rate = random.randint(50, 100)
     current_task_status = random.choice(task_statuses)
@@ -53,44 +139,89 @@ def analyze_screen(sreen_dat):
     
     
 
+@simulated_latency(1)
 def update_short_term(action_input):
     
-    print(f"Tool: Modifying short-term plan: {action_input}")
-    time.sleep(1)
+    log.info("Modifying short-term plan", tool="update_short_term", action_input=action_input)
     return f"Observation: Short-term plan adjusted: '{action_input}'."
 
+@simulated_latency(1)
 def update_long_term(action_input):
-    print(f"Tool: Modifying long-term plan: {action_input}")
-    time.sleep(1)
+    log.info("Modifying long-term plan", tool="update_long_term", action_input=action_input)
     return f"Observation: Long-term plan adjusted: '{action_input}'."
 
+@simulated_latency(2)
 def gen_content(action_input):
     
-    print(f"Tool: Generating new content on: {action_input}")
-    time.sleep(2)
+    log.info("Generating new content", tool="gen_content", action_input=action_input)
     return f"Observation: New content generated: 'A simplified example for {action_input} was created and presented.'"
 
+@simulated_latency(1)
 def update_content(action_input):
-    print(f"Tool: Modifying existing content: {action_input}")
-    time.sleep(1)
+    log.info("Modifying existing content", tool="update_content", action_input=action_input)
     return f"Observation: Existing content modified: '{action_input}'."
 
-def encourage_user():
-    print("Tool: Providing encouragement...")
-    time.sleep(1)
+@simulated_latency(1)
+def encourage_user(action_input=None):
+    log.info("Providing encouragement", tool="encourage_user")
     return "Observation: The tutor said, 'You're making great progress!'"
 
-def rag_book(query):
+_book_index = None
+_vector_index = None
+_book_index_lock = threading.Lock()
+
+def _book_passages():
+    return {
+        key: f"{key.replace('_', ' ')}. {content}"
+        for key, content in LINEAR_ALGEBRA_BOOK_CONTENT.items()
+    }
+
+def get_book_index():
+    """
+    Loads the saved book index from BOOK_INDEX_DIR (memory-mapped) if there is
+    one, otherwise indexes LINEAR_ALGEBRA_BOOK_CONTENT in memory.
     """
-    Simulates retrieving relevant knowledge from the Linear Algebra book (KAG/RAG).
+    global _book_index
+    if _book_index is None:
+        with _book_index_lock:
+            if _book_index is None:
+                if os.path.exists(os.path.join(BOOK_INDEX_DIR, "meta.json")):
+                    _book_index = BookIndex.load(BOOK_INDEX_DIR)
+                else:
+                    _book_index = build_index(_book_passages())
+    return _book_index
+
+def get_vector_index():
+    """Dense counterpart of get_book_index(), loaded from VECTOR_INDEX_DIR if saved."""
+    global _vector_index
+    if _vector_index is None:
+        with _book_index_lock:
+            if _vector_index is None:
+                if os.path.exists(os.path.join(VECTOR_INDEX_DIR, "vectors.json")):
+                    _vector_index = VectorIndex.load(VECTOR_INDEX_DIR)
+                else:
+                    _vector_index = build_vector_index(_book_passages())
+    return _vector_index
+
+def rag_book(query, k=RAG_TOP_K):
     """
-    print(f"Tool: Retrieving knowledge from book for query: '{query}'...")
-    time.sleep(1.5)
-    # Simple keyword matching for POC
-    for key, content in LINEAR_ALGEBRA_BOOK_CONTENT.items():
-        if query.lower() in key.lower() or query.lower() in content.lower():
-            return f"Observation: Retrieved relevant passage: '{content[:100]}...'" # Return snippet
-    return "Observation: No highly relevant passage found in the book for that query."
+    Retrieves the passages most relevant to the query from the Linear Algebra book (KAG/RAG),
+    ranked with BM25 or, with RAG_BACKEND=vector, by embedding similarity.
+    """
+    log.info("Retrieving knowledge from book", tool="rag_book", query=query, backend=RAG_BACKEND)
+    recall_note = ""
+    if RAG_BACKEND == "vector":
+        index = get_vector_index()
+        ids, scores, recall = index.search_with_recall([query or ""], k)
+        results = [(index.keys[i], float(score), index.texts[i])
+                   for i, score in zip(ids[0], scores[0]) if i >= 0 and score > 0]
+        recall_note = f" (recall@{k} vs exact search: {recall:.2f})"
+    else:
+        results = get_book_index().search(query or "", k=k)
+    if not results:
+        return "Observation: No highly relevant passage found in the book for that query."
+    passages = "\n".join(f"[{key} | score {score:.2f}] {text}" for key, score, text in results)
+    return f"Observation: Retrieved relevant passages{recall_note}:\n{passages}"
 
 
 TOOLS = {
@@ -106,166 +237,338 @@ TOOLS = {
 }
 
 def mock_lmm_resp(prompt):
-
-    if "'frustrated'" in prompt and "knowledge score on 'Linear Algebra' is" in prompt and "incorrect matrix syntax" in prompt:
-        # Extract knowledge score (mock parsing)
-        try:
-            knowledge_score_str = prompt.split("knowledge score on 'Linear Algebra' is ")[1].split("/")[0]
-            knowledge_score = int(knowledge_score_str)
-            if knowledge_score < 50: # Low knowledge
-                return """
-Thought: Student is frustrated, has low knowledge, and is making syntax errors. This is a critical state. I should immediately modify the current content to highlight the syntax error and provide a targeted hint to alleviate frustration and guide them.
-Action: modify_existing_content
-Action Input: 'highlight the specific incorrect matrix syntax and provide a hint for matrix inversion'
-"""
-        except (ValueError, IndexError):
-            pass 
-
-    if "Concentration level is 10%" in prompt and "knowledge score on 'Linear Algebra' is 20/100" in prompt:
-        return """
-Thought: Student has very low concentration and poor knowledge. The current approach isn't working. I need to generate a completely new, simpler piece of content to re-engage and re-teach.
-Action: generate_new_content
-Action Input: 'a very simplified, visual example for matrix basics'
-"""
-    elif "Memory retention rate is 50%" in prompt and "failed to solve equation" in prompt:
-        return """
-Thought: Student has low memory retention and is failing tasks. This indicates a need for foundational review. I should adjust the long-term plan to incorporate a dedicated review session.
-Action: modify_long_term_plan
-Action Input: 'schedule a review session for foundational vector and matrix operations'
-"""
-    elif "Concentration level is 30%" in prompt:
-        return """
-Thought: Student's concentration is dropping. A timely encouragement might help re-focus them without interrupting the learning flow too much.
-Action: encourage_user
-Action Input: None
-"""
-    elif "stuck on definition" in prompt:
-        return """
-Thought: The student is stuck on a definition. I should retrieve the exact definition from the Linear Algebra book to provide precise information.
-Action: retrieve_knowledge_from_book
-Action Input: 'matrix inversion definition'
-"""
-    else:
-        return """
-Thought: The current state is stable or no clear critical pattern detected. I will continue to analyze incoming multimodal observations.
-Final Answer: The tutor is observing and ready for the next interaction or to provide a general response.
-"""
+    """
+    Offline planner: the rules in mock_rules.json (see mock_rules.py) matched
+    against the current iteration's observations. Inside react_loop those
+    come straight from the loop; otherwise they are read back from the end
+    of the prompt, so the cost does not grow with the history.
+    """
+    observations = current_observations.get()
+    if observations is None:
+        observations = observations_from_prompt(prompt)
+    return get_rule_engine().respond(observations)
     
 def parse_llm_output(output):
-    parsed_output = {}
-    lines = output.strip().split('\n')
-    for line in lines:
-        if line.startswith("Thought"):
-            parsed_output["thought"] = line.replace("Thought:", "").strip()
-        elif line.startswith("Action:"):
-            parsed_output["action"] = line.replace("Action:", "").strip()
-        elif line.startswith("Action Input:"):
-            action_input = line.replace("Action Input:", "").strip()
-            parsed_output["action_input"] = action_input if action_input != "None" else None
-        elif line.startswith("Final Answer:"):
-            parsed_output["final_answer"] = line.replace("Final Answer:", "").strip()
+    parsed_output = parse_react_output(output)
+    if not parsed_output:
+        parsed_output = _parse_json_output(output)
+    return parsed_output
+
+def _parse_json_output(output):
+    # Some models answer with a JSON object instead of the line format.
+    parsed_json = extract_json(output, REACT_JSON_SCHEMA)
+    if parsed_json is None:
+        return {}
+    parsed_output = {key: value for key, value in parsed_json.items() if value is not None}
+    if parsed_output.get("action_input") == "None":
+        del parsed_output["action_input"]
     return parsed_output
 
-student_long_term_performance = {
-    "knowledge_scores_history": [], 
-    "concentration_history": [],    
-    "memory_retention_history": []   
+REACT_JSON_SCHEMA = {
+    "thought": Field(str, None),
+    "action": Field(str, None, aliases=("tool",)),
+    "action_input": Field(str, None, aliases=("input", "tool_input")),
+    "final_answer": Field(str, None, aliases=("answer",))
 }
 
+def get_long_term_performance(session_id=None):
+    session_id = session_id or current_session_id.get()
+    return get_session_store().get(session_id, "performance") or PerformanceHistory()
+
 def update_long_term_performance(new_observations):
-    print("Tool: Updating long-term performance records...")
-    if new_observations.get("knowledge_score_linear_algebra") is not None:
-        student_long_term_performance["knowledge_scores_history"].append(
-            new_observations["knowledge_score_linear_algebra"]
-        )
-    if new_observations.get("concentration_level") is not None:
-        student_long_term_performance["concentration_history"].append(
-            new_observations["concentration_level"]
-        )
-    if new_observations.get("memory_retention_rate") is not None:
-        student_long_term_performance["memory_retention_history"].append(
-            new_observations["memory_retention_rate"]
-        )
-    print(f"Long-term performance updated: {student_long_term_performance}")
+    log.info("Updating long-term performance records", tool="update_long_term_performance")
+    def record(history):
+        history = history or PerformanceHistory()
+        history.record(new_observations)
+        return history
+    history = get_session_store().update(current_session_id.get(), "performance", record)
+    get_journal().record(current_session_id.get(), "performance", history)
+    log.info("Long-term performance updated", summary=history.summary())
     return "Observation: Long-term performance records updated."
 
 def retrieve_long_term_performance():
-    print("Tool: Retrieving long-term performance records...")
-    return f"Observation: Historical performance data: {student_long_term_performance}"
+    log.info("Retrieving long-term performance records", tool="retrieve_long_term_performance")
+    return f"Observation: Historical performance data: {get_long_term_performance().summary()}"
 
 TOOLS["update_long_term_performance"] = update_long_term_performance
 TOOLS["retrieve_long_term_performance"] = retrieve_long_term_performance
 
-def react_loop(init_state , max_it = 50 , time_constr=10):
-    conv_hist = init_state
+# Repeated calls within a session reuse earlier results: book lookups are
+# pure, while performance summaries and generated content are per session
+# and dropped as soon as the tool that changes them runs.
+TOOL_CACHE_POLICIES = {
+    "rag_book": CachePolicy(ttl=3600, max_entries=512, key=normalize_text_args),
+    "retrieve_long_term_performance": CachePolicy(ttl=60, scope="session", invalidated_by=("update_long_term_performance",)),
+    "gen_content": CachePolicy(ttl=600, scope="session", invalidated_by=("update_content",), key=normalize_text_args)
+}
+tool_cache = ToolCache(TOOL_CACHE_POLICIES, scope_key=current_session_id.get)
+tool_cache.install(TOOLS)
+
+# Observation tools are independent of each other, so each iteration runs
+# them side by side on the shared executor (modality -> tool name).
+OBSERVATION_TOOLS = {
+    "video": "analyze_video",
+    "audio": "analyse_audio",
+    "screen": "analyze_screen"
+}
+# Audio analysis reads and transcribes a recording, so it gets longer than
+# the mock-latency tools (TRANSCRIBE_WAIT_SECONDS bounds the transcription).
+tool_executor = ToolExecutor(TOOLS, timeouts={"analyse_audio": AUDIO_TOOL_TIMEOUT_SECONDS})
+
+_planner = None
+_planner_lock = threading.Lock()
+
+def set_planner(planner):
+    """Replaces the planner used by react_loop (anything with complete(prompt) and stream(prompt))."""
+    global _planner
+    _planner = planner
+
+def get_planner():
+    """Returns the planner selected by PLANNER_BACKEND, creating it on first use."""
+    global _planner
+    if _planner is None:
+        with _planner_lock:
+            if _planner is None:
+                _planner = create_planner(PLANNER_BACKEND, respond=mock_lmm_resp, tool_names=list(TOOLS))
+    return _planner
+
+def react_loop(init_state , max_it = 50 , time_constr=10, session_id="default"):
+    result = None
+    for event in react_steps(init_state, max_it, time_constr, session_id):
+        if event["type"] == "done":
+            result = event["result"]
+    return result
+
+class _Blocking:
+    """
+    A step _react_steps cannot take itself without blocking: the driver runs
+    func(*args) and sends the result back in, or throws its exception in.
+    An event-loop driver awaits awaitable(*args) instead.
+    """
+
+    __slots__ = ("func", "awaitable", "args")
+
+    def __init__(self, func, awaitable, *args):
+        self.func = func
+        self.awaitable = awaitable
+        self.args = args
+
+def react_steps(init_state, max_it=50, time_constr=10, session_id="default"):
+    """
+    Runs the ReAct loop as a generator of step events so callers can stream
+    each Thought/Action/Observation as it happens. Every event is a dict with
+    a "type" of iteration, observations, thought, action, observation,
+    final_answer or error; the last one is always {"type": "done", "result": ...}.
+    """
+    # Each step runs in a private copy of the caller's context so the session
+    # id set for the tools does not leak into whatever the thread runs next.
+    context = contextvars.copy_context()
+    steps = _react_steps(init_state, max_it, time_constr, session_id)
+    journal = get_journal()
+    result, error = None, None
+    while True:
+        try:
+            if error is not None:
+                item = context.run(steps.throw, error)
+            else:
+                item = context.run(steps.send, result)
+        except StopIteration:
+            return
+        result, error = None, None
+        if isinstance(item, _Blocking):
+            try:
+                result = context.run(item.func, *item.args)
+            except Exception as e:
+                error = e
+            continue
+        # Every step event is journaled (write-behind) as the session transcript.
+        journal.record(session_id, "step", item)
+        yield item
+
+async def react_steps_async(init_state, max_it=50, time_constr=10, session_id="default"):
+    """
+    react_steps() as an async generator for an event loop (see
+    session_scheduler.py). Tools are awaited through
+    ToolExecutor.run_async, so simulated latency costs no thread. The
+    planner call still blocks, so it runs on the loop's default executor.
+    """
+    context = contextvars.copy_context()
+    steps = _react_steps(init_state, max_it, time_constr, session_id)
+    loop = asyncio.get_running_loop()
+    journal = get_journal()
+    result, error = None, None
+    try:
+        while True:
+            try:
+                if error is not None:
+                    item = context.run(steps.throw, error)
+                else:
+                    item = context.run(steps.send, result)
+            except StopIteration:
+                return
+            result, error = None, None
+            if isinstance(item, _Blocking):
+                try:
+                    if item.awaitable is not None:
+                        # The task copies `context`, so tools see the session and parent span.
+                        result = await context.run(asyncio.ensure_future, item.awaitable(*item.args))
+                    else:
+                        # A copy, because a cancelled call can outlive this run in its thread.
+                        result = await loop.run_in_executor(None, context.copy().run, item.func, *item.args)
+                except Exception as e:
+                    error = e
+                continue
+            journal.record(session_id, "step", item)
+            yield item
+    finally:
+        context.run(steps.close)
+
+async def react_loop_async(init_state, max_it=50, time_constr=10, session_id="default"):
+    result = None
+    async for event in react_steps_async(init_state, max_it, time_constr, session_id):
+        if event["type"] == "done":
+            result = event["result"]
+    return result
+
+def _plan(prompt_with_obs):
+    # The plan is parsed as it streams; reading stops once the step is
+    # complete, so the tool runs without waiting for the rest of the generation.
+    parsed_out, lmm_out = read_react_stream(get_planner().stream(prompt_with_obs))
+    if not parsed_out:
+        parsed_out = _parse_json_output(lmm_out)
+    return parsed_out, lmm_out
+
+def _resume_interrupted(store, session_id, prompt):
+    """
+    Replays the steps of a run a restart cut short (restored by
+    Journal.restore) into `prompt`, once. Returns how many were added.
+    """
+    events = store.get(session_id, "interrupted_steps")
+    if not events:
+        return 0
+    store.set(session_id, "interrupted_steps", [])
+    thought = action = action_input = None
+    resumed = 0
+    for event in events:
+        if event.get("type") == "thought":
+            thought = event["text"]
+        elif event.get("type") == "action":
+            action, action_input = event["action"], event["action_input"]
+        elif event.get("type") == "observation" and action is not None:
+            prompt.add_step(thought, action, action_input, event["result"])
+            resumed += 1
+            thought = action = action_input = None
+    return resumed
+
+def _react_steps(init_state, max_it, time_constr, session_id):
+    current_session_id.set(session_id)
+    store = get_session_store()
+    prompt = PromptBuilder(init_state)
+    resumed = _resume_interrupted(store, session_id, prompt)
+    if resumed:
+        log.info("Resuming interrupted ReAct run", session_id=session_id, steps=resumed)
     start_time = time.time()
-    print(f"Initial State: {init_state}\n")
-    print(f"Session Time Constraint: {time_constr} minutes\n")
+    log.info("ReAct run started", session_id=session_id, initial_state=init_state, time_constraint_minutes=time_constr)
     for i in range(max_it):
-        print(f"--- Iteration {i+1} ---")
-        
-        elapsed_time = (time.time() - start_time) / 60 # in minutes
-        time_remaining = max(0, time_constr - elapsed_time)
-        video_obs = analyze_video("mock_data")
-        audio_obs = analyse_audio("mock_data")
-        screen_obs = analyze_screen("mock_data")
+        # The span stays open across yields; that is safe here because
+        # react_steps runs this generator in its own private context.
+        ITERATIONS.inc()
+        with span("react.iteration", PHASE_SECONDS, phase="iteration", session_id=session_id) as iteration:
+            iteration.set(iteration=i + 1)
+
+            elapsed_time = (time.time() - start_time) / 60 # in minutes
+            time_remaining = max(0, time_constr - elapsed_time)
+            yield {"type": "iteration", "iteration": i + 1, "time_remaining_minutes": round(time_remaining, 1)}
+            # Only this session's observations are visible; modalities that have
+            # not reported yet fall back to the observation tools.
+            # A tool that fails or times out leaves a placeholder for its modality
+            # and the iteration carries on with the observations it has.
+            observations = dict(store.get(session_id, "observations") or {})
+            missing = {
+                modality: (tool, ("mock_data",))
+                for modality, tool in OBSERVATION_TOOLS.items() if not observations.get(modality)
+            }
+            with span("react.observe", PHASE_SECONDS, phase="observe"):
+                results, failures = yield _Blocking(tool_executor.run_many, tool_executor.run_many_async, missing)
+            observations.update(results)
+            for modality, reason in failures.items():
+                log.warning("Observation tool did not return; continuing without it", tool=OBSERVATION_TOOLS[modality], reason=reason)
+                observations[modality] = {"modality": modality, "error": reason}
+            video_obs = observations["video"]
+            audio_obs = observations["audio"]
+            screen_obs = observations["screen"]
+            yield {"type": "observations", "video": video_obs, "audio": audio_obs, "screen": screen_obs, "failed": sorted(failures)}
     
     
-        prompt_with_obs = (
-            f"{conv_hist}\n"
-            f"Current Time Remaining: {time_remaining:.1f} minutes.\n"
-            f"Video Observation: {json.dumps(video_obs)}\n"
-            f"Audio Observation: {json.dumps(audio_obs)}\n"
-            f"Screen Observation: {json.dumps(screen_obs)}\n"
-            f"Historical Performance (Summary): {json.dumps(student_long_term_performance)}" # Provide historical context
-        )
+            with span("react.plan", PHASE_SECONDS, phase="plan"):
+                current_observations.set({"video": video_obs, "audio": audio_obs, "screen": screen_obs,
+                                          "time_remaining_minutes": time_remaining})
+                prompt_with_obs = prompt.build(
+                    f"Current Time Remaining: {time_remaining:.1f} minutes.\n"
+                    f"Video Observation: {json.dumps(video_obs)}\n"
+                    f"Audio Observation: {json.dumps(audio_obs)}\n"
+                    f"Screen Observation: {json.dumps(screen_obs)}\n"
+                    f"Historical Performance (Summary): {json.dumps(get_long_term_performance(session_id).summary())}" # Provide historical context
+                )
     
-        lmm_out = mock_lmm_resp(prompt_with_obs)
-        parsed_out = parse_llm_output(lmm_out)
-        thought = parsed_out.get("thought")
-        action = parsed_out.get("action")
-        action_input = parsed_out.get("action_input")
-        final_answer = parsed_out.get("final_answer")
+                parsed_out, lmm_out = yield _Blocking(_plan, None, prompt_with_obs)
+                PROMPT_TOKENS.observe(prompt.last_prompt_tokens)
+            thought = parsed_out.get("thought")
+            action = parsed_out.get("action")
+            action_input = parsed_out.get("action_input")
+            final_answer = parsed_out.get("final_answer")
     
     
-        if thought:
-            print(f"Thought: {thought}")
+            if thought:
+                log.info("Thought", session_id=session_id, iteration=i + 1, text=thought)
+                yield {"type": "thought", "text": thought}
         
-        if final_answer:
-            print(f"final answer: {final_answer}")
+            if final_answer:
+                log.info("Final answer", session_id=session_id, iteration=i + 1, text=final_answer)
+                yield {"type": "final_answer", "text": final_answer}
+                yield {"type": "done", "result": final_answer}
+                return
         
-        if action:
-            print(f"Action: {action}")
+            if action:
+                log.info("Action", session_id=session_id, iteration=i + 1, action=action, action_input=action_input)
+                yield {"type": "action", "action": action, "action_input": action_input}
             
-            if action in TOOLS:
-                tool_function = TOOLS[action]
-                
-                obs = tool_function(action_input)
+                if action in TOOLS:
+                    try:
+                        with span("react.act", PHASE_SECONDS, phase="act"):
+                            obs = yield _Blocking(tool_executor.run, tool_executor.run_async, action, action_input)
+                    except TimeoutError as e:
+                        obs = f"Observation: {e}."
                 
-                print(f"Observation: {obs}")
+                    log.info("Observation", session_id=session_id, iteration=i + 1, tool=action, result=obs)
+                    yield {"type": "observation", "tool": action, "result": obs}
                 
-                conv_hist += f"\nThought: {thought}\nAction: {action}\nAction Input: {action_input}\nObservation: {obs}"
+                    prompt.add_step(thought, action, action_input, obs)
+                else:
+                    log.error("Unknown tool", session_id=session_id, iteration=i + 1, action=action)
+                    yield {"type": "error", "message": f"Unknown tool '{action}'"}
+                    yield {"type": "done", "result": "I'm sorry, I don't know how to perform that action."}
+                    return
             else:
-                print(f"Error: Unknown tool '{action}'")
-                return "I'm sorry, I don't know how to perform that action."
-        else:
-            print("Error: LLM output did not contain a valid action or final answer.")
-            return "An unexpected error occurred in the ReAct loop."
+                log.error("LLM output did not contain a valid action or final answer", session_id=session_id, iteration=i + 1, output=lmm_out)
+                yield {"type": "error", "message": "LLM output did not contain a valid action or final answer."}
+                yield {"type": "done", "result": "An unexpected error occurred in the ReAct loop."}
+                return
 
-    return "Maximum number of iterations reached without a final answer."
+    yield {"type": "done", "result": "Maximum number of iterations reached without a final answer."}
 
 if __name__ == "__main__":
     print("--- Running Example 1: Advanced Adaptive Tutoring Loop for Linear Algebra ---")
     react_loop(
-        initial_state="The student is currently learning about matrix inversion and is working on a 2x2 matrix problem.",
-        max_iterations=5,
-        time_constraint_minutes=5
+        init_state="The student is currently learning about matrix inversion and is working on a 2x2 matrix problem.",
+        max_it=5,
+        time_constr=5
     )    
     
     print("\n" + "="*80 + "\n")
     print("--- Running Example 2: Demonstrating KAG ---")
     react_loop(
-        initial_state="The student just asked: 'What is affine geometry?'",
-        max_iterations=1,
-        time_constraint_minutes=1
+        init_state="The student just asked: 'What is affine geometry?'",
+        max_it=1,
+        time_constr=1
     )
\ No newline at end of file
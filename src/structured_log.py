@@ -0,0 +1,98 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# "json" writes one JSON object per line; "text" is easier to read in a terminal.
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+
+_ROOT = "tutor"
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, fmt=LOG_FORMAT):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record):
+        fields = getattr(record, "fields", None) or {}
+        if self.fmt == "text":
+            extra = " ".join(f"{key}={value}" for key, value in fields.items())
+            return f"{self.formatTime(record)} {record.levelname:<7} {record.name} {record.getMessage()} {extra}".rstrip()
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        entry.update(fields)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def _setup():
+    """
+    Routes the "tutor" logger hierarchy through a QueueHandler: callers only
+    enqueue the record and a listener thread formats and writes it, so
+    logging never blocks a request on stderr.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    with _setup_lock:
+        if _listener is not None:
+            return
+        records = queue.SimpleQueue()
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(StructuredFormatter())
+        root = logging.getLogger(_ROOT)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(QueueHandler(records))
+        root.propagate = False
+        _listener = QueueListener(records, handler)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+class StructuredLogger:
+    """
+    Thin wrapper over a stdlib logger that takes structured fields as
+    keyword arguments: log.info("tool finished", tool=name, ms=12.5).
+    Disabled levels return before anything is formatted.
+    """
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def isEnabledFor(self, level):
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level, msg, fields, exc_info=False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, msg, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields)
+
+    def exception(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields, exc_info=True)
+
+
+def get_logger(name):
+    _setup()
+    return StructuredLogger(logging.getLogger(f"{_ROOT}.{name}"))
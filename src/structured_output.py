@@ -0,0 +1,191 @@
+import json
+import re
+
+# Outside a string only brackets and quotes matter; inside one, only quotes
+# and backslashes. Scanning jumps between these with a regex instead of
+# looking at every character.
+_OUTSIDE_RE = re.compile(r'[{}\[\]"]')
+_INSIDE_RE = re.compile(r'["\\]')
+_OPENERS = {"{": "}", "[": "]"}
+
+
+class JSONExtractor:
+    """
+    Finds the first balanced, parseable JSON value that starts with one of
+    `openers` in text fed chunk by chunk, e.g. a model answer that wraps the
+    object in prose or ``` fences. feed() returns the decoded value as soon
+    as its closing bracket arrives, so a streaming caller can stop reading
+    there. Brackets inside strings (including escaped quotes) are ignored.
+    A candidate that balances but does not parse (e.g. "{see below}") is
+    skipped and the search resumes after its opening bracket.
+    """
+
+    def __init__(self, openers="{"):
+        self.openers = openers
+        self.value = None
+        self.done = False
+        self._text = ""
+        self._pos = 0        # next index of _text to scan
+        self._start = -1     # index of the candidate's opening bracket
+        self._stack = []
+        self._in_string = False
+
+    def feed(self, chunk):
+        if self.done:
+            return self.value
+        if self._start == -1:
+            # Nothing open yet, so only the unscanned tail is worth keeping.
+            self._text = self._text[self._pos:] + chunk
+            self._pos = 0
+        else:
+            self._text += chunk
+        while self._scan():
+            candidate = self._text[self._start:self._pos]
+            try:
+                self.value = json.loads(candidate)
+                self.done = True
+                return self.value
+            except ValueError:
+                self._pos = self._start + 1
+                self._start = -1
+        return None
+
+    def _scan(self):
+        # Returns True when a candidate ends at self._pos.
+        text = self._text
+        while True:
+            if self._start == -1:
+                starts = [i for i in (text.find(opener, self._pos) for opener in self.openers) if i != -1]
+                if not starts:
+                    self._pos = len(text)
+                    return False
+                self._start = min(starts)
+                self._stack = [_OPENERS[text[self._start]]]
+                self._in_string = False
+                self._pos = self._start + 1
+            match = (_INSIDE_RE if self._in_string else _OUTSIDE_RE).search(text, self._pos)
+            if match is None:
+                self._pos = len(text)
+                return False
+            char = match.group()
+            self._pos = match.end()
+            if self._in_string:
+                if char == "\\":
+                    if self._pos >= len(text):
+                        # The escaped character has not arrived yet.
+                        self._pos -= 1
+                        return False
+                    self._pos += 1
+                else:
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _OPENERS:
+                self._stack.append(_OPENERS[char])
+            elif char == self._stack[-1]:
+                self._stack.pop()
+                if not self._stack:
+                    return True
+            else:
+                # Mismatched bracket: not JSON, try the next opener.
+                self._pos = self._start + 1
+                self._start = -1
+
+
+class Field:
+    """
+    Expected key of a JSON object: its type, the default used when it is
+    missing or cannot be coerced, and optional bounds or allowed values.
+    `aliases` are other key names the model may use for it; `lower`
+    lowercases string values.
+    """
+
+    def __init__(self, type, default, minimum=None, maximum=None, choices=None, aliases=(), lower=False):
+        self.type = type
+        self.lower = lower
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = choices
+        self.aliases = aliases
+
+    def coerce(self, value):
+        try:
+            if self.type is int:
+                if isinstance(value, str):
+                    # "75", "75%", "75/100", "about 75"
+                    match = re.search(r"-?\d+(?:\.\d+)?", value)
+                    if match is None:
+                        return self.default
+                    value = match.group()
+                value = int(round(float(value)))
+            elif self.type is float:
+                value = float(value.rstrip("%") if isinstance(value, str) else value)
+            elif self.type is str:
+                if value is None:
+                    return self.default
+                value = json.dumps(value) if isinstance(value, (dict, list)) else str(value).strip()
+                if self.lower:
+                    value = value.lower()
+            else:
+                value = self.type(value)
+        except (TypeError, ValueError):
+            return self.default
+        if self.minimum is not None and value < self.minimum:
+            value = self.minimum
+        if self.maximum is not None and value > self.maximum:
+            value = self.maximum
+        if self.choices is not None and value not in self.choices:
+            return self.default
+        return value
+
+
+def _key(name):
+    return re.sub(r"[\s\-]+", "_", str(name).strip().lower())
+
+
+def coerce(obj, schema):
+    """
+    Returns {name: value} for every field of `schema` ({name: Field}), taking
+    values from `obj` by name or alias (case, spaces and dashes ignored) and
+    falling back to each field's default. Extra keys are dropped.
+    """
+    if not isinstance(obj, dict):
+        obj = {}
+    lookup = {_key(key): value for key, value in obj.items()}
+    result = {}
+    for name, field in schema.items():
+        for key in (name, *field.aliases):
+            if _key(key) in lookup:
+                result[name] = field.coerce(lookup[_key(key)])
+                break
+        else:
+            result[name] = field.default
+    return result
+
+
+def extract_json(text, schema=None, openers="{"):
+    """First JSON value in `text` (coerced to `schema` if given), or None."""
+    value = JSONExtractor(openers).feed(text)
+    if value is None:
+        return None
+    return coerce(value, schema) if schema is not None else value
+
+
+def extract_json_from_stream(chunks, schema=None, openers="{"):
+    """
+    Like extract_json() for an iterable of text chunks, e.g. the deltas of
+    WatsonxClient.chat_stream(). Stops consuming as soon as the value is
+    complete and closes the stream so its connection is released.
+    """
+    extractor = JSONExtractor(openers)
+    try:
+        for chunk in chunks:
+            if extractor.feed(chunk) is not None:
+                break
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    if extractor.value is None:
+        return None
+    return coerce(extractor.value, schema) if schema is not None else extractor.value
@@ -0,0 +1,218 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from metrics import counter
+
+TOOL_CACHE_ENABLED = os.environ.get("TOOL_CACHE_ENABLED", "1") != "0"
+
+CACHE_REQUESTS = counter("tool_cache_requests", "Memoized tool calls by result (hit, miss).", ("tool", "result"))
+CACHE_INVALIDATIONS = counter("tool_cache_invalidations", "Cached results dropped because another tool changed their state.", ("tool",))
+
+
+def normalize_text_args(*args):
+    """Cache key that ignores case, surrounding quotes and runs of whitespace in string arguments."""
+    return tuple(" ".join(arg.strip("'\" ").lower().split()) if isinstance(arg, str) else arg for arg in args)
+
+
+class CachePolicy:
+    """
+    How one tool's results are memoized.
+
+    scope="global" is for pure tools whose result depends only on their
+    arguments. scope="session" is for stateful tools: the key also includes
+    the current session, and calls to any tool in `invalidated_by` drop that
+    session's entries. Entries expire after `ttl` seconds either way, which
+    bounds staleness when the state changes somewhere the cache cannot see
+    (e.g. another worker sharing the SQLite session store). `key` maps the
+    call's arguments to the cache key.
+    """
+
+    def __init__(self, ttl, max_entries=256, scope="global", invalidated_by=(), key=None):
+        if scope not in ("global", "session"):
+            raise ValueError(f"Unknown cache scope '{scope}'")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.scope = scope
+        self.invalidated_by = tuple(invalidated_by)
+        self.key = key
+
+
+class _Stats:
+    __slots__ = ("hits", "misses", "expired", "invalidated")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidated = 0
+
+
+class ToolCache:
+    """
+    Memoization layer for a tool registry (name -> function). install()
+    wraps the registry's entries in place: tools with a policy return a
+    stored result for a repeated call, and tools named in some policy's
+    `invalidated_by` clear the entries they make stale once they return.
+
+    Wrapped tools keep an `awaitable` variant (see
+    tool_executor.simulated_latency), so a hit through
+    ToolExecutor.run_async completes on the event loop without a thread.
+    Failed calls are not cached. `scope_key` returns the current session.
+    """
+
+    def __init__(self, policies, scope_key=lambda: None, enabled=TOOL_CACHE_ENABLED, clock=time.monotonic):
+        self.policies = dict(policies)
+        self.scope_key = scope_key
+        self.enabled = enabled
+        self.clock = clock
+        self._entries = {name: OrderedDict() for name in self.policies}
+        self._stats = {name: _Stats() for name in self.policies}
+        self._lock = threading.Lock()
+        self._invalidates = {}
+        for name, policy in self.policies.items():
+            for writer in policy.invalidated_by:
+                self._invalidates.setdefault(writer, []).append(name)
+
+    def install(self, tools):
+        if not self.enabled:
+            return tools
+        for name, func in list(tools.items()):
+            if name in self.policies:
+                tools[name] = self._memoized(name, func)
+            elif name in self._invalidates:
+                tools[name] = self._invalidating(name, func)
+        return tools
+
+    def _key(self, name, args):
+        policy = self.policies[name]
+        key = policy.key(*args) if policy.key is not None else args
+        if policy.scope == "session":
+            key = (self.scope_key(), key)
+        try:
+            hash(key)
+        except TypeError:
+            return None  # unhashable arguments are never cached
+        return key
+
+    def _get(self, name, key):
+        with self._lock:
+            entries = self._entries[name]
+            entry = entries.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires <= self.clock():
+                del entries[key]
+                self._stats[name].expired += 1
+                return False, None
+            entries.move_to_end(key)
+            self._stats[name].hits += 1
+        CACHE_REQUESTS.inc(tool=name, result="hit")
+        return True, value
+
+    def _put(self, name, key, value):
+        policy = self.policies[name]
+        with self._lock:
+            entries = self._entries[name]
+            entries[key] = (self.clock() + policy.ttl, value)
+            entries.move_to_end(key)
+            while len(entries) > policy.max_entries:
+                entries.popitem(last=False)
+            self._stats[name].misses += 1
+        CACHE_REQUESTS.inc(tool=name, result="miss")
+
+    def _memoized(self, name, func):
+        @functools.wraps(func)
+        def tool(*args):
+            key = self._key(name, args)
+            if key is None:
+                return func(*args)
+            hit, value = self._get(name, key)
+            if hit:
+                return value
+            value = func(*args)
+            self._put(name, key, value)
+            return value
+
+        inner = getattr(func, "awaitable", None)
+
+        async def stored(value):
+            return value
+
+        async def compute(key, coroutine):
+            value = await coroutine
+            self._put(name, key, value)
+            return value
+
+        def awaitable(*args):
+            key = self._key(name, args)
+            if key is not None:
+                hit, value = self._get(name, key)
+                if hit:
+                    return stored(value)
+            coroutine = inner(*args) if inner is not None else None
+            if coroutine is None or key is None:
+                return coroutine
+            return compute(key, coroutine)
+
+        tool.awaitable = awaitable
+        return tool
+
+    def _invalidating(self, name, func):
+        @functools.wraps(func)
+        def tool(*args):
+            result = func(*args)
+            self.invalidate(self._invalidates[name], self.scope_key())
+            return result
+
+        inner = getattr(func, "awaitable", None)
+        if inner is not None:
+            async def invalidate_after(coroutine):
+                result = await coroutine
+                self.invalidate(self._invalidates[name], self.scope_key())
+                return result
+
+            def awaitable(*args):
+                coroutine = inner(*args)
+                return invalidate_after(coroutine) if coroutine is not None else None
+
+            tool.awaitable = awaitable
+        return tool
+
+    def invalidate(self, names, scope=None):
+        """Drops the cached results of `names`; for session-scoped tools, only those of `scope`."""
+        for name in names:
+            policy = self.policies[name]
+            with self._lock:
+                entries = self._entries[name]
+                if policy.scope == "session":
+                    stale = [key for key in entries if key[0] == scope]
+                else:
+                    stale = list(entries)
+                for key in stale:
+                    del entries[key]
+                self._stats[name].invalidated += len(stale)
+            if stale:
+                CACHE_INVALIDATIONS.inc(len(stale), tool=name)
+
+    def clear(self):
+        with self._lock:
+            for entries in self._entries.values():
+                entries.clear()
+
+    def stats(self):
+        with self._lock:
+            report = {}
+            for name, stats in self._stats.items():
+                lookups = stats.hits + stats.misses
+                report[name] = {
+                    "entries": len(self._entries[name]),
+                    "hits": stats.hits,
+                    "misses": stats.misses,
+                    "hit_ratio": round(stats.hits / lookups, 3) if lookups else 0.0,
+                    "expired": stats.expired,
+                    "invalidated": stats.invalidated
+                }
+            return {"enabled": self.enabled, "tools": report}
@@ -0,0 +1,160 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from metrics import counter, histogram, span
+
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("TOOL_TIMEOUT_SECONDS", "5"))
+TOOL_MAX_WORKERS = int(os.environ.get("TOOL_MAX_WORKERS", "8"))
+
+TOOL_SECONDS = histogram("tool_duration_seconds", "Time a tool spends running on the executor.", ("tool", "outcome"))
+TOOL_QUEUE_SECONDS = histogram("tool_queue_seconds", "Time a tool call waits for a free executor thread.", ("tool",))
+TOOL_TIMEOUTS = counter("tool_timeouts", "Tool calls that missed their deadline.", ("tool",))
+
+
+def simulated_latency(seconds, when=None):
+    """
+    Adds the latency of the slow service a mock tool stands in for. Called
+    normally the tool sleeps `seconds` before returning. It also gets an
+    `awaitable(*args)` variant that awaits the delay instead, so
+    ToolExecutor.run_async does not hold a thread for it. With `when`, only
+    calls for which when(*args) is true are simulated; the others do real
+    work and go to the thread pool.
+    """
+    def wrap(func):
+        @functools.wraps(func)
+        def tool(*args):
+            result = func(*args)
+            if when is None or when(*args):
+                time.sleep(seconds)
+            return result
+
+        async def simulated(*args):
+            result = func(*args)
+            await asyncio.sleep(seconds)
+            return result
+
+        tool.awaitable = lambda *args: simulated(*args) if when is None or when(*args) else None
+        return tool
+    return wrap
+
+
+class ToolExecutor:
+    """
+    Runs entries of a tool registry (name -> function) on a shared thread
+    pool so independent tools overlap: a batch takes as long as its slowest
+    tool, not the sum of all of them.
+
+    Every call has a timeout, from `timeouts[name]` or `default_timeout`.
+    A call that misses its deadline is cancelled if it has not started yet;
+    one that is already running cannot be interrupted, so its result is
+    simply discarded when it finishes. Calls run in a copy of the caller's
+    context, so context variables such as the current session are visible
+    to the tool.
+
+    run_async() and run_many_async() are the event-loop counterparts. A
+    tool whose `awaitable(*args)` returns a coroutine runs on the calling
+    loop; any other tool runs on the pool. Timeouts apply the same way, but
+    a coroutine that times out is cancelled rather than left running.
+    """
+
+    def __init__(self, tools, max_workers=TOOL_MAX_WORKERS, default_timeout=TOOL_TIMEOUT_SECONDS, timeouts=None):
+        self.tools = tools
+        self.default_timeout = default_timeout
+        self.timeouts = dict(timeouts or {})
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def timeout_for(self, name):
+        return self.timeouts.get(name, self.default_timeout)
+
+    def submit(self, name, *args):
+        if name not in self.tools:
+            raise KeyError(f"Unknown tool '{name}'")
+        context = contextvars.copy_context()
+        return self._pool.submit(context.run, self._call, name, time.perf_counter(), *args)
+
+    def _call(self, name, submitted, *args):
+        TOOL_QUEUE_SECONDS.observe(time.perf_counter() - submitted, tool=name)
+        with span("tool", TOOL_SECONDS, tool=name):
+            return self.tools[name](*args)
+
+    def run(self, name, *args, timeout=None):
+        """Runs one tool and returns its result; raises TimeoutError if it misses its deadline."""
+        future = self.submit(name, *args)
+        try:
+            return future.result(timeout=timeout if timeout is not None else self.timeout_for(name))
+        except FutureTimeout:
+            future.cancel()
+            TOOL_TIMEOUTS.inc(tool=name)
+            raise TimeoutError(f"Tool '{name}' timed out")
+
+    def run_many(self, calls, timeout=None):
+        """
+        Runs `calls` ({key: (tool_name, args)}) concurrently and returns
+        (results, failures): results maps each key that finished in time to
+        its return value, failures maps the rest to "timeout" or the error
+        message. Each call is measured against its own deadline from the
+        moment the batch starts; `timeout` overrides the per-tool ones.
+        """
+        start = time.monotonic()
+        futures = {key: self.submit(name, *args) for key, (name, args) in calls.items()}
+        deadlines = {
+            key: start + (timeout if timeout is not None else self.timeout_for(name))
+            for key, (name, _) in calls.items()
+        }
+        results, failures = {}, {}
+        for key in sorted(futures, key=deadlines.get):
+            future = futures[key]
+            try:
+                results[key] = future.result(timeout=max(0.0, deadlines[key] - time.monotonic()))
+            except FutureTimeout:
+                future.cancel()
+                TOOL_TIMEOUTS.inc(tool=calls[key][0])
+                failures[key] = "timeout"
+            except Exception as e:
+                failures[key] = f"{type(e).__name__}: {e}"
+        return results, failures
+
+    async def _call_async(self, name, coroutine):
+        with span("tool", TOOL_SECONDS, tool=name):
+            return await coroutine
+
+    async def run_async(self, name, *args, timeout=None):
+        """Awaitable run(): raises TimeoutError if the tool misses its deadline."""
+        if name not in self.tools:
+            raise KeyError(f"Unknown tool '{name}'")
+        awaitable = getattr(self.tools[name], "awaitable", None)
+        coroutine = awaitable(*args) if awaitable is not None else None
+        if coroutine is not None:
+            call = self._call_async(name, coroutine)
+        else:
+            call = asyncio.wrap_future(self.submit(name, *args))
+        try:
+            return await asyncio.wait_for(call, timeout if timeout is not None else self.timeout_for(name))
+        except asyncio.TimeoutError:
+            TOOL_TIMEOUTS.inc(tool=name)
+            raise TimeoutError(f"Tool '{name}' timed out")
+
+    async def run_many_async(self, calls, timeout=None):
+        """Awaitable run_many(), with the same (results, failures) return value."""
+        keys = list(calls)
+        outcomes = await asyncio.gather(
+            *(self.run_async(name, *args, timeout=timeout) for name, args in calls.values()),
+            return_exceptions=True
+        )
+        results, failures = {}, {}
+        for key, outcome in zip(keys, outcomes):
+            if isinstance(outcome, TimeoutError):
+                failures[key] = "timeout"
+            elif isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            elif isinstance(outcome, BaseException):
+                failures[key] = f"{type(outcome).__name__}: {outcome}"
+            else:
+                results[key] = outcome
+        return results, failures
+
+    def close(self, wait=False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,298 @@
+import glob
+import importlib.util
+import os
+import threading
+import time
+import wave
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+# 0 runs one resident model in this process instead of a worker pool.
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Whisper works on 30 s windows; chunks overlap so words cut at a boundary
+# are heard whole by one of the two chunks.
+CHUNK_SECONDS = float(os.environ.get("TRANSCRIBE_CHUNK_SECONDS", "30"))
+OVERLAP_SECONDS = float(os.environ.get("TRANSCRIBE_OVERLAP_SECONDS", "2"))
+# Start the workers and load the model when the app starts rather than
+# inside the first transcription.
+TRANSCRIBE_PRELOAD = os.environ.get("TRANSCRIBE_PRELOAD", "1") == "1"
+# Recent submit_file() results kept so a later call for the same recording
+# picks up a transcription that was still running.
+RECENT_FILES = 64
+SAMPLE_RATE = 16000
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".m4a", ".ogg")
+
+# Loaded once per worker process (or once in-process) by _init_worker.
+_model = None
+
+
+def _init_worker(model_name):
+    global _model
+    import whisper
+    _model = whisper.load_model(model_name)
+
+
+def _model_loaded():
+    return _model is not None
+
+
+def whisper_available():
+    try:
+        return importlib.util.find_spec("whisper") is not None
+    except ValueError:
+        return False  # a module object without a spec, e.g. a test stand-in
+
+
+def _transcribe_chunk(audio):
+    # fp16 is only supported on GPU; on CPU whisper would warn and fall back.
+    result = _model.transcribe(audio, fp16=False, condition_on_previous_text=False)
+    segments = [(segment["start"], segment["end"], segment["text"]) for segment in result.get("segments", [])]
+    if not segments and result.get("text", "").strip():
+        segments = [(0.0, len(audio) / SAMPLE_RATE, result["text"])]
+    return segments
+
+
+def _pcm_to_float(raw, sample_width, channels):
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        # Widen 24-bit little-endian samples to int32 by left-aligning them.
+        as_bytes = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((len(as_bytes), 4), dtype=np.uint8)
+        padded[:, 1:] = as_bytes
+        samples = padded.view("<i4").ravel().astype(np.float32) / 2147483648.0
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported WAV sample width: {sample_width} bytes")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def _resample(samples, source_rate, target_rate=SAMPLE_RATE):
+    if source_rate == target_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+    n_out = int(round(len(samples) * target_rate / source_rate))
+    positions = np.arange(n_out, dtype=np.float64) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def iter_audio_chunks(path, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS):
+    """
+    Yields (start_seconds, samples) windows of `chunk_seconds`, each
+    overlapping the previous one by `overlap_seconds`, as 16 kHz mono
+    float32. PCM WAV files are read incrementally, so the first chunk is
+    ready without decoding the whole recording; other formats are decoded
+    by whisper (ffmpeg) up front and then windowed.
+    """
+    if path.lower().endswith(".wav"):
+        try:
+            wav = wave.open(path, "rb")
+        except (wave.Error, EOFError):
+            wav = None  # e.g. float WAV, which the wave module cannot read
+        if wav is not None:
+            with wav:
+                rate, channels, width = wav.getframerate(), wav.getnchannels(), wav.getsampwidth()
+                chunk_frames = int(chunk_seconds * rate)
+                step = chunk_frames - int(overlap_seconds * rate)
+                tail = np.zeros(0, dtype=np.float32)
+                position = 0
+                while True:
+                    need = chunk_frames - len(tail)
+                    samples = _pcm_to_float(wav.readframes(need), width, channels)
+                    if len(samples) == 0:
+                        return
+                    chunk = np.concatenate((tail, samples))
+                    yield position / rate, _resample(chunk, rate)
+                    if len(samples) < need:
+                        return
+                    tail = chunk[step:]
+                    position += step
+            return
+    import whisper
+    audio = whisper.load_audio(path)
+    chunk_frames = int(chunk_seconds * SAMPLE_RATE)
+    step = chunk_frames - int(overlap_seconds * SAMPLE_RATE)
+    for start in range(0, max(len(audio) - int(overlap_seconds * SAMPLE_RATE), 1), step):
+        yield start / SAMPLE_RATE, audio[start:start + chunk_frames]
+
+
+def expand_inputs(inputs):
+    """
+    Yields files as given and, for directories, the audio files inside them
+    (sorted). Lazy, so `inputs` may be a queue-fed iterator.
+    """
+    for item in inputs:
+        if os.path.isdir(item):
+            yield from sorted(
+                path for path in glob.glob(os.path.join(item, "*"))
+                if path.lower().endswith(AUDIO_EXTENSIONS)
+            )
+        else:
+            yield item
+
+
+class _FileState:
+    def __init__(self, path):
+        self.path = path
+        self.started = time.perf_counter()
+        self.submitted = 0
+        self.drained = 0
+        self.all_submitted = False
+        self.duration = 0.0
+        self.segments = []  # committed (start, end, text), absolute times
+        self.held = []      # segments in the overlap a later chunk may replace
+
+
+class TranscriptionService:
+    """
+    Whisper transcription with the model kept resident: each of `workers`
+    processes loads it once when the pool starts (workers=0 keeps a single
+    model in this process). Files are cut into overlapping chunks that are
+    transcribed in parallel, at most `max_pending` at a time, and stitched
+    back in order: in each overlap, segments starting before its midpoint
+    come from the earlier chunk and the rest from the later one.
+
+    `on_partial(path, text)` is called with each chunk's new text as soon as
+    it and every chunk before it are done, so long recordings produce text
+    long before they finish. Every result reports its real-time factor
+    (processing seconds per second of audio; below 1 is faster than real time).
+
+    submit_file() transcribes in the background and returns a Future, so a
+    caller with a deadline can wait briefly and come back for the text.
+    warm_up() starts the workers ahead of the first request.
+    """
+
+    def __init__(self, model_name=WHISPER_MODEL, workers=TRANSCRIBE_WORKERS,
+                 chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS, max_pending=None):
+        self.model_name = model_name
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.step_seconds = chunk_seconds - overlap_seconds
+        self.workers = max(workers, 1)
+        if workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_name,))
+        else:
+            # Whisper models are not safe to share between threads.
+            self._executor = ThreadPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(model_name,))
+        self.max_pending = max_pending or max(2, 2 * max(workers, 1))
+        self._files = ThreadPoolExecutor(max_workers=2, thread_name_prefix="transcribe-file")
+        self._recent = OrderedDict()  # (path, mtime_ns, size) -> Future
+        self._recent_lock = threading.Lock()
+
+    def warm_up(self):
+        """Starts every worker (each loads the model) without waiting; returns their futures."""
+        return [self._executor.submit(_model_loaded) for _ in range(self.workers)]
+
+    def submit_file(self, path):
+        """
+        Transcribes `path` in the background and returns a Future for the
+        result. Asking again for the same unchanged file returns the same
+        Future, running or done; a failed one is retried.
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._recent_lock:
+            future = self._recent.get(key)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self._recent.move_to_end(key)
+                return future
+            future = self._files.submit(self.transcribe_file, path)
+            self._recent[key] = future
+            while len(self._recent) > RECENT_FILES:
+                self._recent.popitem(last=False)
+            return future
+
+    def transcribe_file(self, path, on_partial=None):
+        return next(self.transcribe_many([path], on_partial))
+
+    def transcribe_many(self, paths, on_partial=None):
+        """Transcribes `paths` (files or directories) and yields one result per file, in order."""
+        pending = deque()  # (state, chunk_start, future)
+        for path in expand_inputs(paths):
+            state = _FileState(path)
+            for start, audio in iter_audio_chunks(path, self.chunk_seconds, self.overlap_seconds):
+                state.duration = start + len(audio) / SAMPLE_RATE
+                pending.append((state, start, self._executor.submit(_transcribe_chunk, audio)))
+                state.submitted += 1
+                while len(pending) >= self.max_pending:
+                    result = self._drain(pending, on_partial)
+                    if result is not None:
+                        yield result
+            state.all_submitted = True
+            if state.drained == state.submitted:
+                yield self._finish(state, on_partial)
+        while pending:
+            result = self._drain(pending, on_partial)
+            if result is not None:
+                yield result
+
+    def transcribe_queue(self, paths, results, on_partial=None):
+        """
+        Transcribes paths taken from the queue `paths` until it yields None,
+        putting each result on the queue `results`. Meant for a feeder thread.
+        Files are handled one after another as they arrive (their chunks still
+        run in parallel), so a result is never held back waiting for the next path.
+        """
+        while True:
+            path = paths.get()
+            if path is None:
+                return
+            for result in self.transcribe_many([path], on_partial):
+                results.put(result)
+
+    def _drain(self, pending, on_partial):
+        state, start, future = pending.popleft()
+        segments = [(start + s, start + e, text) for s, e, text in future.result()]
+        state.drained += 1
+        if start > 0:
+            # This chunk supersedes whatever the previous one heard past the midpoint.
+            lower = start + self.overlap_seconds / 2
+            segments = [segment for segment in segments if segment[0] >= lower]
+        upper = start + self.step_seconds + self.overlap_seconds / 2
+        committed = [segment for segment in segments if segment[0] < upper]
+        state.held = [segment for segment in segments if segment[0] >= upper]
+        state.segments.extend(committed)
+        if on_partial is not None and committed:
+            on_partial(state.path, "".join(text for _, _, text in committed).strip())
+        if state.all_submitted and state.drained == state.submitted:
+            return self._finish(state, on_partial)
+        return None
+
+    def _finish(self, state, on_partial):
+        # The last chunk has no successor, so its held segments are final.
+        state.segments.extend(state.held)
+        if on_partial is not None and state.held:
+            on_partial(state.path, "".join(text for _, _, text in state.held).strip())
+        elapsed = time.perf_counter() - state.started
+        return {
+            "path": state.path,
+            "text": "".join(text for _, _, text in state.segments).strip(),
+            "segments": [{"start": round(s, 2), "end": round(e, 2), "text": text.strip()} for s, e, text in state.segments],
+            "duration_seconds": round(state.duration, 2),
+            "elapsed_seconds": round(elapsed, 2),
+            "real_time_factor": round(elapsed / state.duration, 3) if state.duration else None,
+            "chunks": state.submitted
+        }
+
+    def close(self):
+        self._files.shutdown(wait=False, cancel_futures=True)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+def get_transcription_service():
+    """Returns the process-wide service, starting its workers (and loading the model) on first use."""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = TranscriptionService()
+    return _shared_service
@@ -0,0 +1,325 @@
+import json
+import os
+import threading
+import zlib
+import numpy as np
+from book_index import tokenize, write_atomic
+
+EMBEDDING_DIM = 256
+SEARCH_BLOCK_ROWS = 65536
+IVF_MIN_VECTORS = 20000
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000
+PQ_TRAIN_SAMPLE = 20000
+
+
+class HashingEncoder:
+    """
+    Deterministic bag-of-words encoder: unigrams and bigrams are hashed
+    (crc32, so identical across processes) into `dim` signed buckets and the
+    result is L2-normalised. Needs no model download, which makes it the
+    default for tests and offline runs; any object with `dim` and
+    `encode(texts) -> float32 array` can be used instead.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        return normalize(out)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    # Row-wise top-k of a (queries x candidates) score block, best first.
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+def _kmeans(data, n_clusters, iterations=KMEANS_ITERATIONS, spherical=True, seed=0, sample=KMEANS_SAMPLE):
+    """Lloyd's k-means; spherical=True clusters by cosine on unit vectors."""
+    rng = np.random.default_rng(seed)
+    if len(data) > sample:
+        data = data[rng.choice(len(data), sample, replace=False)]
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    n_clusters = min(n_clusters, len(data))
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        if spherical:
+            assign = np.argmax(data @ centroids.T, axis=1)
+        else:
+            assign = _nearest(data, centroids)
+        counts = np.bincount(assign, minlength=n_clusters)
+        # Per-cluster sums via sort + reduceat; much faster than np.add.at.
+        order = np.argsort(assign, kind="stable")
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[present]
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(data[order], starts, axis=0)
+        empty = counts == 0
+        counts[empty] = 1
+        centroids = sums / counts[:, None]
+        # Re-seed empty clusters from random points.
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        if spherical:
+            centroids = normalize(centroids)
+    return centroids
+
+
+def _nearest(data, centroids):
+    # argmin of squared Euclidean distance; the |x|^2 term is the same for every centroid.
+    return np.argmin((centroids * centroids).sum(1) - 2 * (data @ centroids.T), axis=1)
+
+
+class IVFPQIndex:
+    """
+    Inverted-file index over unit vectors: a spherical k-means coarse
+    quantiser splits the corpus into `n_lists` lists and a query only scans the
+    `nprobe` closest lists. With `pq_m` set, each vector's residual from its
+    list centroid is product-quantised (`pq_m` sub-spaces of 256 centroids);
+    candidates are scored from the codes with per-query lookup tables and only
+    the best `rerank * k` are rescored against the full vectors.
+    """
+
+    def __init__(self, n_lists=256, nprobe=16, pq_m=None, rerank=8):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.rerank = rerank
+        self.centroids = None
+        self.list_offsets = None
+        self.list_ids = None      # vector ids grouped by list
+        self.pq_codebooks = None
+        self.pq_codes = None      # codes in list order, aligned with list_ids
+        self.indexed = 0
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.centroids = _kmeans(vectors, self.n_lists)
+        assign = self._assign(vectors)
+        self.list_ids = np.argsort(assign, kind="stable").astype(np.int64)
+        self.list_offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(self.centroids)), out=self.list_offsets[1:])
+        if self.pq_m:
+            dim = vectors.shape[1]
+            if dim % self.pq_m:
+                raise ValueError(f"pq_m={self.pq_m} must divide the embedding dim {dim}")
+            sub = dim // self.pq_m
+            residuals = vectors[self.list_ids] - self.centroids[assign[self.list_ids]]
+            self.pq_codebooks = np.stack([
+                _kmeans(residuals[:, j * sub:(j + 1) * sub], 256, spherical=False, seed=j, sample=PQ_TRAIN_SAMPLE)
+                for j in range(self.pq_m)
+            ])
+            self.pq_codes = np.empty((len(vectors), self.pq_m), dtype=np.uint8)
+            for start in range(0, len(residuals), SEARCH_BLOCK_ROWS):
+                block = residuals[start:start + SEARCH_BLOCK_ROWS]
+                for j in range(self.pq_m):
+                    self.pq_codes[start:start + len(block), j] = _nearest(
+                        np.ascontiguousarray(block[:, j * sub:(j + 1) * sub]), self.pq_codebooks[j])
+        self.indexed = len(vectors)
+        return self
+
+    def _assign(self, vectors):
+        assign = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+            assign[start:start + SEARCH_BLOCK_ROWS] = np.argmax(
+                vectors[start:start + SEARCH_BLOCK_ROWS] @ self.centroids.T, axis=1)
+        return assign
+
+    def search(self, vectors, queries, k):
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        coarse = queries @ self.centroids.T
+        probes = _top_k(coarse, self.nprobe)
+        for row, query in enumerate(queries):
+            starts = self.list_offsets[probes[row]]
+            counts = self.list_offsets[probes[row] + 1] - starts
+            # Positions of the probed lists' members in list order.
+            positions = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts) + np.arange(counts.sum())
+            if self.pq_codes is not None:
+                sub = len(query) // self.pq_m
+                table = np.einsum("jcd,jd->jc", self.pq_codebooks, query.reshape(self.pq_m, sub))
+                approx = np.repeat(coarse[row, probes[row]], counts) + \
+                    table[np.arange(self.pq_m), self.pq_codes[positions]].sum(axis=1)
+                positions = positions[_top_k(approx[None, :], k * self.rerank)[0]]
+            cand = self.list_ids[positions]
+            # Vectors added after training are not in any list yet; scan them directly.
+            if len(vectors) > self.indexed:
+                cand = np.concatenate([cand, np.arange(self.indexed, len(vectors))])
+            if not len(cand):
+                continue
+            exact = np.asarray(vectors[cand]) @ query
+            best = _top_k(exact[None, :], k)[0]
+            ids[row, :len(best)] = cand[best]
+            scores[row, :len(best)] = exact[best]
+        return ids, scores
+
+    _ARRAYS = ("centroids", "list_offsets", "list_ids", "pq_codebooks", "pq_codes")
+
+    def save(self, directory):
+        for name in self._ARRAYS:
+            array = getattr(self, name)
+            if array is not None:
+                write_atomic(os.path.join(directory, f"ivf_{name}.npy"), lambda out: np.save(out, array))
+        meta = {"n_lists": self.n_lists, "nprobe": self.nprobe, "pq_m": self.pq_m,
+                "rerank": self.rerank, "indexed": self.indexed}
+        write_atomic(os.path.join(directory, "ivf.json"), lambda out: json.dump(meta, out), "w")
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, "ivf.json")) as src:
+            meta = json.load(src)
+        index = cls(meta["n_lists"], meta["nprobe"], meta["pq_m"], meta["rerank"])
+        index.indexed = meta["indexed"]
+        for name in cls._ARRAYS:
+            path = os.path.join(directory, f"ivf_{name}.npy")
+            if os.path.exists(path):
+                setattr(index, name, np.load(path, mmap_mode="r" if mmap else None))
+        return index
+
+
+class VectorIndex:
+    """
+    Dense passage store: keys, texts and a float32 matrix of unit embeddings.
+    search() answers a batch of queries with blocked matrix products (cosine
+    similarity == dot product on unit vectors). build_ann() adds an optional
+    IVF/PQ index that search(exact=False) uses instead of scanning everything.
+    """
+
+    def __init__(self, encoder=None):
+        self.encoder = encoder or HashingEncoder()
+        self.keys = []
+        self.texts = []
+        self._vectors = np.zeros((0, self.encoder.dim), dtype=np.float32)
+        self._size = 0
+        self.ann = None
+        self._lock = threading.RLock()
+
+    @property
+    def vectors(self):
+        return self._vectors[:self._size]
+
+    def add(self, keys, texts, vectors=None):
+        vectors = normalize(self.encoder.encode(texts) if vectors is None else vectors)
+        with self._lock:
+            needed = self._size + len(vectors)
+            if needed > len(self._vectors) or not self._vectors.flags.writeable:
+                # Grow geometrically; this also copies a memory-mapped matrix into RAM.
+                grown = np.zeros((max(needed, 2 * len(self._vectors), 64), vectors.shape[1]), dtype=np.float32)
+                grown[:self._size] = self._vectors[:self._size]
+                self._vectors = grown
+            self._vectors[self._size:needed] = vectors
+            self._size = needed
+            self.keys.extend(keys)
+            self.texts.extend(texts)
+
+    def __len__(self):
+        return self._size
+
+    def build_ann(self, n_lists=None, nprobe=None, pq_m=None):
+        n_lists = n_lists or max(int(np.sqrt(self._size)), 1)
+        nprobe = nprobe or max(n_lists // 16, 1)
+        self.ann = IVFPQIndex(n_lists, nprobe, pq_m).train(self.vectors)
+        return self.ann
+
+    def encode_queries(self, queries):
+        return normalize(self.encoder.encode(list(queries)))
+
+    def search(self, queries, k=5, exact=None):
+        """
+        Top-k cosine search for a batch of query strings (or pre-encoded
+        vectors). Returns (ids, scores), each of shape (len(queries), k);
+        missing results have id -1. Uses the ANN index unless exact=True or
+        none was built.
+        """
+        query_vectors = queries if isinstance(queries, np.ndarray) else self.encode_queries(queries)
+        with self._lock:
+            vectors = self.vectors
+            if self.ann is not None and not exact:
+                return self.ann.search(vectors, query_vectors, k)
+            k_eff = min(k, len(vectors))
+            best_ids = np.zeros((len(query_vectors), 0), dtype=np.int64)
+            best_scores = np.zeros((len(query_vectors), 0), dtype=np.float32)
+            for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+                block = query_vectors @ np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS]).T
+                top = _top_k(block, k_eff)
+                best_ids = np.concatenate([best_ids, top + start], axis=1)
+                best_scores = np.concatenate([best_scores, np.take_along_axis(block, top, axis=1)], axis=1)
+                keep = _top_k(best_scores, k_eff)
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            ids = np.full((len(query_vectors), k), -1, dtype=np.int64)
+            scores = np.full((len(query_vectors), k), -np.inf, dtype=np.float32)
+            ids[:, :k_eff] = best_ids
+            scores[:, :k_eff] = best_scores
+            return ids, scores
+
+    def search_with_recall(self, queries, k=5):
+        """ANN search plus recall@k of its ids against exact search."""
+        query_vectors = self.encode_queries(queries)
+        ids, scores = self.search(query_vectors, k)
+        if self.ann is None:
+            return ids, scores, 1.0
+        exact_ids, _ = self.search(query_vectors, k, exact=True)
+        return ids, scores, recall_at_k(ids, exact_ids)
+
+    def save(self, directory):
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            vectors = self.vectors
+            write_atomic(os.path.join(directory, "vectors.npy"), lambda out: np.save(out, vectors))
+            meta = {"dim": self.encoder.dim, "keys": self.keys, "texts": self.texts}
+            write_atomic(os.path.join(directory, "vectors.json"), lambda out: json.dump(meta, out), "w", encoding="utf-8")
+            if self.ann is not None:
+                self.ann.save(directory)
+
+    @classmethod
+    def load(cls, directory, encoder=None, mmap=True):
+        """Opens a saved store; with mmap=True the embedding matrix is memory-mapped."""
+        with open(os.path.join(directory, "vectors.json"), encoding="utf-8") as src:
+            meta = json.load(src)
+        index = cls(encoder or HashingEncoder(meta["dim"]))
+        index._vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r" if mmap else None)
+        index._size = len(index._vectors)
+        index.keys = meta["keys"]
+        index.texts = meta["texts"]
+        if os.path.exists(os.path.join(directory, "ivf.json")):
+            index.ann = IVFPQIndex.load(directory, mmap=mmap)
+        return index
+
+
+def recall_at_k(approx_ids, exact_ids):
+    """Mean fraction of the exact top-k ids that the approximate search returned."""
+    hits = total = 0
+    for approx, exact in zip(approx_ids, exact_ids):
+        exact = set(int(i) for i in exact if i >= 0)
+        hits += len(exact & set(int(i) for i in approx if i >= 0))
+        total += len(exact)
+    return hits / total if total else 1.0
+
+
+def build_vector_index(passages, encoder=None):
+    """Embeds a {key: text} mapping; an IVF index is added for large corpora."""
+    index = VectorIndex(encoder)
+    index.add(list(passages.keys()), list(passages.values()))
+    if len(index) >= IVF_MIN_VECTORS:
+        index.build_ann()
+    return index
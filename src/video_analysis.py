@@ -0,0 +1,244 @@
+import json
+import os
+import re
+import requests
+from watsonx_client import WATSONX_MODEL_ID_VISION, WATSONX_MODEL_ID_PARSING, get_message_content
+from structured_output import Field, coerce, extract_json, extract_json_from_stream
+from metrics import histogram, span
+from structured_log import get_logger
+
+# Stream the parsing answer and stop reading once the JSON object is complete.
+PARSING_USE_STREAM = os.environ.get("PARSING_USE_STREAM", "0") == "1"
+
+log = get_logger("video")
+STAGE_SECONDS = histogram("video_stage_duration_seconds", "Frame analysis time per stage (vision, parsing).", ("stage", "outcome"))
+JSON_SECONDS = histogram("json_extract_duration_seconds", "Time spent pulling JSON out of model answers.", ("kind", "outcome"))
+
+MOOD_SCHEMA = {
+    "mood": Field(str, "unknown", aliases=("primary_mood", "emotion"), lower=True),
+    "concentration_level": Field(int, 0, minimum=0, maximum=100, aliases=("concentration", "concentration_score"))
+}
+# Last resort for answers with no JSON at all, e.g. "Mood: focused, Concentration: 80."
+_MOOD_LABEL_RE = re.compile(r"mood\W+([a-z]+)", re.IGNORECASE)
+_CONCENTRATION_LABEL_RE = re.compile(r"concentration(?:[ _]level)?\W+(\d+)", re.IGNORECASE)
+
+VISION_PROMPT_DESC = "Describe the person's facial expression and body language, focusing on signs of mood, engagement, and concentration."
+
+PARSING_PROMPT_TEMPLATE = """
+        Analyze the following description of a person's mood, engagement, and concentration.
+        Extract the primary mood (e.g., focused, confused, frustrated, bored, engaged, neutral) and estimate their concentration level as an integer from 0 to 100.
+        Return the output as a JSON object with two keys: "mood" (string) and "concentration_level" (integer).
+        If a value cannot be confidently extracted, use "unknown" for mood and 0 for concentration_level.
+
+        Description: "{description}"
+        """
+
+BATCH_PARSING_PROMPT_TEMPLATE = """
+        Analyze each of the following numbered descriptions of a person's mood, engagement, and concentration.
+        For each one, extract the primary mood (e.g., focused, confused, frustrated, bored, engaged, neutral) and estimate the concentration level as an integer from 0 to 100.
+        Return only a JSON array with one object per description, in the same order, each with three keys: "index" (integer), "mood" (string) and "concentration_level" (integer).
+        If a value cannot be confidently extracted, use "unknown" for mood and 0 for concentration_level.
+
+{descriptions}
+        """
+
+
+def unknown_mood(reason):
+    """
+    The observation used when no mood could be read. "error" marks it as a
+    fallback rather than a reading, so it is not cached for similar frames.
+    """
+    return {
+        "modality": "video",
+        "mood": "unknown",
+        "concentration_level": 0,
+        "error": reason
+    }
+
+
+def build_vision_payload(img_url, project_id):
+    return {
+        "model_id": WATSONX_MODEL_ID_VISION,
+        "messages": [
+            {
+                "role" : "user",
+                "content" : [
+                    {
+                        "type": "text",
+                        "text": VISION_PROMPT_DESC
+                    },
+                    {
+                        "type" : "image_url",
+                        "image_url" : {
+                            "url" : img_url
+                        }
+                    }
+                ]
+            }
+        ],
+        "project_id" : project_id,
+        "frequency_penalty": 0,
+        "max_tokens": 2000,
+        "presence_penalty": 0,
+        "temperature": 0,
+        "top_p": 1
+    }
+
+
+def build_parsing_payload(description, project_id):
+    return {
+        "model_id": WATSONX_MODEL_ID_PARSING, # Using the smaller LLM for parsing
+        "messages": [
+            {
+                "role": "user",
+                "content": PARSING_PROMPT_TEMPLATE.format(description=description)
+            }
+        ],
+        "project_id": project_id,
+        "decoding_method": "greedy",
+        "max_new_tokens": 100,
+        "temperature": 0.1
+    }
+
+
+def build_batch_parsing_payload(descriptions, project_id):
+    numbered = "\n".join(f'        {i}. "{description}"' for i, description in enumerate(descriptions))
+    return {
+        "model_id": WATSONX_MODEL_ID_PARSING,
+        "messages": [
+            {
+                "role": "user",
+                "content": BATCH_PARSING_PROMPT_TEMPLATE.format(descriptions=numbered)
+            }
+        ],
+        "project_id": project_id,
+        "decoding_method": "greedy",
+        # Roughly what one {"index", "mood", "concentration_level"} object needs.
+        "max_new_tokens": 40 * len(descriptions) + 20,
+        "temperature": 0.1
+    }
+
+
+def describe_frame(client, img_url, project_id):
+    """
+    Vision stage: asks the vision model to describe the frame.
+    Raises requests.exceptions.RequestException if the call fails.
+    """
+    with span("video.vision", STAGE_SECONDS, stage="vision"):
+        watsonx_vision_result = client.chat(build_vision_payload(img_url, project_id))
+    vision_desc_text = get_message_content(watsonx_vision_result)
+    if vision_desc_text is None:
+        log.warning("Vision model response structure unexpected", response=json.dumps(watsonx_vision_result))
+        return "Vision model did not return valid content."
+    return vision_desc_text
+
+
+def parse_mood_response(parsed_content_str):
+    """
+    Pulls {mood, concentration_level} out of the parsing model's answer: the
+    first JSON object anywhere in it (prose and code fences are skipped),
+    coerced to MOOD_SCHEMA, or else "Mood: ..., Concentration: ..." labels.
+    """
+    with span("json.mood", JSON_SECONDS, kind="mood"):
+        parsed = extract_json(parsed_content_str, MOOD_SCHEMA)
+    if parsed is None:
+        log.warning("No JSON object in LLM response", response=parsed_content_str)
+        mood_match = _MOOD_LABEL_RE.search(parsed_content_str)
+        concentration_match = _CONCENTRATION_LABEL_RE.search(parsed_content_str)
+        if not mood_match and not concentration_match:
+            return unknown_mood("no mood in parsing answer")
+        parsed = coerce({
+            "mood": mood_match.group(1) if mood_match else None,
+            "concentration_level": concentration_match.group(1) if concentration_match else None
+        }, MOOD_SCHEMA)
+    return {
+        "modality": "video",
+        "mood": parsed["mood"],
+        "concentration_level": parsed["concentration_level"]
+    }
+
+
+def extract_mood(client, description, project_id):
+    """
+    Parsing stage: turns a vision description into {mood, concentration_level}.
+    Failures degrade to "unknown"/0 rather than raising.
+    """
+    try:
+        with span("video.parse", STAGE_SECONDS, stage="parsing"):
+            return _extract_mood(client, description, project_id)
+    except requests.exceptions.RequestException as req_err:
+        log.error("Watsonx LLM (parsing) API request failed", error=str(req_err))
+        return unknown_mood(f"parsing request failed: {req_err}")
+    except Exception as e:
+        log.exception("An unexpected error occurred during parsing LLM call", error=str(e))
+        return unknown_mood(f"parsing failed: {e}")
+
+
+def _extract_mood(client, description, project_id):
+    if PARSING_USE_STREAM:
+        parsed = extract_json_from_stream(client.chat_stream(build_parsing_payload(description, project_id)), MOOD_SCHEMA)
+        if parsed is not None:
+            return dict(parsed, modality="video")
+        log.warning("Parsing LLM stream ended without a JSON object")
+        return parse_mood_response("")
+    watsonx_parsing_result = client.chat(build_parsing_payload(description, project_id))
+    parsed_content_str = get_message_content(watsonx_parsing_result)
+    if parsed_content_str is not None:
+        return parse_mood_response(parsed_content_str)
+    log.warning("Parsing LLM did not return valid content", response=json.dumps(watsonx_parsing_result))
+    return unknown_mood("parsing model returned no content")
+
+
+def parse_batch_mood_response(parsed_content_str, count):
+    """
+    Maps a batch parsing answer back to its descriptions. Returns a list of
+    `count` observations, with None for every index the answer did not cover.
+    """
+    observations = [None] * count
+    with span("json.mood_batch", JSON_SECONDS, kind="mood_batch"):
+        parsed_items = extract_json(parsed_content_str, openers="[")
+    if not isinstance(parsed_items, list):
+        log.warning("No JSON array in batch LLM response", response=parsed_content_str)
+        return observations
+    for position, item in enumerate(parsed_items):
+        if not isinstance(item, dict):
+            continue
+        index = Field(int, position).coerce(item.get("index", position))
+        if 0 <= index < count and observations[index] is None:
+            observations[index] = dict(coerce(item, MOOD_SCHEMA), modality="video")
+    return observations
+
+
+def extract_moods(client, descriptions, project_id, executor=None, on_fallback=None):
+    """
+    Batched parsing stage: one parsing call for several descriptions. A
+    single description uses the regular prompt; descriptions the batch
+    answer leaves out are retried with extract_mood(), concurrently on
+    `executor` if given, and their number is passed to `on_fallback`. If
+    the batch call itself fails, every description degrades to "unknown"/0
+    rather than turning one failed request into one per description.
+    """
+    if len(descriptions) == 1:
+        return [extract_mood(client, descriptions[0], project_id)]
+    observations = [None] * len(descriptions)
+    try:
+        with span("video.parse_batch", STAGE_SECONDS, stage="parsing_batch"):
+            watsonx_parsing_result = client.chat(build_batch_parsing_payload(descriptions, project_id))
+        parsed_content_str = get_message_content(watsonx_parsing_result)
+        if parsed_content_str is not None:
+            observations = parse_batch_mood_response(parsed_content_str, len(descriptions))
+        else:
+            log.warning("Parsing LLM did not return valid content for the batch", size=len(descriptions))
+    except requests.exceptions.RequestException as req_err:
+        log.error("Watsonx LLM (batch parsing) API request failed", error=str(req_err), size=len(descriptions))
+        return [unknown_mood(f"batch parsing request failed: {req_err}") for _ in descriptions]
+    missing = [i for i, observation in enumerate(observations) if observation is None]
+    if missing:
+        log.warning("Batch parsing answer left descriptions out; parsing them one by one", missing=len(missing), size=len(descriptions))
+        if on_fallback is not None:
+            on_fallback(len(missing))
+        def parse_one(i):
+            return extract_mood(client, descriptions[i], project_id)
+        for i, observation in zip(missing, (executor.map if executor is not None else map)(parse_one, missing)):
+            observations[i] = observation
+    return observations
@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import BYTES_BUCKETS, TOKEN_BUCKETS, counter, histogram, span
+
+# The endpoint can be pointed at a local stub server for offline testing.
+WATSON_API_URL = os.environ.get(
+    "WATSONX_API_URL",
+    "https://us-south.ml.cloud.ibm.com/ml/v1/text/chat?version=2023-05-29"
+)
+# Server-Sent Events variant of the chat endpoint, used for token streaming.
+WATSON_STREAM_URL = os.environ.get(
+    "WATSONX_STREAM_URL",
+    WATSON_API_URL.replace("/text/chat", "/text/chat_stream", 1)
+)
+WATSON_MODEL_ID = "meta-llama/llama-3-2-11b-vision-instruct"
+WATSONX_MODEL_ID_TEXT = "meta-llama/llama-3-3-70b-instruct"
+WATSONX_MODEL_ID_VISION = "meta-llama/llama-3-2-11b-vision-instruct"
+WATSONX_MODEL_ID_PARSING = "meta-llama/llama-3-8b-instruct"
+
+POOL_MAXSIZE = int(os.environ.get("WATSONX_POOL_MAXSIZE", "16"))
+CONNECT_TIMEOUT = float(os.environ.get("WATSONX_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("WATSONX_READ_TIMEOUT", "60"))
+MAX_RETRIES = int(os.environ.get("WATSONX_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.environ.get("WATSONX_BACKOFF_FACTOR", "0.5"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+REQUEST_SECONDS = histogram("watsonx_request_duration_seconds", "Watsonx call latency, including retries; whole stream for chat_stream.", ("model", "endpoint", "outcome"))
+FIRST_TOKEN_SECONDS = histogram("watsonx_time_to_first_token_seconds", "Time from a chat_stream request to its first content delta.", ("model",))
+REQUEST_BYTES = histogram("watsonx_request_bytes", "Encoded request payload size.", ("model", "endpoint"), buckets=BYTES_BUCKETS)
+RESPONSE_BYTES = histogram("watsonx_response_bytes", "Response body size.", ("model", "endpoint"), buckets=BYTES_BUCKETS)
+TOKENS = histogram("watsonx_tokens", "Tokens per call as reported in usage; stream completions count content deltas.", ("model", "kind"), buckets=TOKEN_BUCKETS)
+UNAUTHORIZED = counter("watsonx_unauthorized_retries", "Calls retried with a fresh token after a 401.", ("endpoint",))
+
+
+class WatsonxClient:
+    """
+    Keep-alive chat client for the Watsonx text/chat endpoint.
+
+    A single requests.Session is shared by every caller so TCP+TLS connections
+    are reused. The pool is bounded (pool_block=True): once `pool_maxsize`
+    connections are busy, further callers wait for a free one instead of
+    opening new sockets. Connection errors and retryable status codes are
+    retried with exponential backoff (honouring Retry-After on 429).
+    """
+
+    def __init__(self, api_url=WATSON_API_URL, stream_url=None, token=None, pool_maxsize=POOL_MAXSIZE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, verify=True):
+        self.api_url = api_url
+        self.stream_url = stream_url or (WATSON_STREAM_URL if api_url == WATSON_API_URL
+                                         else api_url.replace("/text/chat", "/text/chat_stream", 1))
+        # `token` is either a bearer string or a zero-argument callable returning
+        # one (e.g. generate_token.TokenProvider).
+        self.token = token
+        self.timeout = (connect_timeout, read_timeout)
+        self.verify = verify
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        })
+
+    def _headers(self):
+        token = self.token() if callable(self.token) else self.token
+        if not token:
+            return {}
+        return {"Authorization": f"Bearer {token}"}
+
+    def chat(self, payload, timeout=None):
+        """
+        POSTs a chat payload and returns the decoded JSON body.
+        Raises requests.exceptions.RequestException on transport or HTTP errors.
+        """
+        model = payload.get("model_id", "")
+        body = json.dumps(payload).encode("utf-8")
+        REQUEST_BYTES.observe(len(body), model=model, endpoint="chat")
+        with span("watsonx.chat", REQUEST_SECONDS, model=model, endpoint="chat"):
+            response = self._post(body, timeout)
+            if response.status_code == 401 and hasattr(self.token, 'invalidate'):
+                # The token was revoked or expired early; mint a new one and retry once.
+                UNAUTHORIZED.inc(endpoint="chat")
+                self.token.invalidate()
+                response = self._post(body, timeout)
+            response.raise_for_status()
+            result = response.json()
+        RESPONSE_BYTES.observe(len(response.content), model=model, endpoint="chat")
+        usage = result.get("usage") or {}
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind) is not None:
+                TOKENS.observe(usage[kind], model=model, kind=kind[:-len("_tokens")])
+        return result
+
+    def chat_stream(self, payload, timeout=None):
+        """
+        POSTs a chat payload to the streaming endpoint and yields the content
+        deltas as they arrive. Closing the generator early closes the response
+        (and returns its connection to the pool).
+        """
+        model = payload.get("model_id", "")
+        body = json.dumps(payload).encode("utf-8")
+        REQUEST_BYTES.observe(len(body), model=model, endpoint="chat_stream")
+        received = 0
+        deltas = 0
+        with span("watsonx.chat_stream", REQUEST_SECONDS, detached=True, model=model, endpoint="chat_stream") as current:
+            response = self._post(body, timeout, url=self.stream_url, stream=True)
+            if response.status_code == 401 and hasattr(self.token, 'invalidate'):
+                UNAUTHORIZED.inc(endpoint="chat_stream")
+                response.close()
+                self.token.invalidate()
+                response = self._post(body, timeout, url=self.stream_url, stream=True)
+            try:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    received += len(line) + 1
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = get_delta_content(json.loads(data))
+                    if delta:
+                        if deltas == 0:
+                            FIRST_TOKEN_SECONDS.observe(time.perf_counter() - current.start, model=model)
+                        deltas += 1
+                        yield delta
+            finally:
+                response.close()
+                RESPONSE_BYTES.observe(received, model=model, endpoint="chat_stream")
+                TOKENS.observe(deltas, model=model, kind="completion")
+                current.set(deltas=deltas)
+
+    def _post(self, body, timeout=None, url=None, **kwargs):
+        # `body` is the JSON payload already encoded, so its size is known
+        # and a retry after a 401 does not serialize it again.
+        return self.session.post(
+            url or self.api_url,
+            headers=self._headers(),
+            data=body,
+            timeout=timeout or self.timeout,
+            verify=self.verify,
+            **kwargs
+        )
+
+    def close(self):
+        self.session.close()
+
+
+def get_message_content(result):
+    """
+    Returns the text of the first choice in a chat response, joining
+    multi-part content, or None if the response has no message.
+    """
+    if not result.get('choices') or not result['choices'][0].get('message'):
+        return None
+    content = result['choices'][0]['message'].get('content')
+    if isinstance(content, list):
+        return "\n\n".join(part.get('text', '') for part in content)
+    return content
+
+
+def get_delta_content(event):
+    """Returns the text delta of a chat_stream event, or None."""
+    choices = event.get('choices')
+    if not choices:
+        return None
+    return (choices[0].get('delta') or {}).get('content')
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def get_client(token=None, **kwargs):
+    """
+    Returns the process-wide client, creating it on first use.
+    Later calls ignore the arguments and reuse the existing pool.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = WatsonxClient(token=token, **kwargs)
+    return _shared_client
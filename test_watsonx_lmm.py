@@ -1,66 +1,23 @@
+import argparse
 import datetime
 import requests
 import os
 import json
-from ibm_watsonx_ai.foundation_models import ModelInference
-from ibm_watsonx_ai import Credentials
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
-
-iam_token_url = "https://iam.cloud.ibm.com/identity/token"
-key_file_path = os.path.join(os.getcwd() , "keys" , "keys.json")
-
-try:
-    with open(key_file_path, 'r') as dat:
-        key = json.load(dat)
-        ibm_cloud_api_key = key['api_key']
-    
-    print(f"loaded API key from keys.json : {ibm_cloud_api_key}")
-
-except FileNotFoundError:
-    print(f"Error: {key_file_path} not found.")
-    print("create 'keys' dir in cwd and keep 'keys.json' inside it.")
-    exit(1)
-except json.JSONDecodeError:
-    print(f"Error: {key_file_path} not valid JSON.")
-    exit(1)
-except KeyError:
-    print(f"Error: {key_file_path} must have 'api_key' key-value pair.")
-    exit(1)
-
-iam_body = {
-	"grant_type" : "urn:ibm:params:oauth:grant-type:apikey",
-	"apikey" : ibm_cloud_api_key
-}
-iam_headers = {
-	"Content-Type" : "application/x-www-form-urlencoded",
-	"Accept" : "application/json"
-}
-
-try:
-    iam_response = requests.post(iam_token_url , data=iam_body , headers=iam_headers , verify=False)
-    iam_response.raise_for_status()
-    
-    iam_data = iam_response.json()
-    access_token = iam_data.get("access_token")
-    
-    if not access_token:
-        raise ValueError("not found 'access_token' in payload ")
-    
-    print("generated token")
-    
-except requests.exceptions.RequestException as re:
-    print(f"Token request error: {re}")
-    exit(1)
-except ValueError as e:
-    print(f"Error parsing payload: {e}")
-    exit(1)
-    
-
-
-# Use 'service' to invoke operations.
-url = "https://us-south.ml.cloud.ibm.com/ml/v1/text/chat?version=2023-05-29"
-
-message_list = {
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from watsonx_client import POOL_MAXSIZE, WATSONX_MODEL_ID_TEXT, WatsonxClient, get_message_content
+from prompt_builder import count_tokens
+
+# The mock server accepts any project id.
+DEFAULT_PROJECT_ID = "e869834c-a4d3-4d17-8d16-cb6db32b3354"
+
+SYSTEM_PROMPT = "You always answer the questions with markdown formatting using GitHub syntax. The markdown formatting you support: headings, bold, italic, links, tables, lists, code blocks, and blockquotes. You must omit that you answer the questions with markdown.\n\nAny HTML tags must be wrapped in block quotes, for example ```<html>```. You will be penalized for not rendering code in block quotes.\n\nWhen returning code blocks, specify language.\n\nYou are a helpful, respectful and honest assistant. Always answer as helpfully as possible, while being safe. \nYour answers should not include any harmful, unethical, racist, sexist, toxic, dangerous, or illegal content. Please ensure that your responses are socially unbiased and positive in nature.\n\nIf a question does not make any sense, or is not factually coherent, explain why instead of answering something not correct. If you don'\''t know the answer to a question, please don'\''t share false information."
+
+message_list = [
 	"What are polynomial functions", # Simple Maths
 	"Are linear equations a subset of Polynomials",
 	"How can a multi-variable linear equation be described in terms of dimensional represenations",
@@ -73,83 +30,214 @@ message_list = {
 	"What are linear functionals",
 	"What are cyclic Modules",
 	"Explain the hilbert basis theorem",
-	"भारत की राजधानी क्या है?", 
-    "Tell me a short story about a robot.", 
+	"भारत की राजधानी क्या है?",
+    "Tell me a short story about a robot.",
     "एक छोटे रोबोट के बारे में एक छोटी कहानी सुनाओ।",
-    "Write a python function to find the factorial of a number." 
-}
-
-results_dir = os.path.join(os.getcwd() , 'results')
-os.makedirs(results_dir, exist_ok=True)
-
-of_name = f"api_resp_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
-of_path = os.path.join(results_dir , of_name)
-
-headers = {
-	"Accept": "application/json",
-	"Content-Type": "application/json",
-	"Authorization": f"Bearer {access_token}"
-}
-
-
-with open(of_path , 'w' , encoding='utf-8') as outfile:
-    print(f'wWriting resp to {of_path}')
-    for message in message_list:
-        body = {
-			"messages": [
-				{
-					"role":"system",
-					"content":"You always answer the questions with markdown formatting using GitHub syntax. The markdown formatting you support: headings, bold, italic, links, tables, lists, code blocks, and blockquotes. You must omit that you answer the questions with markdown.\n\nAny HTML tags must be wrapped in block quotes, for example ```<html>```. You will be penalized for not rendering code in block quotes.\n\nWhen returning code blocks, specify language.\n\nYou are a helpful, respectful and honest assistant. Always answer as helpfully as possible, while being safe. \nYour answers should not include any harmful, unethical, racist, sexist, toxic, dangerous, or illegal content. Please ensure that your responses are socially unbiased and positive in nature.\n\nIf a question does not make any sense, or is not factually coherent, explain why instead of answering something not correct. If you don'\''t know the answer to a question, please don'\''t share false information."
-				},
-				{
-					"role" : "user",
-					"content" : message
-				}
-			],
-			"project_id": "e869834c-a4d3-4d17-8d16-cb6db32b3354",
-			"model_id": "meta-llama/llama-3-3-70b-instruct",
-			"frequency_penalty": 0,
-			"max_tokens": 2000,
-			"presence_penalty": 0,
-			"temperature": 0,
-			"top_p": 1
-		}
+    "Write a python function to find the factorial of a number."
+]
+
+
+def build_body(message, project_id, model_id=WATSONX_MODEL_ID_TEXT, max_tokens=2000):
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": message}
+        ],
+        "project_id": project_id,
+        "model_id": model_id,
+        "frequency_penalty": 0,
+        "max_tokens": max_tokens,
+        "presence_penalty": 0,
+        "temperature": 0,
+        "top_p": 1
+    }
+
+
+class RateLimiter:
+    """Spaces request starts at least 1/rate seconds apart across threads; rate <= 0 disables it."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.perf_counter()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def run_one(client, index, message, body, stream, limiter):
+    """
+    Sends one prompt and returns its record. Time to first token is only
+    measured when streaming; tokens/sec is the decode rate after the first
+    token when streaming, completion tokens over total latency otherwise.
+    """
+    limiter.wait()
+    record = {"index": index, "prompt": message, "stream": stream, "ok": False}
+    start = time.perf_counter()
+    first = None
+    try:
+        if stream:
+            parts = []
+            for delta in client.chat_stream(body):
+                if first is None:
+                    first = time.perf_counter()
+                parts.append(delta)
+            text = "".join(parts)
+            completion_tokens = count_tokens(text)
+        else:
+            data = client.chat(body)
+            text = get_message_content(data)
+            if text is None:
+                raise KeyError('choices')
+            completion_tokens = (data.get("usage") or {}).get("completion_tokens") or count_tokens(text)
+        end = time.perf_counter()
+        decode_seconds = end - (first or start)
+        record.update({
+            "ok": True,
+            "latency_s": round(end - start, 4),
+            "ttft_s": round(first - start, 4) if first is not None else None,
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": round(completion_tokens / decode_seconds, 2) if decode_seconds > 0 else None,
+            "response": text
+        })
+    except requests.exceptions.RequestException as re:
+        record["latency_s"] = round(time.perf_counter() - start, 4)
+        record["error"] = str(re)
+        if re.response is not None and re.response.text:
+            record["error_body"] = re.response.text
+    except (KeyError, ValueError) as e:
+        record["latency_s"] = round(time.perf_counter() - start, 4)
+        record["error"] = f"error parsing response: {e!r}"
+    return record
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile of a non-empty list, q in [0, 100]."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(records, wall_seconds):
+    ok = [r for r in records if r["ok"]]
+    summary = {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": len(records) - len(ok),
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_second": round(len(records) / wall_seconds, 2) if wall_seconds else None,
+        "completion_tokens_per_second": round(sum(r["completion_tokens"] for r in ok) / wall_seconds, 2) if wall_seconds else None
+    }
+    for metric in ("latency_s", "ttft_s", "tokens_per_second"):
+        values = [r[metric] for r in ok if r.get(metric) is not None]
+        if values:
+            summary[metric] = {f"p{q}": round(percentile(values, q), 4) for q in (50, 95, 99)}
+            summary[metric]["mean"] = round(sum(values) / len(values), 4)
+    return summary
+
+
+def print_summary(summary):
+    print(f"\n{summary['ok']}/{summary['requests']} ok in {summary['wall_seconds']}s "
+          f"({summary['requests_per_second']} req/s, {summary['completion_tokens_per_second']} completion tokens/s)")
+    print(f"{'metric':>18} {'p50':>10} {'p95':>10} {'p99':>10} {'mean':>10}")
+    for metric in ("latency_s", "ttft_s", "tokens_per_second"):
+        if metric in summary:
+            row = summary[metric]
+            print(f"{metric:>18} {row['p50']:>10.4f} {row['p95']:>10.4f} {row['p99']:>10.4f} {row['mean']:>10.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send the prompt set to the Watsonx chat endpoint and report latency percentiles")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--rate", type=float, default=0.0, help="max request starts per second (0 = unlimited)")
+    parser.add_argument("--repeat", type=int, default=1, help="times to send the whole prompt set")
+    parser.add_argument("--no-stream", dest="stream", action="store_false",
+                        help="use text/chat instead of text/chat_stream (no time-to-first-token)")
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--mock", action="store_true", help="run against a local mock server instead of Watsonx")
+    parser.add_argument("--mock-latency", type=float, default=0.2, help="seconds per mock completion")
+    parser.add_argument("--results-dir", default=os.path.join(os.getcwd(), "results"))
+    args = parser.parse_args()
+
+    server = None
+    token_provider = None
+    if args.mock:
+        from mock_watsonx_server import start_mock_server
+        server = start_mock_server(latency=args.mock_latency)
+        api_url = f"{server.base_url}/ml/v1/text/chat?version=2023-05-29"
+        token = "mock-token"
+        project_id = DEFAULT_PROJECT_ID
+        print(f"Using mock server at {server.base_url}")
+    else:
+        # Imported here so --mock runs without the IBM SDK installed.
+        from generate_token import TokenProvider
+        api_url = None
+        token_provider = TokenProvider(background_refresh=False)
         try:
-            response = requests.post(
-				url,
-				headers=headers,
-				json=body,
-				verify=False
-			)
-            response.raise_for_status()
-            data = response.json()
-            
-            print(f"\n--- Testing message: '{message}' ---")
-            print("Response:")
-            
-            model_response = data['choices'][0]['message']['content']
-            print(model_response)
-            
-            outfile.write(f"---Query: '{message}'----\n ")
-            outfile.write(f"API Response: \n")
-            outfile.write(model_response + "\n\n")
-            
-            
-            
-        except requests.exceptions.RequestException as re:
-            print(f"\nError making api call for meassage {message} : {re}")
-            outfile.write(re + '\n\n')
-            if 'response' in locals() and response.text:
-                er_text = f"Response text: {response.text}"
-                outfile.write(er_text + "\n\n")
-                print(er_text)
-            continue
-        except KeyError as ke:
-            em = f"error parsing response for message {message} : Missing key {ke}"
-            outfile.write(em + "\n\n")
-            print(em)
-            continue
-		# if response.status_code != 200:
-		# 	raise Exception("Non-200 response: " + str(response.text))
-
-		# data = response.json()
\ No newline at end of file
+            token_provider.get_token()
+        except (OSError, KeyError, ValueError, requests.exceptions.RequestException) as e:
+            print(f"Error: could not get an IAM token: {e}")
+            print("create 'keys' dir in cwd and keep 'keys.json' (api_key, project_id) inside it, or pass --mock.")
+            sys.exit(1)
+        token = token_provider
+        project_id = token_provider.project_id
+        print("generated token")
+
+    # One pooled keep-alive client shared by every worker thread.
+    client_kwargs = {"token": token, "pool_maxsize": max(args.concurrency, POOL_MAXSIZE), "verify": False}
+    if api_url:
+        client_kwargs["api_url"] = api_url
+    client = WatsonxClient(**client_kwargs)
+    limiter = RateLimiter(args.rate)
+    jobs = [(i, message) for i, message in enumerate(message_list * args.repeat)]
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    of_path = os.path.join(args.results_dir, f"eval_{stamp}.jsonl")
+    summary_path = os.path.join(args.results_dir, f"eval_{stamp}_summary.json")
+    print(f"Sending {len(jobs)} requests, concurrency {args.concurrency}, "
+          f"rate {args.rate or 'unlimited'}/s, {'streaming' if args.stream else 'non-streaming'}")
+
+    records = []
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool, open(of_path, 'w', encoding='utf-8') as outfile:
+            futures = [
+                pool.submit(run_one, client, i, message, build_body(message, project_id, max_tokens=args.max_tokens),
+                            args.stream, limiter)
+                for i, message in jobs
+            ]
+            for future in futures:
+                record = future.result()
+                records.append(record)
+                outfile.write(json.dumps(record, ensure_ascii=False) + "\n")
+                status = f"{record['latency_s']:.3f}s" if record["ok"] else f"error: {record['error']}"
+                print(f"[{record['index']:>3}] {status}  {record['prompt'][:60]}")
+        wall = time.perf_counter() - start
+    finally:
+        client.close()
+        if token_provider is not None:
+            token_provider.close()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    summary = summarize(records, wall)
+    summary.update({"concurrency": args.concurrency, "rate": args.rate, "stream": args.stream, "mock": args.mock})
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    print_summary(summary)
+    print(f"\nWrote {of_path} and {summary_path}")
+
+
+if __name__ == "__main__":
+    main()